@@ -1,6 +1,61 @@
-from fastapi import FastAPI
+import os
+import sys
+import time
+import asyncio
+from typing import Optional
+
+import numpy as np
 import pandas as pd
+from dateutil.tz import tzlocal
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, '..', 'src')]
+from metrics_cache import MetricsCache
+from downsample import AGGREGATES, downsample
+from metrics_stream import MetricsBroadcaster
+from session_store import SessionStore
+from metrics_rollup import TIERS, plan_reads, tier_column, tier_path
+from responses import (FORMATS, MIN_COMPRESS_BYTES, compress, encode, encode_records, entity_tag,
+                       http_date, negotiate_encoding, negotiate_format, not_modified)
+
+METRICS_PATH = os.environ.get(
+    'MC_METRICS_FILE',
+    '/Users/couchcomfy/Code/personal/minecraft-server-controller/metrics.bin'
+)
+METRICS_CACHE_MB = int(os.environ.get('MC_METRICS_CACHE_MB', 256))
+SESSIONS_PATH = os.environ.get(
+    'MC_SESSIONS_FILE',
+    '/Users/couchcomfy/Code/personal/minecraft-server-controller/sessions.db'
+)
+
+# Default range of the session endpoints when 'from' is omitted
+SESSION_DEFAULT_RANGE = 30 * 24 * 60 * 60
+
+# Parsed once and shared by every endpoint, only new rows are read per request
+metrics_cache = MetricsCache(METRICS_PATH, max_bytes=METRICS_CACHE_MB * 1024 * 1024)
+# Every tier finest first as (tier, bucket width in ns, cache), the rollups are small
+tier_caches = [('raw', 0, metrics_cache)] + [
+    (tier, width * 10**9, MetricsCache(tier_path(METRICS_PATH, tier), max_bytes=METRICS_CACHE_MB * 1024 * 1024))
+    for tier, width in TIERS
+]
+session_store = None
+# One tail of the metrics file shared by every streaming client
+metrics_broadcaster = MetricsBroadcaster(metrics_cache)
+
+# Seconds between keepalive comments on an idle stream
+STREAM_KEEPALIVE = 15
+
+# Output name mapped to metrics column for each '/<metric>-data' endpoint
+METRIC_COLUMNS = {
+    'cpu': {'percentage': 'cpu_percent'},
+    'ram': {'percentage': 'ram_percent'},
+    'net': {'read': 'net_rx_bytes', 'write': 'net_tx_bytes'},
+    'block': {'read': 'blk_read_bytes', 'write': 'blk_write_bytes'},
+    'game': {'tps': 'tps', 'mspt': 'mspt', 'entities': 'entities', 'chunks': 'loaded_chunks'},
+}
 
 app = FastAPI()
 
@@ -11,48 +66,308 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
 
-@app.get("/cpu-data")
-async def get_cpu_data():
-    # Simulated CPU data
-    data = pd.read_csv('/Users/couchcomfy/Code/personal/minecraft-server-controller/data.csv', header=None, names=['Timestamp', 'CPU Usage', 'RAM Usage', 'Net RX Bytes', 'Net TX Bytes', 'Block Read Bytes', 'Block Write Bytes'])
-    data['timestamp'] = pd.to_datetime(data['Timestamp'])
-    data['percentage'] = data['CPU Usage']
+def parse_time(value) -> Optional[np.datetime64]:
+    """
+    Parses a query time given as epoch seconds or an ISO 8601 string.
 
-    cpu_data = data[['timestamp', 'percentage']].to_dict(orient='records')
-    print(cpu_data)
-    return cpu_data
+    Naive ISO strings are taken as local time, like the returned timestamps,
+    the first occurrence during the repeated hour when clocks go back.
 
-@app.get("/ram-data")
-async def get_cpu_data():
-    # Simulated CPU data
-    data = pd.read_csv('/Users/couchcomfy/Code/personal/minecraft-server-controller/data.csv', header=None, names=['Timestamp', 'CPU Usage', 'RAM Usage', 'Net RX Bytes', 'Net TX Bytes', 'Block Read Bytes', 'Block Write Bytes'])
-    data['timestamp'] = pd.to_datetime(data['Timestamp'])
-    data['percentage'] = data['RAM Usage']
+    Returns:
+        np.datetime64: The time in UTC, which the backend works in.
+    """
+    if value is None:
+        return None
+    try:
+        timestamp = pd.Timestamp(float(value), unit='s', tz='UTC')
+    except ValueError:
+        try:
+            timestamp = pd.Timestamp(value)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f'Invalid time {value!r}')
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize(tzlocal(), ambiguous=True, nonexistent='shift_forward')
+    return timestamp.tz_convert('UTC').tz_localize(None).to_datetime64().astype('datetime64[ns]')
 
-    ram_data = data[['timestamp', 'percentage']].to_dict(orient='records')
-    return ram_data
 
-@app.get("/net-data")
-async def get_cpu_data():
-    # Simulated CPU data
-    data = pd.read_csv('/Users/couchcomfy/Code/personal/minecraft-server-controller/data.csv', header=None, names=['Timestamp', 'CPU Usage', 'RAM Usage', 'Net RX Bytes', 'Net TX Bytes', 'Block Read Bytes', 'Block Write Bytes'])
-    data['timestamp'] = pd.to_datetime(data['Timestamp'])
-    data['read'] = data['Net RX Bytes']
-    data['write'] = data['Net TX Bytes']
+def parse_bucket(value) -> Optional[int]:
+    """
+    Parses a bucket width given as seconds or a pandas duration like '5min'.
+    """
+    if value is None:
+        return None
+    try:
+        bucket = pd.Timedelta(float(value), unit='s')
+    except ValueError:
+        try:
+            bucket = pd.Timedelta(value)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f'Invalid bucket {value!r}')
+    if bucket.value <= 0:
+        raise HTTPException(status_code=422, detail='bucket must be positive')
+    return bucket.value
+
+
+class MetricsQuery:
+    """
+    Query parameters shared by the metrics endpoints.
+
+    Attributes:
+    - start: Only samples at or after this time ('from').
+    - end: Only samples before this time ('to').
+    - bucket_ns: Aggregate into buckets of this width.
+    - max_points: Return at most about this many points.
+    - agg: 'mean', 'min', 'max' per bucket, or 'lttb' decimation.
+    """
+
+    def __init__(
+        self,
+        from_: Optional[str] = Query(None, alias='from', description='Start time, epoch seconds or ISO 8601'),
+        to: Optional[str] = Query(None, description='End time, epoch seconds or ISO 8601'),
+        bucket: Optional[str] = Query(None, description="Bucket width in seconds or as a duration like '5min'"),
+        max_points: Optional[int] = Query(None, gt=2, description='Maximum number of points to return'),
+        agg: str = Query('mean', description=f'One of {", ".join(AGGREGATES)}'),
+    ):
+        if agg not in AGGREGATES:
+            raise HTTPException(status_code=422, detail=f'agg must be one of {", ".join(AGGREGATES)}')
+        self.start = parse_time(from_)
+        self.end = parse_time(to)
+        self.bucket_ns = parse_bucket(bucket)
+        self.max_points = max_points
+        self.agg = agg
+
+    def apply(self, columns: dict) -> pd.DataFrame:
+        """
+        Selects the time range and downsamples the requested columns.
+
+        Old ranges and coarse buckets are read from the 1 minute or 1 hour
+        rollups, whichever is the coarsest that still resolves the requested
+        bucket width (or the range divided by `max_points`).
+
+        Args:
+            columns (dict): Output name mapped to the metrics column it comes from.
+
+        Returns:
+            pd.DataFrame: One row per point with 'timestamp' and the output names.
+        """
+        frames = [cache.frame() for _, _, cache in tier_caches]
+        tiers = [(width, frame['timestamp'].to_numpy().view('int64'))
+                 for (_, width, _), frame in zip(tier_caches, frames)]
+        start = None if self.start is None else int(self.start.view('int64'))
+        end = None if self.end is None else int(self.end.view('int64'))
+
+        resolution = self.bucket_ns or 0
+        if self.max_points and any(len(timestamps) for _, timestamps in tiers):
+            first = start if start is not None else min(t[0] for _, t in tiers if len(t))
+            last = end if end is not None else max(t[-1] for _, t in tiers if len(t))
+            resolution = max(resolution, (last - first) // self.max_points)
+
+        pieces = plan_reads(tiers, start, end, resolution)
+        times = [frames[position]['timestamp'].to_numpy()[rows] for position, rows in pieces]
+        values = {
+            name: [column_rows(frames[position], tier_column(source, tier_caches[position][0], self.agg), rows)
+                   for position, rows in pieces]
+            for name, source in columns.items()
+        }
+
+        times, values = downsample(
+            np.concatenate(times) if pieces else np.empty(0, dtype='datetime64[ns]'),
+            {name: np.concatenate(parts) if pieces else np.empty(0) for name, parts in values.items()},
+            bucket_ns=self.bucket_ns,
+            max_points=self.max_points,
+            how=self.agg,
+        )
+
+        return pd.DataFrame({'timestamp': times, **values})
+
+
+def column_rows(frame: pd.DataFrame, column: str, rows: slice) -> np.ndarray:
+    # Files written before a column was added read as NaN for it
+    if column in frame:
+        return frame[column].to_numpy()[rows]
+    return np.full(len(frame['timestamp'].to_numpy()[rows]), np.nan)
+
+
+def get_session_store() -> SessionStore:
+    """
+    Opens the session database read-only on first use.
+
+    The controller creates the file, so it may not exist yet when the backend starts.
+    """
+    global session_store
+    if session_store is None:
+        if not os.path.exists(SESSIONS_PATH):
+            raise HTTPException(status_code=503, detail='No session database yet')
+        session_store = SessionStore(SESSIONS_PATH, readonly=True)
+    return session_store
+
 
-    net_data = data[['timestamp', 'read', 'write']].to_dict(orient='records')
-    return net_data
+def to_epoch(value: np.datetime64) -> float:
+    return pd.Timestamp(value).tz_localize('UTC').timestamp()
+
+
+def from_epoch(values) -> pd.DatetimeIndex:
+    # Same local naive times as the metrics endpoints return
+    return pd.to_datetime(values, unit='s', utc=True).tz_convert(tzlocal()).tz_localize(None)
+
+
+class SessionQuery:
+    """
+    Time range shared by the session endpoints, as epoch seconds.
+
+    Attributes:
+    - start: Start of the range ('from'), 30 days ago by default.
+    - end: End of the range ('to'), now by default.
+    """
+
+    def __init__(
+        self,
+        from_: Optional[str] = Query(None, alias='from', description='Start time, epoch seconds or ISO 8601'),
+        to: Optional[str] = Query(None, description='End time, epoch seconds or ISO 8601'),
+    ):
+        start = parse_time(from_)
+        end = parse_time(to)
+        self.end = time.time() if end is None else to_epoch(end)
+        self.start = self.end - SESSION_DEFAULT_RANGE if start is None else to_epoch(start)
+        if self.start >= self.end:
+            raise HTTPException(status_code=422, detail="'from' must be before 'to'")
+
+
+def metric_response(request: Request, metric: str, query: MetricsQuery, format: Optional[str]) -> Response:
+    """
+    Answers a metrics endpoint in the negotiated format and encoding.
+
+    The ETag covers the metric, the query and the state of every tier file,
+    so a poll with nothing new written gets a 304 before any data is read.
+
+    Args:
+        request (Request): The request, for its query string and headers.
+        metric (str): A key of `METRIC_COLUMNS`.
+        query (MetricsQuery): The parsed query parameters.
+        format (str, optional): The 'format' parameter, overrides Accept.
+
+    Returns:
+        Response: The encoded points, or an empty 304.
+    """
+    chosen = negotiate_format(format, request.headers.get('accept'))
+    validators = [cache.validator() for _, _, cache in tier_caches]
+    etag = entity_tag(metric, chosen, sorted(request.query_params.multi_items()), validators)
+    mtimes = [mtime for _, _, mtime in validators if mtime is not None]
+    last_modified = max(mtimes) / 1e9 if mtimes else None
+
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept, Accept-Encoding'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    if not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    body = encode(query.apply(METRIC_COLUMNS[metric]), chosen)
+    encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        body = compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=FORMATS[chosen], headers=headers)
+
+FORMAT_PARAMETER = Query(None, description=f'One of {", ".join(FORMATS)}, overrides the Accept header')
+
+# The data endpoints are plain functions on purpose, FastAPI runs them in its
+# thread pool so slicing, downsampling and SQLite queries never block the
+# event loop the streams run on
+
+@app.get("/cpu-data")
+def get_cpu_data(request: Request, query: MetricsQuery = Depends(), format: Optional[str] = FORMAT_PARAMETER):
+    return metric_response(request, 'cpu', query, format)
+
+@app.get("/ram-data")
+def get_ram_data(request: Request, query: MetricsQuery = Depends(), format: Optional[str] = FORMAT_PARAMETER):
+    return metric_response(request, 'ram', query, format)
+
+@app.get("/net-data")
+def get_net_data(request: Request, query: MetricsQuery = Depends(), format: Optional[str] = FORMAT_PARAMETER):
+    return metric_response(request, 'net', query, format)
 
 @app.get("/block-data")
-async def get_cpu_data():
-    # Simulated CPU data
-    data = pd.read_csv('/Users/couchcomfy/Code/personal/minecraft-server-controller/data.csv', header=None, names=['Timestamp', 'CPU Usage', 'RAM Usage', 'Net RX Bytes', 'Net TX Bytes', 'Block Read Bytes', 'Block Write Bytes'])
-    data['timestamp'] = pd.to_datetime(data['Timestamp'])
-    data['read'] = data['Block Read Bytes']
-    data['write'] = data['Block Write Bytes']
-
-    net_data = data[['timestamp', 'read', 'write']].to_dict(orient='records')
-    return net_data
+def get_block_data(request: Request, query: MetricsQuery = Depends(), format: Optional[str] = FORMAT_PARAMETER):
+    return metric_response(request, 'block', query, format)
+
+@app.get("/game-data")
+def get_game_data(request: Request, query: MetricsQuery = Depends(), format: Optional[str] = FORMAT_PARAMETER):
+    return metric_response(request, 'game', query, format)
+
+@app.get("/{metric}-data/stream")
+async def stream_metric_data(metric: str, query: MetricsQuery = Depends()):
+    """
+    Streams a metric as Server-Sent Events.
+
+    The first 'snapshot' event holds the same downsampled records as the plain
+    endpoint, after that every 'append' event holds the raw samples written
+    since. A 'reset' event asks the client to reconnect for a new snapshot.
+    `to` is ignored, the stream always runs up to the newest sample.
+    """
+    if metric not in METRIC_COLUMNS:
+        raise HTTPException(status_code=404, detail=f'Unknown metric {metric!r}')
+    columns = METRIC_COLUMNS[metric]
+
+    async def events():
+        queue, cursor = await metrics_broadcaster.subscribe()
+        try:
+            # Appends start right after the newest row the snapshot can hold
+            query.end = None if cursor is None else cursor + np.timedelta64(1, 'ns')
+            snapshot = await asyncio.to_thread(query.apply, columns)
+            yield f'event: snapshot\ndata: {encode_records(snapshot).decode()}\n\n'
+
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if batch is None:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                yield f'event: append\ndata: {batch.encode(columns)}\n\n'
+        finally:
+            metrics_broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.get("/players/concurrent")
+def get_concurrent_players(
+    query: SessionQuery = Depends(),
+    bucket: Optional[str] = Query(None, description="Bucket width in seconds or as a duration like '1h'"),
+    max_points: int = Query(500, gt=0, description='Number of buckets when bucket is omitted'),
+):
+    bucket_ns = parse_bucket(bucket)
+    width = bucket_ns / 1e9 if bucket_ns else (query.end - query.start) / max_points
+    counts = get_session_store().concurrent(query.start, query.end, width)
+    times = from_epoch([start for start, _ in counts])
+    return [{'timestamp': when, 'players': peak} for when, (_, peak) in zip(times, counts)]
+
+@app.get("/players/sessions")
+def get_player_sessions(
+    query: SessionQuery = Depends(),
+    player: Optional[str] = Query(None, description='Only sessions of this player'),
+    limit: int = Query(1000, gt=0, le=100000, description='Maximum number of sessions to return'),
+):
+    sessions = get_session_store().sessions(query.start, query.end, player, limit)
+    joined = from_epoch([session['joined'] for session in sessions])
+    left = from_epoch([session['left'] if session['left'] is not None else np.nan for session in sessions])
+    for session, join_time, leave_time in zip(sessions, joined, left):
+        session['joined'] = join_time
+        session['left'] = None if pd.isna(leave_time) else leave_time
+    return sessions
+
+@app.get("/players/top")
+def get_top_players(
+    query: SessionQuery = Depends(),
+    limit: int = Query(10, gt=0, le=1000, description='Number of players to return'),
+):
+    return get_session_store().top_players(query.start, query.end, limit)
@@ -0,0 +1,126 @@
+import numpy as np
+
+AGGREGATES = ('mean', 'min', 'max', 'lttb')
+
+
+def bucket_aggregate(timestamps, values, bucket_ns, how='mean') -> tuple:
+    """
+    Aggregates sorted samples into fixed width time buckets.
+
+    Buckets are aligned to multiples of `bucket_ns` so repeated queries over a
+    sliding window return the same buckets. Everything is done with numpy
+    reductions over the bucket boundaries, there is no per-row Python work.
+    NaN samples (game readings the server did not report) are skipped.
+
+    Args:
+        timestamps (np.ndarray): Sorted datetime64[ns] sample times.
+        values (dict): Column name mapped to an array of samples.
+        bucket_ns (int): The bucket width in nanoseconds.
+        how (str): 'mean', 'min' or 'max'.
+
+    Returns:
+        tuple: The bucket start times and a dict of aggregated columns.
+    """
+    if len(timestamps) == 0:
+        return timestamps, {name: column[:0] for name, column in values.items()}
+
+    bucket_ids = timestamps.view('int64') // bucket_ns
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_ids)) + 1))
+    bucket_times = (bucket_ids[starts] * bucket_ns).astype('datetime64[ns]')
+
+    aggregated = {}
+    for name, column in values.items():
+        column = np.asarray(column, dtype='float64')
+        if how == 'min':
+            aggregated[name] = np.fmin.reduceat(column, starts)
+        elif how == 'max':
+            aggregated[name] = np.fmax.reduceat(column, starts)
+        else:
+            known = ~np.isnan(column)
+            with np.errstate(invalid='ignore'):
+                aggregated[name] = np.add.reduceat(np.where(known, column, 0), starts) \
+                    / np.add.reduceat(known.astype('int64'), starts)
+
+    return bucket_times, aggregated
+
+
+def lttb_indices(x, y, n_out) -> np.ndarray:
+    """
+    Picks the points to keep with Largest-Triangle-Three-Buckets decimation.
+
+    LTTB keeps the first and last point and, for every bucket in between, the
+    point forming the largest triangle with the previously kept point and the
+    mean of the next bucket. Peaks and dips survive, unlike plain averaging.
+    The loop is over output points only, each bucket is handled with numpy.
+
+    Args:
+        x (np.ndarray): Sorted sample positions as numbers.
+        y (np.ndarray): Sample values.
+        n_out (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: Indices of the kept points in ascending order.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        # Unknown samples never win over known ones
+        areas[np.isnan(areas)] = -1
+        previous = lo + int(np.argmax(areas))
+        kept[i + 1] = previous
+
+    return kept
+
+
+def downsample(timestamps, values, bucket_ns=None, max_points=None, how='mean') -> tuple:
+    """
+    Reduces a series to roughly `max_points` points or one point per bucket.
+
+    Args:
+        timestamps (np.ndarray): Sorted datetime64[ns] sample times.
+        values (dict): Column name mapped to an array of samples.
+        bucket_ns (int, optional): The bucket width in nanoseconds.
+        max_points (int, optional): The largest number of points wanted.
+        how (str): One of AGGREGATES.
+
+    Returns:
+        tuple: The output times and a dict of output columns.
+    """
+    if len(timestamps) < 2 or (bucket_ns is None and max_points is None):
+        return timestamps, values
+
+    span = int(timestamps[-1].astype('int64') - timestamps[0].astype('int64')) + 1
+
+    if how == 'lttb':
+        n_out = max_points if max_points is not None else span // bucket_ns + 1
+        # Decimate on the first column, keep the same rows for the others
+        first = next(iter(values.values()))
+        kept = lttb_indices(timestamps.view('int64'), first, max(int(n_out), 3))
+        return timestamps[kept], {name: np.asarray(column)[kept] for name, column in values.items()}
+
+    if bucket_ns is None:
+        bucket_ns = -(-span // max_points)
+    elif max_points is not None:
+        bucket_ns = max(bucket_ns, -(-span // max_points))
+
+    return bucket_aggregate(timestamps, values, max(int(bucket_ns), 1), how)
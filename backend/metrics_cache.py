@@ -0,0 +1,149 @@
+import os
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from metrics_store import read_header, record_dtype
+
+
+class MetricsCache:
+    """
+    An in-process cache of the metrics file shared by every endpoint.
+
+    The cache remembers the byte offset and mtime it has parsed up to, and on
+    each access only reads records appended since then. Timestamps are kept
+    as UTC datetimes, local time repeats an hour when clocks go back and
+    would not stay sorted, so only responses are converted. Columns live in
+    preallocated numpy buffers capped at `max_bytes`. When the cap is reached
+    the oldest eighth of the rows is dropped in one go, so evictions are rare
+    and appends stay cheap. Buffers are never modified in place after rows
+    are handed out, so frames returned earlier stay valid.
+
+    Attributes:
+    - path (str): The metrics file to follow.
+    - max_rows (int): The most rows kept in memory.
+    - version (int): Incremented whenever new rows are parsed or the file is replaced.
+    - end_row (int): Number of rows parsed since the file was first read.
+
+    Methods:
+    - frame(self): Returns the cached rows as a DataFrame, reading new rows first.
+    - validator(self): Returns what identifies the cached data, reading new rows first.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_rows = 0
+        self.version = 0
+        self.end_row = 0
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns every cached row, parsing anything appended since the last call.
+
+        Returns:
+            pd.DataFrame: One row per sample. The columns share the cache's buffers.
+        """
+        with self._lock:
+            self._refresh()
+            return pd.DataFrame(
+                {name: column[:self._size] for name, column in self._columns.items()},
+                copy=False,
+            )
+
+    def validator(self) -> tuple:
+        """
+        Returns what identifies the cached data, reading new rows first.
+
+        It changes whenever rows are appended or the file is replaced and,
+        unlike `version`, is the same in every backend process, so it can
+        back an ETag.
+
+        Returns:
+            tuple: The file identity, the rows parsed and the mtime in ns.
+        """
+        with self._lock:
+            self._refresh()
+            return self._file_id, self.end_row, self._mtime
+
+    def _reset(self, file_id=None):
+        self._file_id = file_id
+        self._mtime = None
+        self._offset = None
+        self._dtype = None
+        self._columns = {'timestamp': np.empty(0, dtype='datetime64[ns]')}
+        self._size = 0
+        self.end_row = 0
+        self.version += 1
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._file_id is not None:
+                self._reset()
+            return
+
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or (self._offset is not None and stat.st_size < self._offset):
+            logging.info(f'{self.path} was replaced, reloading metrics cache')
+            self._reset(file_id)
+
+        if stat.st_mtime_ns == self._mtime and stat.st_size == self._offset:
+            return
+
+        with open(self.path, 'rb') as f:
+            if self._dtype is None:
+                fields, self._offset = read_header(f)
+                self._dtype = record_dtype(fields)
+                self.max_rows = max(self.max_bytes // self._dtype.itemsize, 1024)
+
+            count = (stat.st_size - self._offset) // self._dtype.itemsize
+            if count > self.max_rows:
+                # Only the newest rows would survive eviction, skip the rest
+                skipped = count - self.max_rows
+                self._offset += skipped * self._dtype.itemsize
+                self.end_row += skipped
+                count = self.max_rows
+
+            f.seek(self._offset)
+            new_rows = np.frombuffer(f.read(count * self._dtype.itemsize), dtype=self._dtype)
+
+        self._offset += len(new_rows) * self._dtype.itemsize
+        self._mtime = stat.st_mtime_ns
+        if len(new_rows):
+            self._append(new_rows)
+            self.end_row += len(new_rows)
+            self.version += 1
+
+    def _append(self, new_rows):
+        count = len(new_rows)
+        capacity = len(self._columns['timestamp'])
+
+        if self._size + count > capacity:
+            keep = self._size
+            if self._size + count > self.max_rows:
+                keep = max(self.max_rows - count - self.max_rows // 8, 0)
+                logging.debug(f'Evicting {self._size - keep} old rows from the metrics cache')
+            capacity = min(max(2 * (keep + count), 1024), self.max_rows)
+
+            columns = {}
+            for name in self._dtype.names:
+                dtype = 'datetime64[ns]' if name == 'timestamp' else self._dtype[name]
+                column = np.empty(capacity, dtype=dtype)
+                if name in self._columns:
+                    column[:keep] = self._columns[name][self._size - keep:self._size]
+                columns[name] = column
+            self._columns = columns
+            self._size = keep
+
+        end = self._size + count
+        self._columns['timestamp'][self._size:end] = pd.to_datetime(new_rows['timestamp'], unit='s').to_numpy()
+        for name in self._dtype.names[1:]:
+            self._columns[name][self._size:end] = new_rows[name]
+        self._size = end
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+
+import numpy as np
+import pandas as pd
+
+from responses import encode_records
+
+
+class MetricsBatch:
+    """
+    Rows appended to the metrics file since the previous batch.
+
+    Each viewer of the same metric gets the same payload, so it is encoded
+    once per metric and reused for every client.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._encoded = {}
+
+    def encode(self, columns: dict) -> str:
+        key = tuple(columns.items())
+        if key not in self._encoded:
+            self._encoded[key] = encode_records(pd.DataFrame({
+                'timestamp': self.frame['timestamp'].to_numpy(),
+                **{name: self.frame[source].to_numpy() for name, source in columns.items()},
+            })).decode()
+        return self._encoded[key]
+
+
+class MetricsBroadcaster:
+    """
+    Fans newly written metrics out to every streaming client from one tail.
+
+    A single task polls the shared MetricsCache, which only parses rows
+    appended since its last read, and hands each batch of new rows to every
+    subscriber's queue. The task runs while anyone is subscribed. Rows are
+    tracked by timestamp rather than position, so a file replaced by the
+    retention job does not resend old rows. A client that falls
+    `queue_size` batches behind is dropped and told to reconnect instead of
+    buffering without bound.
+
+    Attributes:
+    - cache (MetricsCache): The cache of the raw metrics file.
+    - poll_interval (float): Seconds between checks for new rows.
+    - queue_size (int): Batches buffered per client.
+
+    Methods:
+    - subscribe(self): Registers a client, returns its queue and the last row time sent.
+    - unsubscribe(self, queue): Removes a client.
+    """
+
+    def __init__(self, cache, poll_interval=1.0, queue_size=64):
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+
+        self._subscribers = set()
+        self._cursor = None
+        self._task = None
+        # Clients connecting together must not each start a tail
+        self._starting = asyncio.Lock()
+
+    async def subscribe(self) -> tuple[asyncio.Queue, np.datetime64]:
+        """
+        Registers a client.
+
+        Returns:
+            tuple: The queue new batches arrive on, None when the client must
+                reconnect, and the time of the newest row already in the cache.
+                Batches only hold rows after that time.
+        """
+        async with self._starting:
+            if self._task is None or self._task.done():
+                self._cursor = await self._latest()
+                self._task = asyncio.create_task(self._tail())
+
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue, self._cursor
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    async def _latest(self):
+        frame = await asyncio.to_thread(self.cache.frame)
+        timestamps = frame['timestamp'].to_numpy()
+        return timestamps[-1] if len(timestamps) else None
+
+    async def _tail(self):
+        version = self.cache.version
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                frame = await asyncio.to_thread(self.cache.frame)
+            except Exception as e:
+                logging.error(f'Reading {self.cache.path} for streaming failed: {e}')
+                continue
+            if self.cache.version == version:
+                continue
+            version = self.cache.version
+
+            timestamps = frame['timestamp'].to_numpy()
+            start = 0 if self._cursor is None else int(np.searchsorted(timestamps, self._cursor, side='right'))
+            if start == len(timestamps):
+                continue
+            self._cursor = timestamps[-1]
+            self._publish(MetricsBatch(frame.iloc[start:]))
+
+    def _publish(self, batch):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                logging.info('Dropping a metrics stream client that fell behind')
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
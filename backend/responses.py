@@ -0,0 +1,204 @@
+import io
+import gzip
+import json
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+from fastapi import HTTPException
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# Response formats mapped to the media type each is served as. 'records' is
+# one object per point, 'columns' one array per column with epoch timestamps.
+FORMATS = {
+    'records': 'application/json',
+    'columns': 'application/vnd.mc-metrics.columns+json',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Picks the response format from the 'format' parameter or the Accept header.
+
+    The parameter wins. Otherwise the supported media type with the highest
+    q-value in Accept is used, and records when nothing supported is listed.
+
+    Raises:
+        HTTPException: 422 for an unknown format, 406 for Arrow without pyarrow.
+    """
+    if requested is not None:
+        if requested not in FORMATS:
+            raise HTTPException(status_code=422, detail=f'format must be one of {", ".join(FORMATS)}')
+        chosen = requested
+    else:
+        chosen = 'records'
+        by_type = {media_type: name for name, media_type in FORMATS.items()}
+        best = 0.0
+        for media_type, quality in _parse_header(accept):
+            if media_type in by_type and quality > best:
+                chosen, best = by_type[media_type], quality
+
+    if chosen == 'arrow' and pyarrow is None:
+        raise HTTPException(status_code=406, detail='Arrow responses need the pyarrow package on the server')
+    return chosen
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks 'br', 'gzip' or no compression from an Accept-Encoding header.
+    """
+    accepted = {coding: quality for coding, quality in _parse_header(accept_encoding) if quality > 0}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _parse_header(value: Optional[str]) -> list[tuple[str, float]]:
+    entries = []
+    for part in (value or '').split(','):
+        name, *parameters = [piece.strip() for piece in part.split(';')]
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            if parameter.startswith('q='):
+                try:
+                    quality = float(parameter[2:])
+                except ValueError:
+                    quality = 0.0
+        entries.append((name.lower(), quality))
+    return entries
+
+
+def epoch_seconds(times) -> np.ndarray:
+    """
+    Converts the UTC times the backend works in to epoch seconds.
+    """
+    return np.asarray(times, dtype='datetime64[ns]').view('int64') / 1e9
+
+
+def local_times(times) -> np.ndarray:
+    """
+    Converts the UTC times the backend works in to local naive times for display.
+
+    The UTC offset is looked up once per distinct hour instead of per point.
+    The result is not sorted across the hour repeated when clocks go back, so
+    it is only used for encoding.
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    if len(times) == 0:
+        return times
+    hours, positions = np.unique(times.astype('datetime64[h]'), return_inverse=True)
+    utc_hours = pd.DatetimeIndex(hours.astype('datetime64[ns]')).tz_localize('UTC')
+    offsets = utc_hours.tz_convert(tzlocal()).tz_localize(None).asi8 - utc_hours.asi8
+    return (times.view('int64') + offsets[positions]).view('datetime64[ns]')
+
+
+def encode(frame: pd.DataFrame, format: str) -> bytes:
+    """
+    Serializes a 'timestamp' column and value columns in one of the `FORMATS`.
+    """
+    if format == 'columns':
+        columns = {'timestamp': epoch_seconds(frame['timestamp'].to_numpy()).tolist()}
+        columns.update({name: _json_values(frame[name].to_numpy()) for name in frame.columns if name != 'timestamp'})
+        return json.dumps(columns, separators=(',', ':')).encode()
+
+    if format == 'arrow':
+        epoch_ns = np.asarray(frame['timestamp'].to_numpy(), dtype='datetime64[ns]').view('int64')
+        table = pyarrow.table({
+            'timestamp': pyarrow.array(epoch_ns, type=pyarrow.timestamp('ns', tz='UTC')),
+            **{name: pyarrow.array(frame[name].to_numpy()) for name in frame.columns if name != 'timestamp'},
+        })
+        sink = io.BytesIO()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+    return encode_records(frame)
+
+
+def _json_values(values) -> list:
+    # NaN is not valid JSON, unknown values are sent as null
+    unknown = np.isnan(values) if values.dtype.kind == 'f' else None
+    if unknown is not None and unknown.any():
+        return np.where(unknown, None, values).tolist()
+    return values.tolist()
+
+
+def encode_records(frame: pd.DataFrame) -> bytes:
+    """
+    Serializes one JSON object per row with local ISO timestamps, without building Python dicts.
+    """
+    frame = frame.assign(timestamp=local_times(frame['timestamp'].to_numpy()))
+    return frame.to_json(orient='records', date_format='iso', date_unit='s', double_precision=15).encode()
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def entity_tag(*parts) -> str:
+    """
+    Returns a weak ETag identifying the given parts.
+
+    It is weak because the same data may be sent with different compression.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def http_date(epoch: float) -> str:
+    return formatdate(epoch, usegmt=True)
+
+
+def not_modified(headers, etag: str, last_modified: Optional[float]) -> bool:
+    """
+    Evaluates If-None-Match, or If-Modified-Since when no ETag was sent.
+
+    Args:
+        headers: The request headers.
+        etag (str): The current entity tag.
+        last_modified (float, optional): Epoch seconds the data last changed.
+
+    Returns:
+        bool: Whether the client's copy is current and a 304 can be sent.
+    """
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        # Weak comparison, the W/ prefix does not matter
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or etag.removeprefix('W/') in tags
+
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= since
@@ -0,0 +1,398 @@
+import os
+import re
+import json
+import time
+import uuid
+import datetime
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import docker
+
+API_VERSION = '1.43'
+
+_ROUTE = re.compile(r'^(?:/v[0-9.]+)?(?P<path>/.*)$')
+
+
+def docker_timestamp(epoch=None) -> str:
+    """
+    Formats a time the way `docker logs --timestamps` does, RFC 3339 with nanoseconds.
+    """
+    epoch = time.time() if epoch is None else epoch
+    moment = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f'{int(epoch % 1 * 1e9):09d}Z'
+
+
+class FakeContainer:
+    """
+    The state the fake engine keeps for one container.
+    """
+
+    def __init__(self, name, status='running', env=None, binds=None, ports=None, labels=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = status
+        self.env = list(env or [])
+        self.binds = list(binds or [])
+        self.ports = dict(ports or {})
+        self.labels = dict(labels or {})
+        self.host_config = {}
+        self.logs = []
+        # Whether the server inside has finished starting
+        self.booted = status == 'running'
+
+        # Counters behind the stats frames, advanced on every frame
+        self.cpu_total = 0
+        self.system_total = 0
+        self.net_bytes = 0
+        self.blk_bytes = 0
+
+    def inspect(self) -> dict:
+        return {
+            'Id': self.id,
+            'Name': f'/{self.name}',
+            'State': {'Status': self.status, 'Running': self.status == 'running'},
+            'Config': {'Env': self.env, 'Tty': False, 'Labels': self.labels, 'Image': 'itzg/minecraft-server'},
+            'HostConfig': {
+                'Binds': self.binds,
+                'PortBindings': {port: [{'HostIp': '', 'HostPort': str(host)}] for port, host in self.ports.items()},
+                **self.host_config,
+            },
+        }
+
+    def stats_frame(self) -> dict:
+        previous = {'cpu_usage': {'total_usage': self.cpu_total}, 'system_cpu_usage': self.system_total, 'online_cpus': 4}
+        self.cpu_total += 40_000_000
+        self.system_total += 1_000_000_000
+        self.net_bytes += 4096
+        self.blk_bytes += 8192
+        return {
+            'read': docker_timestamp(),
+            'cpu_stats': {'cpu_usage': {'total_usage': self.cpu_total}, 'system_cpu_usage': self.system_total,
+                          'online_cpus': 4},
+            'precpu_stats': previous,
+            'memory_stats': {'usage': 1_500_000_000, 'limit': 4_000_000_000},
+            'networks': {'eth0': {'rx_bytes': self.net_bytes, 'tx_bytes': self.net_bytes // 2}},
+            'blkio_stats': {'io_service_bytes_recursive': [
+                {'op': 'read', 'value': self.blk_bytes},
+                {'op': 'write', 'value': self.blk_bytes // 4},
+            ]},
+        }
+
+
+class FakeDockerEngine:
+    """
+    An in-process stub of the Docker Engine HTTP API.
+
+    It answers the calls the controller makes through docker-py (inspect,
+    create, start, stop, remove, streaming stats, logs and events) from
+    in-memory state, so the real docker-py client and everything layered on
+    it can be driven without a Docker daemon or a Minecraft container.
+
+    Attributes:
+    - latency (float): Seconds added to every non-streaming request.
+    - stats_interval (float): Seconds between streamed stats frames.
+    - boot_seconds (float, optional): Seconds after a start until the server
+        logs its 'Done' line, None to log nothing.
+    - containers (dict): Container name mapped to its FakeContainer.
+
+    Methods:
+    - start(self): Starts serving on a free local port.
+    - stop(self): Stops serving and ends every stream.
+    - client(self): Returns a docker-py client connected to the fake engine.
+    - add_container(self, name, **settings): Creates a container without an event.
+    - log(self, name, message, thread): Appends a server log line.
+    """
+
+    def __init__(self, latency=0.0, stats_interval=0.5, boot_seconds=None):
+        self.latency = latency
+        self.stats_interval = stats_interval
+        self.boot_seconds = boot_seconds
+        self.containers = {}
+        self.requests = 0
+
+        self._changed = threading.Condition()
+        self._events = []
+        self._stopped = threading.Event()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f'tcp://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        engine = self
+        handler = type('Handler', (_EngineHandler,), {'engine': engine})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-docker', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._changed:
+            self._changed.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def client(self, **kwargs) -> docker.DockerClient:
+        return docker.DockerClient(base_url=self.base_url, version=API_VERSION, **kwargs)
+
+    def add_container(self, name, **settings) -> FakeContainer:
+        container = FakeContainer(name, **settings)
+        with self._changed:
+            self.containers[name] = container
+        return container
+
+    def find(self, key) -> FakeContainer:
+        with self._changed:
+            for container in self.containers.values():
+                if key in (container.name, container.id):
+                    return container
+        return None
+
+    def remove(self, container):
+        with self._changed:
+            self.containers.pop(container.name, None)
+        self.event(container, 'destroy')
+
+    def set_status(self, container, status, action):
+        with self._changed:
+            container.status = status
+            container.booted = status == 'running' and self.boot_seconds is None
+        self.event(container, action)
+        if status == 'running' and self.boot_seconds is not None:
+            boot = threading.Timer(self.boot_seconds, self._boot, (container,))
+            boot.daemon = True
+            boot.start()
+
+    def _boot(self, container):
+        with self._changed:
+            container.booted = container.status == 'running'
+        if container.booted:
+            self.log(container.name, f'Done ({self.boot_seconds:.3f}s)! For help, type "help"')
+
+    def event(self, container, action):
+        now = time.time()
+        with self._changed:
+            self._events.append({
+                'Type': 'container',
+                'Action': action,
+                'Actor': {'ID': container.id, 'Attributes': {'name': container.name}},
+                'time': int(now),
+                'timeNano': int(now * 1e9),
+            })
+            self._changed.notify_all()
+
+    def log(self, name, message, thread='Server thread'):
+        """
+        Appends a line to a container's log in the Minecraft server format.
+        """
+        container = self.containers[name]
+        now = time.time()
+        clock = time.strftime('%H:%M:%S', time.localtime(now))
+        with self._changed:
+            container.logs.append((now, f'{docker_timestamp(now)} [{clock}] [{thread}/INFO]: {message}\n'))
+            self._changed.notify_all()
+
+    def wait_for_change(self, check, timeout):
+        """
+        Waits until `check()` returns something other than None or the engine stops.
+        """
+        with self._changed:
+            result = check()
+            while result is None and not self._stopped.is_set():
+                self._changed.wait(timeout)
+                result = check()
+            return result
+
+    def events_after(self, position, since, names):
+        with self._changed:
+            matching = [
+                event for event in self._events[position:]
+                if event['time'] >= since and (not names or event['Actor']['Attributes']['name'] in names)
+            ]
+            return matching, len(self._events)
+
+
+class _EngineHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    engine: FakeDockerEngine = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def do_HEAD(self):
+        self._dispatch('HEAD')
+
+    def _dispatch(self, method):
+        engine = self.engine
+        engine.requests += 1
+        url = urlparse(self.path)
+        path = _ROUTE.match(url.path).group('path')
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'null') if length else None
+
+        parts = path.strip('/').split('/')
+        streaming = (parts[-1] in ('stats', 'logs') and query.get('stream', query.get('follow')) in ('1', 'True', 'true')) \
+            or parts == ['events']
+        if engine.latency and not streaming:
+            time.sleep(engine.latency)
+
+        try:
+            if parts in (['_ping'],):
+                return self._send(200, b'OK', 'text/plain')
+            if parts == ['version']:
+                return self._json(200, {'ApiVersion': API_VERSION, 'Version': 'fake', 'MinAPIVersion': '1.24'})
+            if parts == ['info']:
+                return self._json(200, {'MemTotal': 4_000_000_000, 'NCPU': os.cpu_count()})
+            if parts == ['events']:
+                return self._events(query)
+            if parts == ['containers', 'create'] and method == 'POST':
+                return self._create(query, body)
+            if parts[0] == 'containers' and len(parts) >= 2:
+                container = engine.find(parts[1])
+                if container is None:
+                    return self._json(404, {'message': f'No such container: {parts[1]}'})
+                return self._container(method, container, parts[2] if len(parts) > 2 else None, query)
+            if parts[0] == 'images':
+                return self._json(200, {'Id': 'sha256:fake', 'RepoTags': ['itzg/minecraft-server:latest']})
+            self._json(404, {'message': f'page not found: {path}'})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _container(self, method, container, action, query):
+        engine = self.engine
+        if action == 'json':
+            return self._json(200, container.inspect())
+        if action == 'start':
+            engine.set_status(container, 'running', 'start')
+            return self._send(204, b'')
+        if action == 'stop':
+            engine.set_status(container, 'exited', 'die')
+            return self._send(204, b'')
+        if action == 'restart':
+            engine.set_status(container, 'running', 'restart')
+            return self._send(204, b'')
+        if action == 'update':
+            container.host_config.update(self._update_fields(query))
+            return self._json(200, {'Warnings': []})
+        if action is None and method == 'DELETE':
+            engine.remove(container)
+            return self._send(204, b'')
+        if action == 'stats':
+            return self._stats(container, query)
+        if action == 'logs':
+            return self._logs(container, query)
+        self._json(404, {'message': f'unsupported container action {action}'})
+
+    def _update_fields(self, query):
+        return {}
+
+    def _create(self, query, config):
+        config = config or {}
+        host_config = config.get('HostConfig') or {}
+        ports = {port: int(bindings[0]['HostPort']) for port, bindings in (host_config.get('PortBindings') or {}).items()}
+        container = self.engine.add_container(
+            query['name'],
+            status='created',
+            env=config.get('Env'),
+            binds=host_config.get('Binds'),
+            ports=ports,
+            labels=config.get('Labels'),
+        )
+        container.host_config = {key: value for key, value in host_config.items()
+                                 if key not in ('Binds', 'PortBindings')}
+        self.engine.event(container, 'create')
+        self._json(201, {'Id': container.id, 'Warnings': []})
+
+    def _stats(self, container, query):
+        if query.get('stream') in ('0', 'False', 'false'):
+            return self._json(200, container.stats_frame())
+        self._start_stream('application/json')
+        while not self.engine._stopped.is_set() and self.engine.find(container.id) is not None:
+            self._chunk(json.dumps(container.stats_frame()).encode() + b'\n')
+            self.engine._stopped.wait(self.engine.stats_interval)
+        self._end_stream()
+
+    def _logs(self, container, query):
+        since = float(query.get('since') or 0)
+        follow = query.get('follow') in ('1', 'True', 'true')
+        timestamps = query.get('timestamps') in ('1', 'True', 'true')
+
+        def frame(line):
+            if not timestamps:
+                line = line.split(' ', 1)[1]
+            payload = line.encode()
+            # Docker multiplexes stdout and stderr with an 8 byte header per frame
+            return bytes([1, 0, 0, 0]) + len(payload).to_bytes(4, 'big') + payload
+
+        pending = [line for when, line in container.logs if when >= since]
+        position = len(container.logs)
+        if not follow:
+            return self._send(200, b''.join(frame(line) for line in pending), 'application/vnd.docker.raw-stream')
+
+        self._start_stream('application/vnd.docker.raw-stream')
+        for line in pending:
+            self._chunk(frame(line))
+        while not self.engine._stopped.is_set():
+            lines = self.engine.wait_for_change(lambda: container.logs[position:] or None, 1)
+            if not lines:
+                continue
+            position += len(lines)
+            for _, line in lines:
+                self._chunk(frame(line))
+        self._end_stream()
+
+    def _events(self, query):
+        since = int(query.get('since') or 0)
+        filters = json.loads(query.get('filters') or '{}')
+        names = set(filters.get('container') or [])
+
+        self._start_stream('application/json')
+        position = 0
+        while not self.engine._stopped.is_set():
+            events, end = self.engine.events_after(position, since, names)
+            position = end
+            for event in events:
+                self._chunk(json.dumps(event).encode() + b'\n')
+            self.engine.wait_for_change(lambda: True if len(self.engine._events) > position else None, 1)
+        self._end_stream()
+
+    def _json(self, status, payload):
+        self._send(status, json.dumps(payload).encode(), 'application/json')
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _end_stream(self):
+        try:
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
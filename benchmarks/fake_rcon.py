@@ -0,0 +1,138 @@
+import time
+import socket
+import struct
+import threading
+
+# RCON packet types
+AUTH = 3
+AUTH_RESPONSE = 2
+COMMAND = 2
+RESPONSE = 0
+
+
+class FakeRconServer(threading.Thread):
+    """
+    A minimal Minecraft RCON server answering from a scripted player list.
+
+    Every connection is served on its own thread. Each response is delayed by
+    `latency` seconds to model a busy or distant server.
+
+    Attributes:
+    - password (str): The password clients must authenticate with.
+    - latency (float): Seconds to wait before answering a command.
+    - players (list): The names reported by 'list'.
+    - max_players (int): The slot count reported by 'list'.
+    - mspt (float): The tick time reported by 'tick query'.
+    - entities (int): The count reported by 'execute if entity @e'.
+    - ready (callable, optional): Connections are refused while it returns False.
+    - commands (int): The number of commands answered.
+
+    Methods:
+    - stop(self): Stops accepting connections and closes the listening socket.
+    """
+
+    def __init__(self, password='password', port=0, latency=0.0, players=None, max_players=20,
+                 mspt=12.5, entities=400, ready=None):
+        super().__init__(name='fake-rcon', daemon=True)
+        self.password = password
+        self.latency = latency
+        self.players = list(players or [])
+        self.max_players = max_players
+        self.mspt = mspt
+        self.entities = entities
+        self.ready = ready
+        self.commands = 0
+        self.saving = True
+
+        self._listener = socket.create_server(('127.0.0.1', port))
+        self.port = self._listener.getsockname()[1]
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self._listener.close()
+
+    def respond(self, command) -> str:
+        """
+        Returns what a vanilla server would answer to a command.
+        """
+        if command == 'list':
+            return (f'There are {len(self.players)} of a max of {self.max_players} players online: '
+                    + ', '.join(self.players))
+        if command == 'save-off':
+            self.saving = False
+            return 'Automatic saving is now disabled'
+        if command == 'save-on':
+            self.saving = True
+            return 'Automatic saving is now enabled'
+        if command.startswith('save-all'):
+            return 'Saving the game (this may take a moment!)Saved the game'
+        if command == 'tick query':
+            return (f'The game is running normally\nTarget tick rate: 20.0 per second.\n'
+                    f'Average time per tick: {self.mspt}ms (Target: 50.0ms)')
+        if command == 'execute if entity @e':
+            return f'Test passed, count: {self.entities}'
+        if command.startswith('say '):
+            return ''
+        return f'Unknown or incomplete command: {command}'
+
+    def _serve(self, connection):
+        with connection:
+            if self.ready is not None and not self.ready():
+                return
+            authenticated = False
+            while not self._stopped.is_set():
+                packet = self._read_packet(connection)
+                if packet is None:
+                    return
+                request_id, kind, payload = packet
+
+                if kind == AUTH:
+                    authenticated = payload == self.password
+                    self._send(connection, request_id if authenticated else -1, AUTH_RESPONSE, '')
+                elif not authenticated:
+                    self._send(connection, -1, RESPONSE, '')
+                else:
+                    if self.latency:
+                        time.sleep(self.latency)
+                    self.commands += 1
+                    self._send(connection, request_id, RESPONSE, self.respond(payload))
+
+    @staticmethod
+    def _read_packet(connection):
+        header = FakeRconServer._read_exactly(connection, 4)
+        if header is None:
+            return None
+        (length,) = struct.unpack('<i', header)
+        body = FakeRconServer._read_exactly(connection, length)
+        if body is None:
+            return None
+        request_id, kind = struct.unpack('<ii', body[:8])
+        return request_id, kind, body[8:-2].decode('utf8')
+
+    @staticmethod
+    def _read_exactly(connection, length):
+        data = b''
+        while len(data) < length:
+            try:
+                chunk = connection.recv(length - len(data))
+            except OSError:
+                return None
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    @staticmethod
+    def _send(connection, request_id, kind, payload):
+        body = struct.pack('<ii', request_id, kind) + payload.encode('utf8') + b'\0\0'
+        connection.sendall(struct.pack('<i', len(body)) + body)
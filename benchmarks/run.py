@@ -0,0 +1,466 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import threading
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path[:0] = [os.path.join(ROOT_DIR, 'src'), os.path.join(ROOT_DIR, 'backend')]
+from fake_docker import FakeDockerEngine, FakeContainer
+from fake_rcon import FakeRconServer
+from metrics_store import RAW_FIELDS, MetricsStore, record_dtype
+from backup_engine import BackupEngine, zstandard
+
+SUITES = ['tick', 'rcon', 'backend', 'backup', 'startup']
+
+# Row counts the backend is measured against, --quick stops at 1M
+BACKEND_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Seconds between the generated metric samples, like the controller's default
+SAMPLE_SPACING = 5
+
+# A metric is compared by its unit suffix, other metrics are informational
+LOWER_IS_BETTER = ('_ms', '_seconds')
+HIGHER_IS_BETTER = ('_per_sec', '_mb_s')
+
+
+def result(suite, name, params, **metrics) -> dict:
+    return {'suite': suite, 'name': name, 'params': params, 'metrics': metrics}
+
+
+def milliseconds(seconds) -> float:
+    return round(seconds * 1000, 3)
+
+
+class Harness:
+    """
+    A controller wired to a fake Docker engine and a fake RCON server.
+
+    Everything is created in a temporary working directory, which is removed
+    when the harness is closed.
+
+    Attributes:
+    - engine (FakeDockerEngine): The Docker Engine API stub.
+    - rcon (FakeRconServer): The RCON server stub.
+    - controller (McServerController): The controller under test.
+    """
+
+    NAME = 'bench'
+
+    def __init__(self, players=10, boot_seconds=None):
+        from main import McServerController
+
+        self.workdir = tempfile.mkdtemp(prefix='mc-bench-')
+        self.previous_dir = os.getcwd()
+        os.chdir(self.workdir)
+
+        self.engine = FakeDockerEngine(stats_interval=0.01, boot_seconds=boot_seconds).start()
+        # RCON only answers once the server in the container has booted
+        self.rcon = FakeRconServer(players=[f'player{i}' for i in range(players)],
+                                   ready=lambda: (self.engine.find(self.NAME) or FakeContainer('')).booted)
+        self.rcon.start()
+
+        volumes = os.path.join(self.workdir, 'data')
+        os.makedirs(volumes)
+        self.engine.add_container(
+            self.NAME,
+            env=['EULA=TRUE', 'JVM_OPTS=-Xms1G -Xmx4G', 'HARDCORE=False', 'DIFFICULTY=normal',
+                 'RCON_ENABLED=true', f'RCON_PASSWORD={self.rcon.password}'],
+            binds=[f'{volumes}:/data:rw'],
+            ports={'25565/tcp': 25565, '25575/tcp': self.rcon.port},
+        )
+        self.engine.log(self.NAME, 'Done (4.2s)! For help, type "help"')
+
+        self.controller = McServerController(
+            self.NAME, '4G', 25565, self.rcon.password, volumes, False, 'normal', 'latest', False,
+            rcon_port=self.rcon.port, client=self.engine.client(),
+            backup_engine=BackupEngine(os.path.join(self.workdir, 'backups')),
+        )
+        # Queue every streamed frame instead of one per 5 seconds
+        self.controller.stats_sampler.sample_interval = 0
+
+    def close(self):
+        controller = self.controller
+        for thread in (controller.stats_sampler, controller.log_follower,
+                       controller.metrics_compactor, controller.container_events, controller.game_sampler,
+                       controller.backup_verifier):
+            thread.stop()
+        controller.rcon_session.close()
+        controller.metrics_store.close()
+        controller.session_store.close()
+        self.rcon.stop()
+        self.engine.stop()
+        os.chdir(self.previous_dir)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def bench_tick(harness, quick) -> list:
+    """
+    Measures the monitor tick stages while stats stream and players come and go.
+    """
+    ticks = 200 if quick else 1000
+    controller = harness.controller
+    controller.tick_profiler.summary_interval = 0
+
+    for i in range(ticks):
+        if i % 10 == 0:
+            player = f'player{i % 50}'
+            harness.engine.log(harness.NAME, f'{player} joined the game')
+            if i % 20 == 0:
+                harness.engine.log(harness.NAME, f'{player} left the game')
+        controller.monitor_tick()
+        time.sleep(0.02)
+
+    results = []
+    for stage, stats in controller.tick_profiler.summary().items():
+        results.append(result('tick', stage, {'ticks': ticks}, count=stats['count'],
+                              p50_ms=milliseconds(stats['p50']), p95_ms=milliseconds(stats['p95']),
+                              p99_ms=milliseconds(stats['p99']), max_ms=milliseconds(stats['max'])))
+    return results
+
+
+def bench_rcon(harness, quick) -> list:
+    """
+    Measures RCON commands per second through the controller at several server latencies.
+    """
+    duration = 1 if quick else 3
+    results = []
+    for latency in (0.0, 0.001, 0.005):
+        harness.rcon.latency = latency
+        for threads in (1, 4):
+            counts = [0] * threads
+            deadline = time.perf_counter() + duration
+
+            def worker(slot):
+                while time.perf_counter() < deadline:
+                    if harness.controller.send_command('list') == 'failed':
+                        raise Exception('RCON command failed during the benchmark')
+                    counts[slot] += 1
+
+            began = time.perf_counter()
+            workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+            latencies = harness.controller.rcon_session.latency_stats().get('list', {})
+            results.append(result('rcon', 'list', {'server_latency_ms': latency * 1000, 'threads': threads},
+                                  commands=sum(counts), ops_per_sec=round(sum(counts) / elapsed, 1),
+                                  mean_ms=milliseconds(latencies.get('mean', 0))))
+    harness.rcon.latency = 0
+    return results
+
+
+def write_metrics(path, rows, end=None):
+    """
+    Writes `rows` synthetic samples ending at `end`, one every `SAMPLE_SPACING` seconds.
+    """
+    end = time.time() if end is None else end
+    dtype = record_dtype(RAW_FIELDS)
+    rng = np.random.default_rng(0)
+    with open(path, 'ab') as f:
+        for lo in range(0, rows, 1_000_000):
+            count = min(1_000_000, rows - lo)
+            records = np.empty(count, dtype=dtype)
+            records['timestamp'] = end - (rows - lo - np.arange(count)) * SAMPLE_SPACING
+            records['cpu_percent'] = rng.uniform(0, 100, count)
+            records['ram_percent'] = rng.uniform(20, 80, count)
+            for name in ('net_rx_bytes', 'net_tx_bytes', 'blk_read_bytes', 'blk_write_bytes'):
+                records[name] = np.cumsum(rng.integers(0, 65536, count)) + lo * 32768
+            records['mspt'] = rng.gamma(4, 5, count)
+            records['tps'] = np.minimum(20, 1000 / records['mspt'])
+            records['entities'] = rng.integers(200, 2000, count)
+            records['loaded_chunks'] = rng.integers(400, 4000, count)
+            f.write(records.tobytes())
+
+
+def bench_backend(quick) -> list:
+    """
+    Measures the metrics endpoints against files of increasing size.
+
+    Each query is timed once on a fresh cache (cold, includes parsing the
+    file) and then repeatedly on the warm cache.
+    """
+    from fastapi.testclient import TestClient
+    import backend
+    from metrics_cache import MetricsCache
+
+    sizes = [size for size in BACKEND_SIZES if not quick or size <= 1_000_000]
+    repeats = 5 if quick else 20
+    results = []
+
+    workdir = tempfile.mkdtemp(prefix='mc-bench-backend-')
+    try:
+        with TestClient(backend.app) as client:
+            for rows in sizes:
+                path = os.path.join(workdir, f'metrics-{rows}.bin')
+                MetricsStore(path).close()
+                now = time.time()
+                write_metrics(path, rows, now)
+                # Reopening rebuilds the sparse index for the appended records
+                MetricsStore(path).close()
+
+                queries = {
+                    'range_2000_points': {'max_points': 2000},
+                    'last_hour': {'from': now - 3600},
+                    'hourly_buckets': {'bucket': 3600},
+                }
+                if rows <= 100_000:
+                    queries['all_rows'] = {}
+
+                for name, params in queries.items():
+                    backend.metrics_cache = MetricsCache(path, max_bytes=rows * 128)
+                    backend.tier_caches = [('raw', 0, backend.metrics_cache)]
+
+                    began = time.perf_counter()
+                    response = client.get('/ram-data', params=params)
+                    cold = time.perf_counter() - began
+                    if response.status_code != 200:
+                        raise Exception(f'/ram-data returned {response.status_code}: {response.text[:200]}')
+
+                    timings = []
+                    for _ in range(repeats):
+                        began = time.perf_counter()
+                        response = client.get('/ram-data', params=params)
+                        timings.append(time.perf_counter() - began)
+
+                    results.append(result('backend', f'ram-data/{name}', {'rows': rows},
+                                          cold_ms=milliseconds(cold),
+                                          warm_p50_ms=milliseconds(statistics.median(timings)),
+                                          warm_max_ms=milliseconds(max(timings)),
+                                          response_bytes=len(response.content),
+                                          points=len(response.json())))
+                os.remove(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def write_world(path, megabytes):
+    """
+    Writes a fake world of region files and small data files, partly compressible.
+    """
+    rng = np.random.default_rng(0)
+    regions = os.path.join(path, 'world', 'region')
+    os.makedirs(regions)
+    for i in range(megabytes):
+        # Chunk data compresses to roughly a third like real region files
+        block = rng.integers(0, 16, 1024 * 1024, dtype=np.uint8)
+        with open(os.path.join(regions, f'r.{i % 16}.{i // 16}.mca'), 'wb') as f:
+            f.write(block.tobytes())
+    data = os.path.join(path, 'world', 'playerdata')
+    os.makedirs(data)
+    for i in range(megabytes * 4):
+        with open(os.path.join(data, f'{i:08x}.dat'), 'wb') as f:
+            f.write(rng.integers(0, 256, 4096, dtype=np.uint8).tobytes())
+
+
+def bench_backup(quick) -> list:
+    """
+    Measures backup, restore and verification throughput for each available
+    codec, and the recovery time of a controller restoring its server.
+    """
+    megabytes = 64 if quick else 512
+    codecs = ['gzip'] + (['zstd'] if zstandard is not None else [])
+    results = []
+
+    workdir = tempfile.mkdtemp(prefix='mc-bench-backup-')
+    try:
+        source = os.path.join(workdir, 'data')
+        write_world(source, megabytes)
+        input_bytes = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, files in os.walk(source) for name in files)
+
+        for codec in codecs:
+            engine = BackupEngine(os.path.join(workdir, 'backups'), keep=1, codec=codec)
+            began = time.perf_counter()
+            archive = engine.create(source, 'bench')
+            elapsed = time.perf_counter() - began
+            results.append(result('backup', codec, {'input_mb': megabytes, 'workers': engine.workers},
+                                  seconds=round(elapsed, 3),
+                                  throughput_mb_s=round(input_bytes / (1024 * 1024) / elapsed, 1),
+                                  ratio=round(os.path.getsize(archive) / input_bytes, 3)))
+
+            began = time.perf_counter()
+            problems = engine.verify(archive)
+            elapsed = time.perf_counter() - began
+            results.append(result('backup', f'{codec}-verify', {'input_mb': megabytes, 'workers': engine.workers},
+                                  seconds=round(elapsed, 3),
+                                  throughput_mb_s=round(input_bytes / (1024 * 1024) / elapsed, 1),
+                                  problems=len(problems)))
+
+            restored = os.path.join(workdir, 'restored')
+            os.makedirs(restored, exist_ok=True)
+            report = engine.restore(archive, restored)
+            results.append(result('backup', f'{codec}-restore', {'input_mb': megabytes, 'workers': engine.workers},
+                                  seconds=round(report['seconds'], 3),
+                                  throughput_mb_s=round(input_bytes / (1024 * 1024) / report['seconds'], 1)))
+            os.remove(archive)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Stop, restore and start again until the server answers RCON
+    harness = Harness(boot_seconds=0.5)
+    try:
+        controller = harness.controller
+        write_world(controller.volumes, megabytes // 4)
+        controller.backup_server_folder()
+        began = time.perf_counter()
+        controller.restore_backup()
+        results.append(result('backup', 'recovery', {'input_mb': megabytes // 4, 'boot_seconds': 0.5},
+                              seconds=round(time.perf_counter() - began, 3)))
+    finally:
+        harness.close()
+    return results
+
+
+def bench_startup(quick) -> list:
+    """
+    Measures how long the controller takes to launch and to notice a started server is ready.
+
+    Launch is a fresh interpreter running main.py --help, which covers the
+    imports and argument parsing. Readiness is the time from starting the
+    container to the controller's RCON probe succeeding, minus the fake
+    server's boot time, so it is the controller's reaction time.
+    """
+    rounds = 3 if quick else 10
+    results = []
+
+    launches = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT_DIR, 'src', 'main.py'), '--help'],
+                       stdout=subprocess.DEVNULL, check=True)
+        launches.append(time.perf_counter() - began)
+    results.append(result('startup', 'launch', {'command': 'main.py --help'},
+                          p50_ms=milliseconds(statistics.median(launches)), max_ms=milliseconds(max(launches))))
+
+    boot_seconds = 0.5
+    harness = Harness(boot_seconds=boot_seconds)
+    try:
+        controller = harness.controller
+        lags = []
+        commands = harness.rcon.commands
+        for _ in range(rounds):
+            controller.stop_container()
+            began = time.perf_counter()
+            controller.start_docker_container()
+            lags.append(time.perf_counter() - began - boot_seconds)
+        results.append(result('startup', 'ready', {'boot_seconds': boot_seconds},
+                              p50_ms=milliseconds(statistics.median(lags)), max_ms=milliseconds(max(lags)),
+                              probes=(harness.rcon.commands - commands) / rounds))
+    finally:
+        harness.close()
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'time': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def run(suites, quick=False) -> dict:
+    results = []
+    if 'tick' in suites or 'rcon' in suites:
+        harness = Harness()
+        try:
+            if 'tick' in suites:
+                results += bench_tick(harness, quick)
+            if 'rcon' in suites:
+                results += bench_rcon(harness, quick)
+        finally:
+            harness.close()
+    if 'backend' in suites:
+        results += bench_backend(quick)
+    if 'backup' in suites:
+        results += bench_backup(quick)
+    if 'startup' in suites:
+        results += bench_startup(quick)
+    return {'meta': {**environment(), 'quick': quick}, 'results': results}
+
+
+def compare(report, baseline, tolerance) -> list[str]:
+    """
+    Lists the metrics that got worse than the baseline by more than `tolerance`.
+
+    Args:
+        report (dict): The current results.
+        baseline (dict): Results from an earlier run.
+        tolerance (float): Allowed relative change, 0.2 is 20%.
+
+    Returns:
+        list[str]: One line per regression.
+    """
+    def key(entry):
+        return entry['suite'], entry['name'], json.dumps(entry['params'], sort_keys=True)
+
+    previous = {key(entry): entry['metrics'] for entry in baseline['results']}
+    regressions = []
+    for entry in report['results']:
+        old_metrics = previous.get(key(entry))
+        if old_metrics is None:
+            continue
+        for metric, value in entry['metrics'].items():
+            old = old_metrics.get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            if metric.endswith(LOWER_IS_BETTER) and change > tolerance or \
+               metric.endswith(HIGHER_IS_BETTER) and change < -tolerance:
+                regressions.append(f"{entry['suite']}/{entry['name']} {entry['params']} "
+                                   f"{metric}: {old} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def print_report(report):
+    for entry in report['results']:
+        params = ' '.join(f'{name}={value}' for name, value in entry['params'].items())
+        metrics = ' '.join(f'{name}={value}' for name, value in entry['metrics'].items())
+        print(f"{entry['suite']:8} {entry['name']:28} {params:32} {metrics}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the controller and backend against fake Docker and RCON servers')
+    parser.add_argument('--suite', action='append', choices=SUITES, help='Suite to run, all by default, repeatable')
+    parser.add_argument('--quick', action='store_true', help='Smaller data sizes and shorter runs')
+    parser.add_argument('--output', '-o', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', default=0.2, type=float, help='Allowed relative slowdown before a regression is reported')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = run(args.suite or SUITES, args.quick)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        sys.exit(1 if regressions else 0)
@@ -1,79 +1,228 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
+import os
+import sys
+import time
 import argparse
-import mplcursors
-
-def main(path):
-
-    # Read data from CSV file
-    data = pd.read_csv(path, header=None, names=['Timestamp', 'CPU Usage', 'RAM Usage', 'Net RX Bytes', 'Net TX Bytes', 'Block Read Bytes', 'Block Write Bytes'])
-
-    
-    # Convert timestamp column to datetime
-    data['Timestamp'] = pd.to_datetime(data['Timestamp'])
-
-    # Calculate CPU and RAM usage percentages
-    data['CPU Usage (%)'] = data['CPU Usage']
-    data['RAM Usage (%)'] = data['RAM Usage']
-
-    # Convert network I/O from bytes to KB
-    data['Net RX KB'] = data['Net RX Bytes'] / 1024
-    data['Net TX KB'] = data['Net TX Bytes'] / 1024
-
-    # Convert block I/O from bytes to MB
-    data['Block Read MB'] = data['Block Read Bytes'] / (1024 * 1024)
-    data['Block Write MB'] = data['Block Write Bytes'] / (1024 * 1024)
-
-    # Plot CPU Usage over time
-    plt.plot(data['Timestamp'], data['CPU Usage (%)'], label='CPU Usage (%)')
-    plt.xlabel('Timestamp')
-    plt.ylabel('CPU Usage (%)')
-    plt.title('CPU Usage over Time')
-    plt.legend()
-    plt.ylim(0, 100)
-    plt.grid(True, linestyle='--', color='gray', linewidth=0.5)
-    mplcursors.cursor(hover=True).connect('add', lambda sel: sel.annotation.set_text(f'{sel.artist.get_label()}: {sel.target[1]}%'))
-    plt.savefig('cpu_usage.png')
-    plt.show()
-
-    # Plot RAM Usage over time
-    plt.plot(data['Timestamp'], data['RAM Usage (%)'], label='RAM Usage (%)', color='orange')
-    plt.xlabel('Timestamp')
-    plt.ylabel('RAM Usage (%)')
-    plt.title('RAM Usage over Time')
-    plt.legend()
-    plt.ylim(0, 100)
-    plt.grid(True, linestyle='--', color='gray', linewidth=0.5)
-    mplcursors.cursor(hover=True).connect('add', lambda sel: sel.annotation.set_text(f'{sel.artist.get_label()}: {sel.target[1]}%'))
-    plt.savefig('ram_usage.png')
-    plt.show()
-
-    # Plot Network I/O over time
-    plt.plot(data['Timestamp'], data['Net RX KB'], label='Net RX (KB)', color='green')
-    plt.plot(data['Timestamp'], data['Net TX KB'], label='Net TX (KB)', color='blue')
-    plt.xlabel('Timestamp')
-    plt.ylabel('Network I/O (KB)')
-    plt.title('Network I/O over Time')
-    plt.legend()
-    plt.grid(True, linestyle='--', color='gray', linewidth=0.5)
-    mplcursors.cursor(hover=True).connect('add', lambda sel: sel.annotation.set_text(f'{sel.artist.get_label()}: {sel.target[1]}%'))
-    plt.savefig('network_io.png')
-    plt.show()
-
-    # Plot Block I/O over time
-    plt.plot(data['Timestamp'], data['Block Read MB'], label='Block Read (MB)', color='red')
-    plt.plot(data['Timestamp'], data['Block Write MB'], label='Block Write (MB)', color='purple')
-    plt.xlabel('Timestamp')
-    plt.ylabel('Block I/O (MB)')
-    plt.title('Block I/O over Time')
-    plt.legend()
-    plt.grid(True, linestyle='--', color='gray', linewidth=0.5)
-    mplcursors.cursor(hover=True).connect('add', lambda sel: sel.annotation.set_text(f'{sel.artist.get_label()}: {sel.target[1]}%'))
-    plt.savefig('block_io.png')
-    plt.show()
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from metrics_rollup import read_tiered
+
+# Rows reduced at a time while decimating, bounds the temporary arrays
+CHUNK_ROWS = 1 << 20
+
+# Each chart as (file name, title, y axis label, y limits, series). A series
+# is (metrics column, legend label, color, divisor for the unit).
+CHARTS = [
+    ('cpu_usage', 'CPU Usage over Time', 'CPU Usage (%)', (0, 100),
+     [('cpu_percent', 'CPU Usage (%)', None, 1)]),
+    ('ram_usage', 'RAM Usage over Time', 'RAM Usage (%)', (0, 100),
+     [('ram_percent', 'RAM Usage (%)', 'orange', 1)]),
+    ('network_io', 'Network I/O over Time', 'Network I/O (KB)', None,
+     [('net_rx_bytes', 'Net RX (KB)', 'green', 1024), ('net_tx_bytes', 'Net TX (KB)', 'blue', 1024)]),
+    ('block_io', 'Block I/O over Time', 'Block I/O (MB)', None,
+     [('blk_read_bytes', 'Block Read (MB)', 'red', 1024 * 1024),
+      ('blk_write_bytes', 'Block Write (MB)', 'purple', 1024 * 1024)]),
+]
+
+
+def parse_time(value):
+    """
+    Parses a time given as epoch seconds or an ISO 8601 string, local time if naive.
+
+    Returns:
+        float: Epoch seconds, or None if no value was given.
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(tzlocal())
+        return timestamp.timestamp()
+
+
+def decimate(timestamps, values, start, end, pixels) -> tuple:
+    """
+    Reduces a series to its min and max in each pixel column of the plot.
+
+    A line through those two points per column draws exactly what the full
+    series would at that width, spikes included, with at most 2 * pixels
+    points. The rows are reduced `CHUNK_ROWS` at a time.
+
+    Args:
+        timestamps (np.ndarray): Sorted epoch seconds.
+        values (np.ndarray): The samples.
+        start (float): The time at the left edge of the plot.
+        end (float): The time at the right edge of the plot.
+        pixels (int): The plot width in pixels.
+
+    Returns:
+        tuple: The kept epoch times and values.
+    """
+    lows = np.full(pixels, np.inf)
+    highs = np.full(pixels, -np.inf)
+    scale = pixels / max(end - start, 1e-9)
+
+    for lo in range(0, len(timestamps), CHUNK_ROWS):
+        chunk_times = timestamps[lo:lo + CHUNK_ROWS]
+        chunk_values = np.asarray(values[lo:lo + CHUNK_ROWS], dtype='float64')
+        columns = np.clip(((chunk_times - start) * scale).astype('int64'), 0, pixels - 1)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(columns)) + 1))
+        used = columns[starts]
+        lows[used] = np.minimum(lows[used], np.minimum.reduceat(chunk_values, starts))
+        highs[used] = np.maximum(highs[used], np.maximum.reduceat(chunk_values, starts))
+
+    used = np.flatnonzero(np.isfinite(lows))
+    centers = start + (used + 0.5) / scale
+    return np.repeat(centers, 2), np.column_stack((lows[used], highs[used])).ravel()
+
+
+def to_local(timestamps) -> np.ndarray:
+    # Plot in local time like the dashboard
+    return pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(tzlocal()).tz_localize(None).to_numpy()
+
+
+def prepare_charts(path, start=None, end=None, width=1600) -> list:
+    """
+    Reads the metrics once and decimates every series for plotting.
+
+    Args:
+        path (str): The metrics file written by the controller.
+        start (float, optional): Epoch seconds, from the oldest data if omitted.
+        end (float, optional): Epoch seconds, to the newest data if omitted.
+        width (int): The plot width in pixels.
+
+    Returns:
+        list: (chart, [(series, times, values)]) pairs ready to plot.
+    """
+    timestamps, columns = read_tiered(path, start, end, max_points=width)
+    if len(timestamps) == 0:
+        raise Exception(f'No metrics in {path} for the requested range')
+    start = timestamps[0] if start is None else start
+    end = timestamps[-1] if end is None else end
+
+    charts = []
+    for chart in CHARTS:
+        series = []
+        for column, label, color, divisor in chart[4]:
+            times, values = decimate(timestamps, columns[column], start, end, width)
+            series.append(((column, label, color, divisor), to_local(times), values / divisor))
+        charts.append((chart, series))
+    return charts
+
+
+def draw(axes, chart, series):
+    name, title, ylabel, ylim, _ = chart
+    for (_, label, color, _), times, values in series:
+        axes.plot(times, values, label=label, color=color)
+    axes.set_xlabel('Timestamp')
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+    axes.legend()
+    if ylim:
+        axes.set_ylim(*ylim)
+    axes.grid(True, linestyle='--', color='gray', linewidth=0.5)
+
+
+def render_chart(job) -> list:
+    """
+    Renders one chart to files without a display.
+
+    Runs in a worker process. The chart gets its own Figure on the Agg
+    canvas, so no pyplot state is shared between charts.
+
+    Args:
+        job (tuple): The chart, its series, output directory, formats, pixel size and dpi.
+
+    Returns:
+        list: The written file paths.
+    """
+    from matplotlib.figure import Figure
+
+    chart, series, output_dir, formats, (width, height), dpi = job
+    figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    draw(figure.add_subplot(), chart, series)
+    figure.autofmt_xdate()
+
+    written = []
+    for fmt in formats:
+        output = os.path.join(output_dir, f'{chart[0]}.{fmt}')
+        figure.savefig(output, format=fmt)
+        written.append(output)
+    return written
+
+
+def batch(path, start=None, end=None, output_dir='.', formats=('png',), size=(1600, 600), dpi=100, workers=None):
+    """
+    Renders every chart headless and in parallel.
+
+    Args:
+        path (str): The metrics file written by the controller.
+        start (float, optional): Epoch seconds, from the oldest data if omitted.
+        end (float, optional): Epoch seconds, to the newest data if omitted.
+        output_dir (str): Where the images are written.
+        formats (tuple): Image formats, 'png' and/or 'svg'.
+        size (tuple): The image width and height in pixels.
+        dpi (int): Dots per inch of the images.
+        workers (int, optional): Rendering processes, one per chart by default.
+
+    Returns:
+        list: The written file paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    charts = prepare_charts(path, start, end, size[0])
+    jobs = [(chart, series, output_dir, formats, size, dpi) for chart, series in charts]
+
+    with ProcessPoolExecutor(workers or len(jobs)) as pool:
+        return [output for outputs in pool.map(render_chart, jobs) for output in outputs]
+
+
+def main(path, start=None, end=None):
+    import matplotlib.pyplot as plt
+    import mplcursors
+
+    for chart, series in prepare_charts(path, start, end):
+        figure, axes = plt.subplots()
+        draw(axes, chart, series)
+        unit = '%' if chart[3] else ''
+        mplcursors.cursor(hover=True).connect(
+            'add', lambda sel, unit=unit: sel.annotation.set_text(f'{sel.artist.get_label()}: {sel.target[1]}{unit}'))
+        figure.savefig(f'{chart[0]}.png')
+        plt.show()
+        plt.close(figure)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Start Minecraft server with Docker')
-    parser.add_argument('--volumes', '-v', help='List of volumes to mount to the server')
-    main(parser.parse_args().volumes)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Plot the metrics recorded by the Minecraft server controller')
+    parser.add_argument('--volumes', '-v', help='Path to the metrics file written by the controller')
+    parser.add_argument('--from', dest='start', help='Start time, epoch seconds or ISO 8601')
+    parser.add_argument('--to', dest='end', help='End time, epoch seconds or ISO 8601')
+    parser.add_argument('--batch', action='store_true', help='Render images without a display and exit')
+    parser.add_argument('--output-dir', '-o', default='.', help='Where batch mode writes the images')
+    parser.add_argument('--format', default='png', help='Comma separated image formats for batch mode, png and/or svg')
+    parser.add_argument('--width', default=1600, type=int, help='Image width in pixels')
+    parser.add_argument('--height', default=600, type=int, help='Image height in pixels')
+    parser.add_argument('--dpi', default=100, type=int, help='Image resolution in dots per inch')
+    parser.add_argument('--workers', type=int, help='Rendering processes, one per chart by default')
+    args = parser.parse_args()
+
+    if args.batch:
+        began = time.perf_counter()
+        written = batch(
+            args.volumes,
+            parse_time(args.start),
+            parse_time(args.end),
+            args.output_dir,
+            tuple(args.format.split(',')),
+            (args.width, args.height),
+            args.dpi,
+            args.workers,
+        )
+        print(f'Wrote {len(written)} files in {time.perf_counter() - began:.1f}s: {", ".join(written)}')
+    else:
+        main(args.volumes, parse_time(args.start), parse_time(args.end))
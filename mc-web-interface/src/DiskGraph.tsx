@@ -20,18 +20,18 @@ const DiskGraph: React.FC<DiskGraphProps> = ({ endpoint, title, width = 400, hei
   const canvasRef = React.useRef<HTMLCanvasElement>(null);
 
   useEffect(() => {
-    fetchDataFromAPI();
-  }, [endpoint]);
-
-  const fetchDataFromAPI = async () => {
-    try {
-      const response = await fetch(endpoint);
-      const responseData = await response.json();
-      setDiskData(responseData);
-    } catch (error) {
-      console.error(`Error fetching disk data from ${endpoint}:`, error);
-    }
-  };
+    // A downsampled snapshot first, then only the samples written since
+    const source = new EventSource(`${endpoint}/stream?max_points=2000`);
+    source.addEventListener('snapshot', event => {
+      setDiskData(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('append', event => {
+      const rows: DiskData[] = JSON.parse((event as MessageEvent).data);
+      setDiskData(previous => [...previous, ...rows]);
+    });
+    source.onerror = () => console.error(`Lost the disk data stream from ${endpoint}, reconnecting`);
+    return () => source.close();
+  }, [endpoint]); // Reconnect whenever endpoint changes
 
   useEffect(() => {
     if (diskData.length > 0) {
@@ -16,18 +16,18 @@ const PercentageGraph: React.FC<CPUGraphProps> = ({ endpoint, title }) => {
   const canvasRef = React.useRef<HTMLCanvasElement>(null); // Ref to store canvas element
 
   useEffect(() => {
-    fetchDataFromAPI();
-  }, [endpoint]); // Run fetchDataFromAPI whenever endpoint changes
-
-  const fetchDataFromAPI = async () => {
-    try {
-      const response = await fetch(endpoint);
-      const responseData = await response.json();
-      setCpuData(responseData);
-    } catch (error) {
-      console.error(`Error fetching CPU data from ${endpoint}:`, error);
-    }
-  };
+    // A downsampled snapshot first, then only the samples written since
+    const source = new EventSource(`${endpoint}/stream?max_points=2000`);
+    source.addEventListener('snapshot', event => {
+      setCpuData(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('append', event => {
+      const rows: CPUData[] = JSON.parse((event as MessageEvent).data);
+      setCpuData(previous => [...previous, ...rows]);
+    });
+    source.onerror = () => console.error(`Lost the CPU data stream from ${endpoint}, reconnecting`);
+    return () => source.close();
+  }, [endpoint]); // Reconnect whenever endpoint changes
 
   useEffect(() => {
     if (cpuData.length > 0) {
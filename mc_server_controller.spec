@@ -1,4 +1,13 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+# pyinstaller mc_server_controller.spec              one file, unpacked to a temp folder on every launch
+# pyinstaller mc_server_controller.spec -- --onedir  a folder under dist/, starts without unpacking
+
+import argparse
+
+spec_parser = argparse.ArgumentParser()
+spec_parser.add_argument('--onedir', action='store_true', help='Build a folder instead of a single file')
+options = spec_parser.parse_args()
 
 
 a = Analysis(
@@ -10,29 +19,59 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Used by the backend and graph generator only
+    excludes=['tkinter', 'matplotlib', 'pandas'],
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='mc_server_controller',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if options.onedir:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='mc_server_controller',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        # UPX packed libraries are decompressed on every load
+        upx=False,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='mc_server_controller',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='mc_server_controller',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
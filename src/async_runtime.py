@@ -0,0 +1,186 @@
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncControllerRuntime:
+    """
+    Drives a McServerController from a single asyncio event loop.
+
+    Monitoring, the restart countdown, backups and readiness checks run as
+    separate tasks, so a 30 minute countdown or a long backup never stops
+    metrics from being recorded. Every blocking docker-py, RCON or file call
+    is run on a bounded thread pool, and only one maintenance job (restart or
+    backup) runs at a time. The steps of maintenance that hold a thread for
+    minutes, stopping, starting and backing up, run on a separate pool so
+    they never hold up monitor ticks and RCON calls.
+
+    Attributes:
+    - controller (McServerController): The controller being driven.
+    - executor (ThreadPoolExecutor): The pool blocking calls are offloaded to.
+    - maintenance_executor (ThreadPoolExecutor): The pool long maintenance steps run on.
+    - tick_interval (float): Seconds between monitor ticks.
+    - readiness_interval (float): Seconds between readiness probes while the
+        log and the health check have not said the server is ready.
+
+    Methods:
+    - run(self): Starts the server if needed and runs until cancelled.
+    - call(self, func, *args, **kwargs): Runs a blocking call on the executor.
+    - call_long(self, func, *args, **kwargs): Runs a long maintenance step on its own pool.
+    - restart(self): Counts down, stops, backs up and restarts the server.
+    - backup(self): Takes an online backup.
+    - wait_online(self): Waits until the server answers RCON.
+    """
+
+    def __init__(self, controller, executor=None, workers=4, tick_interval=5, readiness_interval=6,
+                 maintenance_executor=None):
+        self.controller = controller
+        self.executor = executor or ThreadPoolExecutor(workers, thread_name_prefix=f'{controller.name}-io')
+        # Maintenance is one job at a time, one thread is all it needs
+        self.maintenance_executor = maintenance_executor or \
+            ThreadPoolExecutor(1, thread_name_prefix=f'{controller.name}-maintenance')
+        self.tick_interval = tick_interval
+        self.readiness_interval = readiness_interval
+
+        self._maintenance = None
+        self._jobs = set()
+
+    async def call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def call_long(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.maintenance_executor, functools.partial(func, *args, **kwargs))
+
+    async def run(self):
+        """
+        Starts the container if needed, then monitors and maintains the server.
+
+        Returns:
+            None
+        """
+        controller = self.controller
+        self._maintenance = asyncio.Lock()
+
+        if not controller.server_running:
+            await self.call_long(controller.start_docker_container, controller.take_new, wait_online=False)
+            await self.wait_online()
+
+        logging.info(f'Starting async server monitor for {controller.name}')
+        try:
+            await asyncio.gather(self.monitor(), self.schedule())
+        finally:
+            controller.stats_sampler.stop()
+            controller.log_follower.stop()
+            controller.metrics_compactor.stop()
+            controller.backup_verifier.stop()
+            controller.game_sampler.stop()
+            controller.tick_profiler.log_summary(force=True)
+            await self.call(controller.metrics_store.flush)
+
+    async def monitor(self):
+        """
+        Runs a monitor tick every `tick_interval` seconds at a fixed rate.
+
+        Ticks that overrun the interval are skipped and counted by the
+        controller's scheduler rather than run back to back.
+        """
+        scheduler = self.controller.tick_scheduler(self.tick_interval)
+        while True:
+            try:
+                await self.call(self.controller.monitor_tick)
+            except Exception as e:
+                logging.error(f'Monitor tick failed: {e}')
+
+            await asyncio.sleep(scheduler.delay())
+
+    async def schedule(self):
+        """
+        Starts restarts and backups as background tasks when they are due.
+        """
+        controller = self.controller
+        while True:
+            if not self._maintenance.locked():
+                if controller.restart_due():
+                    controller.last_restart_time = time.time()
+                    # The restart takes a backup too
+                    controller.last_backup_time = controller.last_restart_time
+                    self._start_job(self.restart())
+                elif controller.backup_due():
+                    controller.last_backup_time = time.time()
+                    self._start_job(self.backup())
+
+            await asyncio.sleep(self.tick_interval)
+
+    async def restart(self):
+        """
+        Counts down in game, stops the container, backs up and starts it again.
+
+        Like the controller's countdown it is skipped or cut short when nobody is online.
+
+        Returns:
+            None
+        """
+        controller = self.controller
+        logging.info("Restarting server Soon")
+        if not controller.server_running:
+            logging.error("Server is not running")
+            return
+
+        for messages, wait in controller.SHUTDOWN_COUNTDOWN:
+            if controller.players_online() == 0:
+                logging.info('Nobody is online, skipping the rest of the shutdown countdown')
+                break
+            for message in messages:
+                await self.call(controller.send_command, message)
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline and controller.players_online() != 0:
+                await asyncio.sleep(min(5, deadline - time.monotonic()))
+
+        await self.call_long(controller.stop_container)
+        logging.info("Server shutdown complete")
+
+        await self.call_long(controller.backup_server_folder)
+        await self.call_long(controller.start_docker_container, wait_online=False)
+        await self.wait_online()
+
+    async def backup(self):
+        await self.call_long(self.controller.hot_backup)
+
+    async def wait_online(self):
+        """
+        Probes RCON until the server answers, without blocking the event loop.
+
+        Between probes it waits for the server to log its 'Done' line or for
+        Docker to report the container healthy, so the next probe goes out as
+        soon as either happens.
+
+        Returns:
+            None
+        """
+        controller = self.controller
+        ready = False
+        while not await self.call(controller.is_online):
+            if ready:
+                await asyncio.sleep(controller.READINESS_RETRY)
+            ready = await controller.container_events.wait_for_ready_async(
+                controller.name, controller.last_start_time, self.readiness_interval)
+            # Probe right away instead of after the reconnect backoff
+            await self.call(controller.rcon_session.close)
+        controller.record_ready()
+
+    def _start_job(self, job):
+        # Keep a reference so the task is not garbage collected while it runs
+        task = asyncio.create_task(self._exclusive(job))
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+
+    async def _exclusive(self, job):
+        async with self._maintenance:
+            try:
+                await job
+            except Exception as e:
+                logging.error(f'Maintenance job failed: {e}')
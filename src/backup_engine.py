@@ -0,0 +1,715 @@
+import io
+import os
+import gzip
+import json
+import zlib
+import time
+import re
+import shutil
+import hashlib
+import logging
+import tarfile
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_EXTENSIONS = {'gzip': '.tar.gz', 'zstd': '.tar.zst'}
+
+# Written next to each archive, the checksum of every file and the size of
+# every compressed block
+MANIFEST_SUFFIX = '.manifest.json'
+
+# Bytes read at a time from files too large to hold in memory
+CHUNK_SIZE = 1024 * 1024
+
+
+class _BlockCompressor:
+    """
+    A write-only file object that compresses fixed size blocks on a thread pool.
+
+    Every block becomes an independent gzip member or zstd frame, and
+    concatenated members are a valid gzip/zstd stream, so the result reads back
+    with ordinary tools. Compressed blocks are written in submission order and
+    at most `window` blocks are in flight, which bounds memory use.
+    """
+
+    def __init__(self, out, pool, compress, block_size, window, stats):
+        self._out = out
+        self._pool = pool
+        self._compress = compress
+        self._block_size = block_size
+        self._window = window
+        self._stats = stats
+        self._buffer = bytearray()
+        self._pending = deque()
+        # Compressed size of each block, lets a restore decompress them in parallel
+        self.blocks = []
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def close(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._write_next()
+
+    def _submit(self, block):
+        self._pending.append(self._pool.submit(self._compress, block))
+        while len(self._pending) > self._window:
+            self._write_next()
+
+    def _write_next(self):
+        compressed = self._pending.popleft().result()
+        start = time.perf_counter()
+        self._out.write(compressed)
+        self._stats.add('write', time.perf_counter() - start)
+        self._stats.compressed_bytes += len(compressed)
+        self.blocks.append(len(compressed))
+
+
+class _BlockReader:
+    """
+    A read-only file object decompressing an archive's blocks on a thread pool.
+
+    The block sizes come from the manifest, so every block can be handed to
+    the pool as soon as it is read. At most `window` blocks are decompressed
+    ahead of the reader and they are returned in order.
+    """
+
+    def __init__(self, source, lengths, pool, decompress, window, stats):
+        self._source = source
+        self._lengths = iter(lengths)
+        self._pool = pool
+        self._decompress = decompress
+        self._window = window
+        self._stats = stats
+        self._pending = deque()
+        self._block = memoryview(b'')
+        self._offset = 0
+
+    def read(self, size=-1):
+        pieces = []
+        while size != 0:
+            if self._offset >= len(self._block):
+                self._fill()
+                if not self._pending:
+                    break
+                self._block = memoryview(self._pending.popleft().result())
+                self._offset = 0
+            end = len(self._block) if size < 0 else min(len(self._block), self._offset + size)
+            pieces.append(self._block[self._offset:end])
+            if size > 0:
+                size -= end - self._offset
+            self._offset = end
+        return b''.join(pieces)
+
+    def _fill(self):
+        while len(self._pending) < self._window:
+            length = next(self._lengths, None)
+            if length is None:
+                return
+            start = time.perf_counter()
+            frame = self._source.read(length)
+            self._stats.add('read', time.perf_counter() - start)
+            if len(frame) != length:
+                raise Exception('The archive is shorter than its manifest says')
+            self._pending.append(self._pool.submit(self._decompress, frame))
+
+
+class _HashingReader:
+    """
+    A read-only file wrapper hashing everything read through it.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.hash.update(data)
+        return data
+
+
+class _BackupStats:
+    """
+    Accumulates per-stage busy time across the pipeline's threads.
+    """
+
+    def __init__(self, stages=('scan', 'read', 'hash', 'compress', 'write')):
+        self.timings = dict.fromkeys(stages, 0.0)
+        self.files = 0
+        self.input_bytes = 0
+        self.compressed_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.timings[stage] += seconds
+
+
+class BackupEngine:
+    """
+    Creates compressed, timestamped backups of a folder with a parallel pipeline.
+
+    Files are read and hashed ahead on a pool of reader threads, packed into a
+    tar stream, cut into blocks and compressed on a second pool with zstd (when
+    the zstandard package is installed) or gzip. Archives are written under a
+    temporary name and renamed once complete, then old archives beyond the
+    retention count are deleted. A manifest with the SHA-256 of every file
+    and the size of every compressed block is written next to each archive.
+
+    Restores run the pipeline backwards: blocks are decompressed in parallel,
+    files are hashed and written on a pool, and the folder is only replaced
+    once every checksum matched. Verification does the same in memory.
+
+    Attributes:
+    - backup_dir (str): The folder archives are written to.
+    - keep (int): How many archives to keep per prefix, 0 keeps all.
+    - workers (int): Threads in each of the reader and compressor pools.
+    - codec (str): 'zstd' or 'gzip'.
+    - level (int): The compression level.
+    - block_size (int): Bytes of tar stream compressed per job.
+    - thread_setup (callable, optional): Run first on every pool thread, e.g.
+        to lower its priority below the game server's.
+
+    Methods:
+    - create(self, source, prefix): Archives a folder and applies retention.
+    - archives(self, prefix): Lists the archives for a prefix, oldest first.
+    - apply_retention(self, prefix): Deletes archives beyond the retention count.
+    - restore(self, archive, destination): Replaces a folder with a verified archive.
+    - interrupted_restores(self, destination): Returns content a failed restore left aside.
+    - verify(self, archive): Checks an archive against its manifest without writing files.
+    - read_manifest(self, archive): Returns the manifest of an archive, None if it has none.
+    """
+
+    def __init__(self, backup_dir='backups', keep=7, workers=None, codec=None, level=None,
+                 block_size=4 * 1024 * 1024, max_prefetch=64 * 1024 * 1024, thread_setup=None):
+        if codec is None:
+            codec = 'zstd' if zstandard is not None else 'gzip'
+        if codec == 'zstd' and zstandard is None:
+            raise Exception('The zstd codec needs the zstandard package, install it or use gzip')
+        if codec not in CODEC_EXTENSIONS:
+            raise Exception(f'Unknown backup codec {codec}')
+
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.workers = workers or os.cpu_count() or 1
+        self.codec = codec
+        self.level = level if level is not None else (3 if codec == 'zstd' else 6)
+        self.block_size = block_size
+        self.max_prefetch = max_prefetch
+        self.thread_setup = thread_setup
+
+        self._local = threading.local()
+
+    def create(self, source, prefix) -> str:
+        """
+        Archives a folder into a new timestamped archive.
+
+        Args:
+            source (str): The folder to back up.
+            prefix (str): The archive name prefix, usually the server name.
+
+        Returns:
+            str: The path of the new archive.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        archive = os.path.join(self.backup_dir, f'{prefix}-{stamp}{CODEC_EXTENSIONS[self.codec]}')
+        partial = archive + '.partial'
+
+        stats = _BackupStats()
+        wall_start = time.perf_counter()
+
+        start = time.perf_counter()
+        entries = self._scan(source)
+        stats.add('scan', time.perf_counter() - start)
+
+        checksums = {}
+        with ThreadPoolExecutor(self.workers, 'backup-read', self.thread_setup) as readers, \
+             ThreadPoolExecutor(self.workers, 'backup-compress', self.thread_setup) as compressors, \
+             open(partial, 'wb') as out:
+
+            sink = _BlockCompressor(out, compressors, lambda block: self._compress(block, stats),
+                                    self.block_size, 2 * self.workers, stats)
+            with tarfile.open(fileobj=sink, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                self._pack(tar, source, entries, readers, stats, checksums)
+            sink.close()
+
+        # The manifest goes first, an archive is never left without one
+        self._write_manifest(archive, {
+            'codec': self.codec,
+            'created': time.time(),
+            'blocks': sink.blocks,
+            'files': {name: {'size': size, 'sha256': digest} for name, (size, digest) in checksums.items()},
+        })
+        os.replace(partial, archive)
+        wall = time.perf_counter() - wall_start
+
+        megabytes = stats.input_bytes / (1024 * 1024)
+        logging.info(
+            f'Backup {archive}: {stats.files} files, {megabytes:.1f} MB -> '
+            f'{stats.compressed_bytes / (1024 * 1024):.1f} MB in {wall:.2f}s '
+            f'({megabytes / wall if wall else 0:.1f} MB/s, {self.codec}, {self.workers} workers)'
+        )
+        logging.info('Backup stage busy time: ' + ', '.join(
+            f'{stage} {seconds:.2f}s' for stage, seconds in stats.timings.items()))
+
+        self.apply_retention(prefix)
+        return archive
+
+    def archives(self, prefix) -> list[str]:
+        # Only the exact '{prefix}-{stamp}' names, 'survival' must not pick up
+        # the archives of a 'survival-hard' server sharing the folder
+        pattern = re.compile(re.escape(prefix) + r'-\d{8}-\d{6}(?:'
+                             + '|'.join(map(re.escape, CODEC_EXTENSIONS.values())) + ')')
+        try:
+            names = os.listdir(self.backup_dir)
+        except FileNotFoundError:
+            return []
+        # Timestamps in the names sort chronologically
+        return [os.path.join(self.backup_dir, name) for name in sorted(names) if pattern.fullmatch(name)]
+
+    def apply_retention(self, prefix):
+        if not self.keep:
+            return
+        for path in self.archives(prefix)[:-self.keep]:
+            logging.info(f'Removing old backup {path}')
+            os.remove(path)
+            if os.path.exists(path + MANIFEST_SUFFIX):
+                os.remove(path + MANIFEST_SUFFIX)
+
+    def read_manifest(self, archive):
+        try:
+            with open(archive + MANIFEST_SUFFIX) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def restore(self, archive, destination) -> dict:
+        """
+        Replaces the contents of a folder with a backup archive.
+
+        The archive is extracted into a hidden staging folder inside
+        `destination`, so the final moves stay on one file system, and every
+        file is checked against the manifest. Only then is the old content
+        moved aside and deleted and the staged content moved in. If anything
+        fails before that, the folder is left untouched. A folder still holding
+        the previous content of a restore that could not be undone is refused,
+        that content must be recovered by hand first.
+
+        Args:
+            archive (str): The archive to restore.
+            destination (str): The folder to replace, e.g. the server volume.
+
+        Returns:
+            dict: 'files', 'bytes' and 'seconds' of the restore.
+
+        Raises:
+            Exception: If the archive cannot be read or fails verification, or
+                an earlier restore into `destination` was interrupted.
+        """
+        interrupted = self.interrupted_restores(destination)
+        if interrupted:
+            raise Exception(f'An earlier restore into {destination} was interrupted, recover the previous '
+                            f'content from {", ".join(interrupted)} before restoring again')
+
+        manifest = self.read_manifest(archive)
+        if manifest is None:
+            logging.warning(f'Backup {archive} has no manifest, restoring it without checksums')
+
+        stats = _BackupStats(('read', 'decompress', 'verify', 'write'))
+        wall_start = time.perf_counter()
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        staging = os.path.join(destination, f'.restore-{stamp}')
+        previous = os.path.join(destination, f'.pre-restore-{stamp}')
+        os.makedirs(staging)
+
+        try:
+            found = self._unpack(archive, manifest, staging, stats)
+            problems = self._compare(manifest, found) if manifest else []
+            if problems:
+                raise Exception(f'Backup {archive} failed verification: {_summarize(problems)}')
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        os.makedirs(previous)
+        moved_out, moved_in = [], []
+        try:
+            for name in os.listdir(destination):
+                if name not in (os.path.basename(staging), os.path.basename(previous)):
+                    os.rename(os.path.join(destination, name), os.path.join(previous, name))
+                    moved_out.append(name)
+            for name in os.listdir(staging):
+                os.rename(os.path.join(staging, name), os.path.join(destination, name))
+                moved_in.append(name)
+        except OSError:
+            # Never leave the folder half restored, put the old content back
+            try:
+                for name in moved_in:
+                    os.rename(os.path.join(destination, name), os.path.join(staging, name))
+                for name in moved_out:
+                    os.rename(os.path.join(previous, name), os.path.join(destination, name))
+            except OSError as e:
+                logging.critical(f'Could not undo the restore into {destination}, '
+                                 f'the previous content is in {previous}: {e}')
+                raise
+            os.rmdir(previous)
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        os.rmdir(staging)
+        shutil.rmtree(previous, ignore_errors=True)
+
+        wall = time.perf_counter() - wall_start
+        megabytes = stats.input_bytes / (1024 * 1024)
+        logging.info(
+            f'Restored {archive} to {destination}: {stats.files} files, {megabytes:.1f} MB in {wall:.2f}s '
+            f'({megabytes / wall if wall else 0:.1f} MB/s, {self.workers} workers)'
+            + (', checksums verified' if manifest else '')
+        )
+        logging.info('Restore stage busy time: ' + ', '.join(
+            f'{stage} {seconds:.2f}s' for stage, seconds in stats.timings.items()))
+        return {'files': stats.files, 'bytes': stats.input_bytes, 'seconds': wall}
+
+    def interrupted_restores(self, destination) -> list[str]:
+        """
+        Returns the previous content a failed restore could not put back into
+        `destination`, empty if the folder is intact.
+        """
+        try:
+            names = os.listdir(destination)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(destination, name) for name in names if name.startswith('.pre-restore-'))
+
+    def verify(self, archive) -> list[str]:
+        """
+        Checks an archive against its manifest without extracting it.
+
+        Every block is decompressed and every file hashed in memory. Without
+        a manifest only the archive's readability is checked.
+
+        Returns:
+            list[str]: The problems found, empty if the archive is intact.
+        """
+        manifest = self.read_manifest(archive)
+        stats = _BackupStats(('read', 'decompress', 'verify'))
+        try:
+            found = self._unpack(archive, manifest, None, stats)
+        except Exception as e:
+            return [f'unreadable: {e}']
+        if manifest is None:
+            logging.warning(f'Backup {archive} has no manifest, only checked that it reads back')
+            return []
+        return self._compare(manifest, found)
+
+    def _scan(self, source) -> list[str]:
+        entries = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            entries.append(root)
+            entries += [os.path.join(root, name) for name in sorted(files)]
+        return entries
+
+    def _write_manifest(self, archive, manifest):
+        temporary = archive + MANIFEST_SUFFIX + '.partial'
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        os.replace(temporary, archive + MANIFEST_SUFFIX)
+
+    def _pack(self, tar, source, entries, readers, stats, checksums):
+        # Keep a bounded number of reads ahead of the tar writer
+        pending = deque()
+        entries = iter(entries)
+        exhausted = False
+
+        while True:
+            while not exhausted and len(pending) < 2 * self.workers:
+                path = next(entries, None)
+                if path is None:
+                    exhausted = True
+                    break
+                info = tar.gettarinfo(path, arcname=os.path.relpath(path, source))
+                if info is None:
+                    continue
+                if info.isreg() and info.size <= self.max_prefetch:
+                    pending.append((info, path, readers.submit(self._read, path, stats)))
+                else:
+                    pending.append((info, path, None))
+
+            if not pending:
+                break
+
+            info, path, future = pending.popleft()
+            if future is not None:
+                data, digest = future.result()
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+                checksums[info.name] = (len(data), digest)
+                stats.files += 1
+                stats.input_bytes += len(data)
+            elif info.isreg():
+                # Too large to hold in memory, stream it from the writer thread
+                start = time.perf_counter()
+                with open(path, 'rb') as f:
+                    reader = _HashingReader(f)
+                    tar.addfile(info, reader)
+                checksums[info.name] = (info.size, reader.hash.hexdigest())
+                stats.add('read', time.perf_counter() - start)
+                stats.files += 1
+                stats.input_bytes += info.size
+            else:
+                tar.addfile(info)
+
+    def _read(self, path, stats) -> tuple[bytes, str]:
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            data = f.read()
+        stats.add('read', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        digest = hashlib.sha256(data).hexdigest()
+        stats.add('hash', time.perf_counter() - start)
+        return data, digest
+
+    def _compress(self, block, stats) -> bytes:
+        start = time.perf_counter()
+        if self.codec == 'zstd':
+            # Compressors are not thread safe, keep one per pool thread
+            compressor = getattr(self._local, 'zstd', None)
+            if compressor is None:
+                compressor = self._local.zstd = zstandard.ZstdCompressor(level=self.level)
+            compressed = compressor.compress(block)
+        else:
+            # wbits 31 writes a complete gzip member
+            deflate = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+            compressed = deflate.compress(block) + deflate.flush()
+        stats.add('compress', time.perf_counter() - start)
+        return compressed
+
+    def _unpack(self, archive, manifest, staging, stats) -> dict:
+        # Returns member name mapped to (size, sha256) for every regular file,
+        # writing the files under `staging` unless it is None
+        codec = manifest['codec'] if manifest else next(
+            (codec for codec, extension in CODEC_EXTENSIONS.items() if archive.endswith(extension)), 'gzip')
+        if codec == 'zstd' and zstandard is None:
+            raise Exception('Restoring a zstd backup needs the zstandard package')
+
+        found = {}
+        pending = deque()
+        with open(archive, 'rb') as source, \
+             ThreadPoolExecutor(self.workers, 'backup-decompress', self.thread_setup) as decompressors, \
+             ThreadPoolExecutor(self.workers, 'backup-restore', self.thread_setup) as writers:
+
+            if manifest and manifest.get('blocks'):
+                stream = _BlockReader(source, manifest['blocks'], decompressors,
+                                      lambda frame: self._decompress(codec, frame, stats), 2 * self.workers, stats)
+            elif codec == 'zstd':
+                stream = zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True)
+            else:
+                stream = gzip.GzipFile(fileobj=source)
+
+            with tarfile.open(fileobj=stream, mode='r|') as tar:
+                for member in tar:
+                    if staging is not None:
+                        member = _checked_member(member, staging)
+                    if member.isreg():
+                        if member.size <= self.max_prefetch:
+                            data = tar.extractfile(member).read()
+                            pending.append((member.name, writers.submit(
+                                self._restore_file, member, data, staging, stats)))
+                            while len(pending) > 2 * self.workers:
+                                name, future = pending.popleft()
+                                found[name] = future.result()
+                        else:
+                            found[member.name] = self._restore_large(tar, member, staging, stats)
+                        stats.files += 1
+                        stats.input_bytes += member.size
+                    elif staging is None:
+                        continue
+                    elif member.isdir():
+                        os.makedirs(os.path.join(staging, member.name), exist_ok=True)
+                    elif hasattr(tarfile, 'data_filter'):
+                        tar.extract(member, staging, filter='data')
+                    else:
+                        tar.extract(member, staging)
+
+            while pending:
+                name, future = pending.popleft()
+                found[name] = future.result()
+        return found
+
+    def _restore_file(self, member, data, staging, stats) -> tuple[int, str]:
+        start = time.perf_counter()
+        digest = hashlib.sha256(data).hexdigest()
+        stats.add('verify', time.perf_counter() - start)
+
+        if staging is not None:
+            start = time.perf_counter()
+            path = os.path.join(staging, member.name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            os.chmod(path, member.mode)
+            os.utime(path, (member.mtime, member.mtime))
+            stats.add('write', time.perf_counter() - start)
+        return len(data), digest
+
+    def _restore_large(self, tar, member, staging, stats) -> tuple[int, str]:
+        # Too large to hold in memory, stream it on the reading thread
+        source = tar.extractfile(member)
+        path = os.path.join(staging, member.name) if staging is not None else None
+        digest = hashlib.sha256()
+        with open(path, 'wb') if path else io.BytesIO() as out:
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+                if path:
+                    out.write(chunk)
+        if path:
+            os.chmod(path, member.mode)
+            os.utime(path, (member.mtime, member.mtime))
+        return member.size, digest.hexdigest()
+
+    def _decompress(self, codec, frame, stats) -> bytes:
+        start = time.perf_counter()
+        if codec == 'zstd':
+            # Decompressors are not thread safe either
+            decompressor = getattr(self._local, 'zstd_reader', None)
+            if decompressor is None:
+                decompressor = self._local.zstd_reader = zstandard.ZstdDecompressor()
+            data = decompressor.decompress(frame)
+        else:
+            data = zlib.decompress(frame, 31)
+        stats.add('decompress', time.perf_counter() - start)
+        return data
+
+    @staticmethod
+    def _compare(manifest, found) -> list[str]:
+        problems = []
+        for name, entry in manifest['files'].items():
+            if name not in found:
+                problems.append(f'{name} is missing')
+            elif found[name] != (entry['size'], entry['sha256']):
+                problems.append(f'{name} does not match its checksum')
+        problems += [f'{name} is not in the manifest' for name in found.keys() - manifest['files'].keys()]
+        return problems
+
+
+def _checked_member(member, staging):
+    """
+    Refuses archive members with absolute paths, '..' components, links
+    leaving `staging` or special files, like tarfile's 'data' filter.
+
+    Raises:
+        Exception: If the member would be written outside `staging`.
+    """
+    if hasattr(tarfile, 'data_filter'):
+        return tarfile.data_filter(member, staging)
+
+    # Extraction filters only exist from Python 3.10.12 on
+    root = os.path.realpath(staging)
+
+    def escapes(path):
+        target = os.path.realpath(os.path.join(root, path))
+        return os.path.isabs(path) or os.path.commonpath([root, target]) != root
+
+    if '..' in member.name.replace('\\', '/').split('/') or escapes(member.name):
+        raise Exception(f'Refusing to extract {member.name!r} outside the restore folder')
+    if member.issym() and escapes(os.path.join(os.path.dirname(member.name), member.linkname)):
+        raise Exception(f'Refusing to extract {member.name!r}, it links outside the restore folder')
+    if member.islnk() and escapes(member.linkname):
+        raise Exception(f'Refusing to extract {member.name!r}, it links outside the restore folder')
+    if not (member.isreg() or member.isdir() or member.issym() or member.islnk()):
+        raise Exception(f'Refusing to extract {member.name!r}, it is a special file')
+    return member
+
+
+def _summarize(problems, shown=5) -> str:
+    text = '; '.join(problems[:shown])
+    return text + (f' and {len(problems) - shown} more' if len(problems) > shown else '')
+
+
+class BackupVerifier(threading.Thread):
+    """
+    A background thread checking backup archives against their manifests.
+
+    Every `interval` seconds each archive of `prefix` is decompressed and
+    every file hashed in memory, newest first, without extracting anything.
+    Archives that fail are logged and listed in `corrupt` until a later pass
+    finds them intact or they are removed by retention.
+
+    Attributes:
+    - engine (BackupEngine): The engine the archives were made with.
+    - prefix (str): Which archives to check, usually the server name.
+    - interval (float): Seconds between verification passes.
+    - thread_setup (callable, optional): Run first on the thread, e.g. to lower its priority.
+    - corrupt (list): The archives that failed their last check.
+    - last_verified (float): Epoch seconds of the last completed pass, 0 before.
+
+    Methods:
+    - run(self): Thread body, verifies until stopped.
+    - verify_all(self): Runs one verification pass.
+    - stop(self): Asks the thread to stop.
+    """
+
+    def __init__(self, engine, prefix, interval=24 * 60 * 60, thread_setup=None):
+        super().__init__(name=f'verify-{prefix}', daemon=True)
+        self.engine = engine
+        self.prefix = prefix
+        self.interval = interval
+        self.thread_setup = thread_setup
+        self.corrupt = []
+        self.last_verified = 0.0
+
+        self._stopped = threading.Event()
+
+    def run(self):
+        if self.thread_setup is not None:
+            self.thread_setup()
+        while not self._stopped.wait(self.interval):
+            try:
+                self.verify_all()
+            except Exception as e:
+                logging.error(f'Verifying the backups of {self.prefix} failed: {e}')
+
+    def stop(self):
+        self._stopped.set()
+
+    def verify_all(self) -> dict:
+        """
+        Checks every archive of the prefix once.
+
+        Returns:
+            dict: Each archive checked mapped to its problems, empty if intact.
+        """
+        results = {}
+        for archive in reversed(self.engine.archives(self.prefix)):
+            if self._stopped.is_set():
+                break
+            # Retention may remove an archive while the pass runs
+            if not os.path.exists(archive):
+                continue
+            start = time.perf_counter()
+            results[archive] = self.engine.verify(archive)
+            if results[archive]:
+                logging.error(f'Backup {archive} is corrupt: {_summarize(results[archive])}')
+            else:
+                logging.info(f'Backup {archive} verified in {time.perf_counter() - start:.1f}s')
+
+        self.corrupt = [archive for archive, problems in results.items()
+                        if problems and os.path.exists(archive)]
+        self.last_verified = time.time()
+        return results
@@ -0,0 +1,197 @@
+import time
+import asyncio
+import logging
+import threading
+
+# Container status after each docker event action
+STATUS_BY_ACTION = {
+    'create': 'created',
+    'start': 'running',
+    'restart': 'running',
+    'unpause': 'running',
+    'pause': 'paused',
+    'die': 'exited',
+    'stop': 'exited',
+    'destroy': 'removed',
+}
+
+
+class ContainerEventWatcher(threading.Thread):
+    """
+    A background thread following Docker events for a set of containers.
+
+    It keeps the latest status and health of each container up to date from
+    start/die/health_status events, so callers waiting for a transition wake up
+    as soon as Docker reports it instead of polling. One watcher can serve
+    every container in the process over a single events connection. If the
+    stream drops it reconnects and replays events since the last one seen.
+
+    Readiness is tracked next to them: the time the server last logged its
+    'Done' line, reported by the controller's log follower, or a healthy
+    status from the image's health check, whichever comes first.
+
+    Attributes:
+    - client (DockerClient): The docker-py client.
+    - names (list): The container names to follow.
+
+    Methods:
+    - run(self): Thread body, follows the events stream until stopped.
+    - set_status(self, name, status): Seeds a status read from the API.
+    - status(self, name): Returns the last known status.
+    - health(self, name): Returns the last known health status.
+    - set_ready(self, name, when): Records that the server logged it finished starting.
+    - is_ready(self, name, since): Returns whether the server is ready since a time.
+    - wait_for_ready(self, name, since, timeout): Blocks until the server is ready.
+    - wait_for_ready_async(self, name, since, timeout): Awaits readiness.
+    - wait_for_status(self, name, status, timeout): Blocks until a status is reached.
+    - wait_for_status_async(self, name, status, timeout): Awaits a status.
+    - wait_for_health_async(self, name, health, timeout): Awaits a health status.
+    - stop(self): Asks the thread to stop.
+    """
+
+    def __init__(self, client, names, retry_delay=1, max_retry_delay=30):
+        super().__init__(name='container-events', daemon=True)
+        self.client = client
+        self.names = list(names)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._states = {name: {'status': None, 'health': None, 'ready': None} for name in self.names}
+        self._condition = threading.Condition()
+        self._listeners = []
+        self._stopped = threading.Event()
+        self._stream = None
+        self._since = None
+
+    def run(self):
+        delay = self.retry_delay
+        while not self._stopped.is_set():
+            try:
+                since = self._since if self._since is not None else int(time.time())
+                self._stream = self.client.events(
+                    decode=True,
+                    since=since,
+                    filters={'type': 'container', 'container': self.names},
+                )
+                for event in self._stream:
+                    self._handle_event(event)
+                    delay = self.retry_delay
+            except Exception as e:
+                logging.debug(f'Docker events stream dropped: {e}')
+
+            if not self._stopped.is_set():
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def stop(self):
+        self._stopped.set()
+        if self._stream is not None:
+            self._stream.close()
+
+    def set_status(self, name, status):
+        self._update(name, status=status)
+
+    def status(self, name):
+        with self._condition:
+            return self._states[name]['status']
+
+    def health(self, name):
+        with self._condition:
+            return self._states[name]['health']
+
+    def set_ready(self, name, when):
+        self._update(name, ready=when)
+
+    def is_ready(self, name, since=0) -> bool:
+        with self._condition:
+            return self._ready(self._states[name], since)
+
+    def wait_for_ready(self, name, since=0, timeout=None) -> bool:
+        """
+        Blocks until the server logs that it finished starting or reports healthy.
+
+        Args:
+            name (str): The container name.
+            since (float): Epoch seconds, a 'Done' line logged earlier belongs to an older start.
+            timeout (float, optional): Seconds to wait, forever if omitted.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._ready(self._states[name], since), timeout)
+
+    async def wait_for_ready_async(self, name, since=0, timeout=None) -> bool:
+        return await self._wait_async(name, lambda state: self._ready(state, since), timeout)
+
+    @staticmethod
+    def _ready(state, since):
+        return state['ready'] is not None and state['ready'] >= since or state['health'] == 'healthy'
+
+    def wait_for_status(self, name, status, timeout=None) -> bool:
+        """
+        Blocks until the container reaches a status.
+
+        Args:
+            name (str): The container name.
+            status (str): The status to wait for, e.g. 'running' or 'exited'.
+            timeout (float, optional): Seconds to wait, forever if omitted.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._states[name]['status'] == status, timeout)
+
+    async def wait_for_status_async(self, name, status, timeout=None) -> bool:
+        return await self._wait_async(name, lambda state: state['status'] == status, timeout)
+
+    async def wait_for_health_async(self, name, health, timeout=None) -> bool:
+        return await self._wait_async(name, lambda state: state['health'] == health, timeout)
+
+    async def _wait_async(self, name, reached_when, timeout) -> bool:
+        loop = asyncio.get_running_loop()
+        reached = loop.create_future()
+
+        def listener(changed, state):
+            if changed == name and reached_when(state):
+                loop.call_soon_threadsafe(lambda: reached.done() or reached.set_result(True))
+
+        with self._condition:
+            if reached_when(self._states[name]):
+                return True
+            self._listeners.append(listener)
+        try:
+            await asyncio.wait_for(reached, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                self._listeners.remove(listener)
+
+    def _handle_event(self, event):
+        self._since = event.get('time', self._since)
+        name = event.get('Actor', {}).get('Attributes', {}).get('name')
+        action = event.get('Action', '')
+        if name not in self._states:
+            return
+
+        logging.debug(f'Docker event for {name}: {action}')
+        if action.startswith('health_status:'):
+            self._update(name, health=action.split(':', 1)[1].strip())
+        elif action in STATUS_BY_ACTION:
+            status = STATUS_BY_ACTION[action]
+            # A fresh start resets the health check
+            self._update(name, status=status, health='starting' if status == 'running' else None)
+
+    def _update(self, name, **changes):
+        with self._condition:
+            state = self._states[name]
+            state.update(changes)
+            snapshot = dict(state)
+            listeners = list(self._listeners)
+            self._condition.notify_all()
+
+        for listener in listeners:
+            listener(name, snapshot)
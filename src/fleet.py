@@ -0,0 +1,211 @@
+import os
+import json
+import asyncio
+import functools
+import logging
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+
+from async_runtime import AsyncControllerRuntime
+from backup_engine import BackupEngine
+from container_events import ContainerEventWatcher
+from metrics_rollup import DAY
+from resource_limits import lower_priority
+
+BASE_PORT = 25565
+BASE_RCON_PORT = 25575
+
+# Settings a server entry may override, with the defaults used when omitted
+SERVER_DEFAULTS = {
+    'max_ram': '2G',
+    'hardcore': False,
+    'difficulty': 2,
+    'version': 'latest',
+    'backup_interval': 0,
+    # Hours between checks of the backup archives, 0 disables them
+    'verify_interval': 24,
+    # Days per metrics tier, tiers left out use the controller defaults
+    'metrics_retention': {},
+    # Seconds between game telemetry samples, 0 disables them
+    'game_interval': 60,
+    # RestartPlanner settings, e.g. {"ram_percent": 85}, times in seconds
+    'restart_policy': {},
+    # A key of jvm_profiles.PROFILES
+    'jvm_profile': 'default',
+    # 'off', 'suggest' or 'apply' a heap size from the RAM% history
+    'heap_advisor': 'suggest',
+    # Container limits, e.g. {"cpuset_cpus": "2-3", "mem_limit": "6g", "nofile": 65536}
+    'resources': {},
+}
+
+
+def assign_ports(servers, state) -> dict:
+    """
+    Gives every server a game port, an RCON port and an RCON password.
+
+    Values set in the config win, then values remembered in the state file,
+    then the next free port counting up from 25565 (game) and 25575 (RCON).
+    New passwords are random. The result is meant to be saved back to the
+    state file so assignments stay stable when servers are added or reordered.
+
+    Args:
+        servers (list): The server entries from the config.
+        state (dict): Server name mapped to previously assigned values.
+
+    Returns:
+        dict: Server name mapped to its 'port', 'rcon_port' and 'rcon'.
+    """
+    used = set()
+    for server in servers:
+        used.update(server[key] for key in ('port', 'rcon_port') if key in server)
+    for assigned in state.values():
+        used.update(assigned[key] for key in ('port', 'rcon_port') if key in assigned)
+
+    def next_free(start):
+        port = start
+        while port in used:
+            port += 1
+        used.add(port)
+        return port
+
+    assignments = {}
+    for server in servers:
+        previous = state.get(server['name'], {})
+        assignments[server['name']] = {
+            'port': server.get('port') or previous.get('port') or next_free(BASE_PORT),
+            'rcon_port': server.get('rcon_port') or previous.get('rcon_port') or next_free(BASE_RCON_PORT),
+            'rcon': server.get('rcon') or previous.get('rcon') or secrets.token_urlsafe(16),
+        }
+    return assignments
+
+
+class Fleet:
+    """
+    Runs several Minecraft servers from one controller process.
+
+    All servers share one Docker client, one Docker events subscription and
+    one bounded thread pool for blocking calls, and each gets its own
+    AsyncControllerRuntime on a single event loop. Every server writes its
+    own metrics series to `<name>.metrics.bin` and sessions to `<name>.sessions.db`.
+
+    The config is a JSON file:
+
+        {
+            "defaults": {"max_ram": "4G"},
+            "backup_dir": "backups",
+            "job_nice": 10,
+            "servers": [
+                {"name": "survival", "volumes": "/srv/mc/survival"},
+                {"name": "creative", "volumes": "/srv/mc/creative", "port": 25570}
+            ]
+        }
+
+    Ports and passwords that are not set are assigned automatically and kept
+    in `<config>.state.json`.
+
+    Attributes:
+    - config_path (str): The fleet config file.
+    - client (DockerClient): The shared Docker client.
+    - executor (ThreadPoolExecutor): The shared pool for monitor ticks and RCON calls.
+    - maintenance_executor (ThreadPoolExecutor): One thread per server for stopping,
+        starting and backing up, so maintenance never starves the ticks.
+    - controllers (list): One McServerController per server.
+
+    Methods:
+    - run(self): Starts and monitors every server until cancelled.
+    """
+
+    def __init__(self, config_path, controller_class, workers=8, take_new=False):
+        self.config_path = config_path
+        with open(config_path) as f:
+            config = json.load(f)
+
+        servers = config['servers']
+        names = [server['name'] for server in servers]
+        if len(set(names)) != len(names):
+            raise Exception(f'Server names in {config_path} must be unique')
+
+        assignments = assign_ports(servers, self.__load_state())
+        self.__save_state(assignments)
+
+        # Each server holds one stats stream open, the rest is for API calls
+        self.client = docker.from_env(max_pool_size=len(servers) + workers)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='fleet-io')
+        # Each server runs one maintenance job at a time
+        self.maintenance_executor = ThreadPoolExecutor(len(servers), thread_name_prefix='fleet-maintenance')
+        self.container_events = ContainerEventWatcher(self.client, names)
+        self.container_events.start()
+
+        defaults = {**SERVER_DEFAULTS, **config.get('defaults', {})}
+
+        # The shared backup pools stay off every server's pinned CPUs
+        job_nice = config.get('job_nice', 10)
+        pinned = ','.join(filter(None, ({**defaults, **server}['resources'].get('cpuset_cpus')
+                                        for server in servers)))
+        backup_engine = BackupEngine(
+            config.get('backup_dir', 'backups'),
+            config.get('backup_keep', 7),
+            config.get('backup_workers'),
+            config.get('backup_codec'),
+            thread_setup=functools.partial(lower_priority, job_nice, pinned) if job_nice else None,
+        )
+
+        self.controllers = []
+        for server in servers:
+            settings = {**defaults, **server, **assignments[server['name']]}
+            logging.info(f"Fleet server {settings['name']}: port {settings['port']}, "
+                         f"RCON port {settings['rcon_port']}")
+            self.controllers.append(controller_class(
+                settings['name'],
+                settings['max_ram'],
+                settings['port'],
+                settings['rcon'],
+                settings['volumes'],
+                settings['hardcore'],
+                settings['difficulty'],
+                settings['version'],
+                take_new,
+                settings.get('metrics_file', f"{settings['name']}.metrics.bin"),
+                settings['backup_interval'],
+                backup_engine,
+                autostart=False,
+                container_events=self.container_events,
+                rcon_port=settings['rcon_port'],
+                client=self.client,
+                sessions_file=settings.get('sessions_file', f"{settings['name']}.sessions.db"),
+                metrics_retention={tier: days * DAY for tier, days in settings['metrics_retention'].items()},
+                game_interval=settings['game_interval'],
+                restart_policy=settings['restart_policy'],
+                jvm_profile=settings['jvm_profile'],
+                heap_advisor=settings['heap_advisor'],
+                resources=settings['resources'],
+                job_nice=job_nice,
+                verify_interval=settings['verify_interval'],
+            ))
+
+    async def run(self):
+        runtimes = [AsyncControllerRuntime(controller, executor=self.executor,
+                                           maintenance_executor=self.maintenance_executor)
+                    for controller in self.controllers]
+        try:
+            await asyncio.gather(*(runtime.run() for runtime in runtimes))
+        finally:
+            self.container_events.stop()
+
+    def __state_path(self) -> str:
+        return f'{self.config_path}.state.json'
+
+    def __load_state(self) -> dict:
+        try:
+            with open(self.__state_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def __save_state(self, assignments):
+        # The state holds RCON passwords, keep it private to the owner
+        fd = os.open(self.__state_path(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'w') as f:
+            json.dump(assignments, f, indent=2)
@@ -0,0 +1,189 @@
+import re
+import math
+import time
+import logging
+import threading
+
+# Minecraft formatting codes, Paper sends its replies colored
+_FORMATTING = re.compile('\u00a7.')
+
+_PAPER_TPS = re.compile(r'TPS from last 1m, 5m, 15m:\s*\*?([\d.]+)')
+_PAPER_MSPT = re.compile(r'from last 5s, 10s, 1m:\s*\W*\s*([\d.]+)/')
+_VANILLA_TARGET = re.compile(r'Target tick rate: ([\d.]+)')
+_VANILLA_MSPT = re.compile(r'Average time per tick: ([\d.]+) ?ms')
+_FORGE_OVERALL = re.compile(r'Overall:? Mean tick time: ([\d.]+) ms\. Mean TPS: ([\d.]+)')
+_EXECUTE_COUNT = re.compile(r'Test passed, count: (\d+)')
+_PAPER_CHUNKS = re.compile(r'Chunks in \S+?:\s*Total:\s*(\d+)')
+
+
+def parse_paper_tps(response) -> dict:
+    match = _PAPER_TPS.search(response)
+    return {'tps': float(match.group(1))} if match else {}
+
+
+def parse_paper_mspt(response) -> dict:
+    match = _PAPER_MSPT.search(response)
+    return {'mspt': float(match.group(1))} if match else {}
+
+
+def parse_tick_query(response) -> dict:
+    # Vanilla 1.20.3+, the tick rate is capped by the target rate
+    mspt = _VANILLA_MSPT.search(response)
+    if not mspt:
+        return {}
+    target = _VANILLA_TARGET.search(response)
+    target_tps = float(target.group(1)) if target else 20.0
+    mspt = float(mspt.group(1))
+    return {'mspt': mspt, 'tps': min(target_tps, 1000 / mspt) if mspt else target_tps}
+
+
+def parse_forge_tps(response) -> dict:
+    match = _FORGE_OVERALL.search(response)
+    return {'mspt': float(match.group(1)), 'tps': float(match.group(2))} if match else {}
+
+
+def parse_entity_count(response) -> dict:
+    if response.startswith('Test failed'):
+        return {'entities': 0}
+    match = _EXECUTE_COUNT.search(response)
+    return {'entities': int(match.group(1))} if match else {}
+
+
+def parse_paper_chunks(response) -> dict:
+    counts = [int(count) for count in _PAPER_CHUNKS.findall(response)]
+    return {'loaded_chunks': sum(counts)} if counts else {}
+
+
+# What each group of readings can be collected with, as alternatives tried in
+# order until one answers. An alternative is a list of (command, parser).
+SOURCES = {
+    'tick': [
+        ('paper', [('tps', parse_paper_tps), ('mspt', parse_paper_mspt)]),
+        ('vanilla', [('tick query', parse_tick_query)]),
+        ('forge', [('forge tps', parse_forge_tps)]),
+        ('neoforge', [('neoforge tps', parse_forge_tps)]),
+    ],
+    'entities': [
+        ('execute', [('execute if entity @e', parse_entity_count)]),
+    ],
+    'chunks': [
+        ('paper', [('paper chunkinfo *', parse_paper_chunks)]),
+    ],
+}
+
+# The readings in the order they are stored in the metrics file
+READINGS = ['tps', 'mspt', 'entities', 'loaded_chunks']
+
+
+class GameSampler(threading.Thread):
+    """
+    A background thread sampling game-side performance over RCON.
+
+    Every `interval` seconds it reads the tick rate and tick time, the entity
+    count and the loaded chunk count. Servers differ in which commands they
+    have, so for each group of readings the alternatives in `SOURCES` are
+    probed once and the one that answers is remembered. Each response is
+    parsed as it arrives. Groups the server has no command for are probed
+    again every `reprobe_interval` seconds. The vanilla `debug` profiler is
+    not used since every `debug stop` writes a report into the world folder.
+
+    Attributes:
+    - send_command (callable): Sends an RCON command and returns the response, 'failed' on errors.
+    - interval (float): Seconds between samples.
+    - stale_after (float): Readings older than this are reported as unknown.
+    - reprobe_interval (float): Seconds before unsupported groups are probed again.
+
+    Methods:
+    - run(self): Thread body, samples until stopped.
+    - sample(self): Collects one round of readings.
+    - latest(self): Returns the current readings in `READINGS` order.
+    - stop(self): Asks the thread to stop.
+    """
+
+    def __init__(self, send_command, name='server', interval=60, stale_after=None, reprobe_interval=60 * 60):
+        super().__init__(name=f'game-{name}', daemon=True)
+        self.send_command = send_command
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else 3 * interval
+        self.reprobe_interval = reprobe_interval
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._readings = {}
+        self._sources = {}
+        self._unsupported_until = {}
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f'Game telemetry sample failed: {e}')
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+
+    def latest(self) -> list[float]:
+        """
+        Returns the most recent readings, NaN for unknown or stale ones.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                value if now - taken <= self.stale_after else math.nan
+                for value, taken in (self._readings.get(reading, (math.nan, -math.inf)) for reading in READINGS)
+            ]
+
+    def sample(self) -> dict:
+        """
+        Collects one round of readings.
+
+        Returns:
+            dict: The readings collected this round.
+        """
+        collected = {}
+        for group, alternatives in SOURCES.items():
+            if time.monotonic() < self._unsupported_until.get(group, 0):
+                continue
+            readings = self._sample_group(group, alternatives)
+            if readings is None:
+                # The server did not answer, try again next round
+                return collected
+            collected.update(readings)
+
+        taken = time.monotonic()
+        with self._lock:
+            for reading, value in collected.items():
+                self._readings[reading] = (value, taken)
+        return collected
+
+    def _sample_group(self, group, alternatives):
+        known = self._sources.get(group)
+        candidates = [alternative for alternative in alternatives if alternative[0] == known] if known else alternatives
+
+        for source, commands in candidates:
+            readings = {}
+            for command, parse in commands:
+                response = self.send_command(command)
+                if response == 'failed':
+                    return None
+                readings.update(parse(_FORMATTING.sub('', response)))
+                if not readings:
+                    # The first command decides whether the source is supported
+                    break
+            if readings:
+                if known != source:
+                    logging.info(f'Reading game {group} telemetry with the {source} commands')
+                    self._sources[group] = source
+                return readings
+
+        if known:
+            # The server changed, probe every alternative next round
+            logging.info(f'The {known} commands stopped answering for game {group} telemetry')
+            del self._sources[group]
+        else:
+            logging.info(f'No command for game {group} telemetry on this server, '
+                         f'trying again in {self.reprobe_interval / 60:.0f} minutes')
+            self._unsupported_until[group] = time.monotonic() + self.reprobe_interval
+        return {}
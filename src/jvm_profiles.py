@@ -0,0 +1,189 @@
+import re
+import time
+from typing import Optional
+
+# Container label recording the JVM profile a container was created with
+PROFILE_LABEL = 'mc.jvm.profile'
+# Container label recording whether the heap came from the config or the advisor
+HEAP_SOURCE_LABEL = 'mc.jvm.heap-source'
+
+_SIZE = re.compile(r'^(?P<number>[0-9.]+)(?P<unit>[KMGT]?)B?$', re.IGNORECASE)
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+_XMX = re.compile(r'-Xmx(\S+)')
+
+# G1 settings tuned for Minecraft's allocation pattern (Aikar's flags), the
+# second set is for heaps over 12G
+_G1_FLAGS = [
+    '-XX:+UseG1GC', '-XX:+ParallelRefProcEnabled', '-XX:MaxGCPauseMillis=200',
+    '-XX:+UnlockExperimentalVMOptions', '-XX:+DisableExplicitGC', '-XX:+AlwaysPreTouch',
+    '-XX:G1NewSizePercent={new}', '-XX:G1MaxNewSizePercent={max_new}', '-XX:G1HeapRegionSize={region}',
+    '-XX:G1ReservePercent={reserve}', '-XX:G1HeapWastePercent=5', '-XX:G1MixedGCCountTarget=4',
+    '-XX:InitiatingHeapOccupancyPercent={occupancy}', '-XX:G1MixedGCLiveThresholdPercent=90',
+    '-XX:G1RSetUpdatingPauseTimePercent=5', '-XX:SurvivorRatio=32', '-XX:+PerfDisableSharedMem',
+    '-XX:MaxTenuringThreshold=1',
+]
+_G1_SMALL = {'new': 30, 'max_new': 40, 'region': '8M', 'reserve': 20, 'occupancy': 15}
+_G1_LARGE = {'new': 40, 'max_new': 50, 'region': '16M', 'reserve': 15, 'occupancy': 20}
+
+_ZGC_FLAGS = ['-XX:+UseZGC', '-XX:+ZGenerational', '-XX:+AlwaysPreTouch', '-XX:+DisableExplicitGC',
+              '-XX:+PerfDisableSharedMem']
+
+
+def parse_size(value) -> int:
+    """
+    Parses a JVM style memory size like '4G' or '3584M' into bytes.
+
+    Raises:
+        Exception: If the size is not understood.
+    """
+    match = _SIZE.match(str(value).strip())
+    if not match:
+        raise Exception(f'Invalid memory size {value!r}')
+    return int(float(match.group('number')) * _UNITS[match.group('unit').upper()])
+
+
+def format_size(size) -> str:
+    """
+    Formats bytes as a JVM memory size, in whole gigabytes when possible.
+    """
+    megabytes = int(size // _UNITS['M'])
+    return f'{megabytes // 1024}G' if megabytes % 1024 == 0 else f'{megabytes}M'
+
+
+def _default(heap):
+    return ['-Xms1G', f'-Xmx{heap}']
+
+
+def _g1(heap):
+    settings = _G1_LARGE if parse_size(heap) > 12 * _UNITS['G'] else _G1_SMALL
+    return [f'-Xms{heap}', f'-Xmx{heap}'] + [flag.format(**settings) for flag in _G1_FLAGS]
+
+
+def _zgc(heap):
+    return [f'-Xms{heap}', f'-Xmx{heap}'] + _ZGC_FLAGS
+
+
+# Profile name mapped to (flags for a heap size, whether the heap is committed up front)
+PROFILES = {
+    # What the controller always used, a 1G initial heap growing on demand
+    'default': (_default, False),
+    # G1 with Minecraft tuned pause target and region sizes, fixed pre-touched heap
+    'g1': (_g1, True),
+    # Generational ZGC for sub-millisecond pauses, Java 21 or newer
+    'zgc': (_zgc, True),
+}
+
+
+def jvm_options(profile, heap) -> str:
+    """
+    Returns the JVM_OPTS value for a profile and heap size.
+
+    Args:
+        profile (str): A key of `PROFILES`.
+        heap (str): The maximum heap, e.g. '4G'.
+
+    Returns:
+        str: The options separated by spaces.
+    """
+    if profile not in PROFILES:
+        raise Exception(f'Unknown JVM profile {profile}, expected one of {", ".join(PROFILES)}')
+    return ' '.join(PROFILES[profile][0](heap))
+
+
+def container_jvm(environment, labels) -> tuple[str, Optional[str], bool]:
+    """
+    Works out which profile and heap a container was created with.
+
+    Containers created before profiles existed have no label and use the
+    'default' profile.
+
+    Args:
+        environment (list): The container's 'NAME=value' environment.
+        labels (dict): The container's labels.
+
+    Returns:
+        tuple: The profile, the heap size (None if no -Xmx is set) and whether
+            JVM_OPTS is exactly what that profile produces for that heap.
+    """
+    options = next((env.partition('=')[2] for env in environment if env.startswith('JVM_OPTS=')), '')
+    profile = (labels or {}).get(PROFILE_LABEL, 'default')
+    match = _XMX.search(options)
+    heap = match.group(1) if match else None
+    consistent = heap is not None and profile in PROFILES and options == jvm_options(profile, heap)
+    return profile, heap, consistent
+
+
+class HeapAdvisor:
+    """
+    Suggests a heap size from the recorded RAM% history.
+
+    The container's peak memory use, the 99th percentile of the hourly
+    maximum over `window` seconds, plus `headroom` for the collector to work
+    in is rounded up to `step` bytes and kept between 1G, `ceiling` and three
+    quarters of the container's memory limit. Heaps committed up front
+    (pre-touched) always show as fully used, so no advice is given for them.
+    Changes under `tolerance` of the current heap are not worth a recreation
+    and are not suggested.
+
+    Attributes:
+    - metrics_path (str): The raw metrics file of the server.
+    - window (float): Seconds of history to analyze.
+    - headroom (float): Factor added on top of the peak use.
+    - step (int): Bytes the suggestion is rounded up to.
+    - tolerance (float): Relative change below which the current heap is kept.
+
+    Methods:
+    - advise(self, limit, current, pretouched, ceiling, now): Returns a heap size and the reasoning.
+    """
+
+    def __init__(self, metrics_path, window=7 * 24 * 60 * 60, headroom=1.25, step=512 * 1024 * 1024,
+                 tolerance=0.15):
+        self.metrics_path = metrics_path
+        self.window = window
+        self.headroom = headroom
+        self.step = step
+        self.tolerance = tolerance
+
+    def advise(self, limit, current, pretouched, ceiling=None, now=None) -> tuple[Optional[int], str]:
+        """
+        Returns a heap size and the reasoning behind it.
+
+        Args:
+            limit (int): The container's memory limit in bytes, RAM% is relative to it.
+            current (int): The current heap size in bytes.
+            pretouched (bool): Whether the current heap is committed up front.
+            ceiling (int, optional): The largest heap to suggest, in bytes.
+            now (float, optional): Epoch seconds, the current time if omitted.
+
+        Returns:
+            tuple: The suggested heap in bytes, or None to keep the current
+                one, and an explanation for the log.
+        """
+        if pretouched:
+            return None, ('the heap is committed up front so memory use does not show demand, '
+                          'run with the default profile for a while to measure it')
+
+        # numpy and the metrics modules are left out of the CLI's startup
+        import numpy as np
+        from metrics_rollup import read_tiered
+
+        now = time.time() if now is None else now
+        timestamps, columns = read_tiered(self.metrics_path, now - self.window, None, resolution=60 * 60,
+                                          how='max', fields=[('ram_percent', 'f')])
+        used = columns['ram_percent'][~np.isnan(columns['ram_percent'])]
+        if len(used) == 0 or timestamps[-1] - timestamps[0] < 24 * 60 * 60:
+            return None, 'less than a day of memory history'
+
+        peak = float(np.percentile(used, 99)) / 100 * limit
+        wanted = -(-int(peak * self.headroom) // self.step) * self.step
+        upper = int(limit * 0.75) if ceiling is None else min(int(limit * 0.75), ceiling)
+        upper = upper // self.step * self.step
+        suggested = max(_UNITS['G'], min(wanted, upper))
+
+        reason = (f'peak use {format_size(peak)} over {(timestamps[-1] - timestamps[0]) / 86400:.0f} days '
+                  f'with {self.headroom - 1:.0%} headroom')
+        if wanted > upper:
+            reason += f', capped at {format_size(upper)}'
+        if abs(suggested - current) < current * self.tolerance:
+            return None, f'{reason} fits the current heap of {format_size(current)}'
+        return suggested, reason
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import time
+import logging
+import datetime
+import threading
+
+# Matched against the message part of a server log line, after '[Server thread/INFO]: '
+# on vanilla, '[12:00:00 INFO]: ' on Paper and Spigot, or the extra logger group on Forge
+JOIN_PATTERN = re.compile(r'^(?P<player>[A-Za-z0-9_]{1,16}) joined the game')
+LEAVE_PATTERN = re.compile(r'^(?P<player>[A-Za-z0-9_]{1,16}) left the game')
+DONE_PATTERN = re.compile(r'^Done \((?P<seconds>[0-9.]+)s\)!')
+MESSAGE_PATTERN = re.compile(r'^\[[^\]]*\](?: \[[^\]]*\])*: (?P<message>.*)$')
+
+
+def parse_docker_timestamp(value) -> tuple[int, int]:
+    """
+    Parses an RFC 3339 timestamp from `docker logs --timestamps`.
+
+    Returns:
+        tuple: Epoch seconds and nanoseconds, which compare correctly even
+            though docker trims trailing zeros from the fraction.
+    """
+    value = value.rstrip('Z')
+    whole, _, fraction = value.partition('.')
+    seconds = datetime.datetime.strptime(whole, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+    return int(seconds.timestamp()), int(fraction.ljust(9, '0')[:9] or 0)
+
+
+class LogFollower(threading.Thread):
+    """
+    A background thread tailing the container log for player and startup events.
+
+    Lines are read from a streaming `docker logs --follow --timestamps`
+    request and matched against precompiled patterns. Callbacks fire as soon
+    as a line arrives, so a player who joins and leaves within seconds is
+    still seen and no RCON traffic is needed. The timestamp of the last line
+    read and the set of online players are saved to a state file, so after a
+    controller restart the follower resumes where it stopped without
+    replaying or missing events. Without saved state the whole log is read
+    to rebuild the online set, but only lines newer than the follower fire
+    callbacks.
+
+    Attributes:
+    - api (APIClient): The low level docker-py API client.
+    - container_name (str): The container to follow.
+    - on_event (callable): Called with (kind, player, epoch seconds) for 'join',
+        'leave' and 'ready' events. `player` is the startup time for 'ready'.
+    - state_path (str): Where the resume position is saved.
+    - recognized (bool): Whether a line in a known log format was seen, until
+        then `players()` says nothing about who is online.
+
+    Methods:
+    - run(self): Thread body, follows the log until stopped.
+    - players(self): Returns the players currently online.
+    - reconnect(self): Skips the retry delay, e.g. once the container was started again.
+    - stop(self): Asks the thread to stop.
+    """
+
+    def __init__(self, api, container_name, on_event, state_path=None, retry_delay=1, max_retry_delay=30):
+        super().__init__(name=f'logs-{container_name}', daemon=True)
+        self.api = api
+        self.container_name = container_name
+        self.on_event = on_event
+        self.state_path = state_path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._position = None
+        self._players = set()
+        self.recognized = False
+        self._live_after = None
+        self._load_state()
+        if self._position is None:
+            self._live_after = time.time()
+
+    def run(self):
+        delay = self.retry_delay
+        while not self._stopped.is_set():
+            try:
+                since = self._position[0] if self._position else None
+                stream = self.api.logs(self.container_name, stream=True, follow=True,
+                                       timestamps=True, since=since)
+                pending = b''
+                for chunk in stream:
+                    if self._stopped.is_set():
+                        break
+                    lines = (pending + chunk).split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        self._handle_line(line.decode('utf-8', errors='replace').rstrip('\r'))
+                    delay = self.retry_delay
+            except Exception as e:
+                logging.debug(f'Log stream for {self.container_name} dropped: {e}')
+
+            if not self._stopped.is_set():
+                if self._wake.wait(delay):
+                    self._wake.clear()
+                    delay = self.retry_delay
+                else:
+                    delay = min(delay * 2, self.max_retry_delay)
+
+    def players(self) -> set[str]:
+        with self._lock:
+            return set(self._players)
+
+    def reconnect(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self._save_state()
+
+    def _handle_line(self, line):
+        timestamp, _, text = line.partition(' ')
+        try:
+            position = parse_docker_timestamp(timestamp)
+        except ValueError:
+            return
+        # 'since' only has second precision, skip lines already handled
+        if self._position is not None and position <= self._position:
+            return
+        self._position = position
+
+        match = MESSAGE_PATTERN.match(text)
+        if match is None:
+            return
+        self.recognized = True
+        message = match.group('message')
+        when = position[0] + position[1] / 1e9
+
+        if (joined := JOIN_PATTERN.match(message)) is not None:
+            player = joined.group('player')
+            with self._lock:
+                self._players.add(player)
+            self._emit('join', player, when)
+        elif (left := LEAVE_PATTERN.match(message)) is not None:
+            player = left.group('player')
+            with self._lock:
+                self._players.discard(player)
+            self._emit('leave', player, when)
+        elif (done := DONE_PATTERN.match(message)) is not None:
+            # A freshly started server has nobody online
+            with self._lock:
+                self._players.clear()
+            self._emit('ready', done.group('seconds'), when)
+
+    def _emit(self, kind, player, when):
+        if self._live_after is not None and when < self._live_after:
+            return
+        self._save_state()
+        try:
+            self.on_event(kind, player, when)
+        except Exception as e:
+            logging.error(f'Log event handler failed for {kind} {player}: {e}')
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self._position = tuple(state['position']) if state.get('position') else None
+            self._players = set(state.get('players', []))
+            # State saved before the flag existed only had players if lines were recognized
+            self.recognized = state.get('recognized', bool(self._players))
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f'Ignoring unreadable log state {self.state_path}: {e}')
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            state = {'position': self._position, 'players': sorted(self._players), 'recognized': self.recognized}
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.state_path)
@@ -1,17 +1,60 @@
 
-import csv
 import datetime
 import os
+import re
+import sys
 import time
 import shutil
+import tempfile
 import logging
 import argparse
+import functools
+from typing import TYPE_CHECKING
 from logging.handlers import RotatingFileHandler
 
-import daemon
-import docker
-from mcrcon import MCRcon
-from docker.models.containers import Container
+from rcon_session import RconSession
+from stats_sampler import StatsSampler
+from container_events import ContainerEventWatcher
+from log_follower import LogFollower, parse_docker_timestamp
+from game_sampler import GameSampler
+from jvm_profiles import (PROFILES, PROFILE_LABEL, HEAP_SOURCE_LABEL, HeapAdvisor, jvm_options, container_jvm,
+                          parse_size, format_size)
+from session_store import SessionStore
+from openmetrics import REGISTRY, MetricsExporter, instrument_docker
+from tick_profiler import TickProfiler, FixedRateScheduler
+
+# Docker, numpy and zstandard are imported where they are used, so --help
+# and argument errors return without loading them
+if TYPE_CHECKING:
+    from docker.models.containers import Container
+
+CPU_PERCENT = REGISTRY.gauge('mc_container_cpu_percent', 'Container CPU usage in percent.', ['server'])
+RAM_PERCENT = REGISTRY.gauge('mc_container_memory_percent', 'Container memory usage in percent of its limit.', ['server'])
+NET_RX_BYTES = REGISTRY.counter('mc_container_network_receive_bytes', 'Bytes received by the container.', ['server'])
+NET_TX_BYTES = REGISTRY.counter('mc_container_network_transmit_bytes', 'Bytes sent by the container.', ['server'])
+BLK_READ_BYTES = REGISTRY.counter('mc_container_block_read_bytes', 'Bytes read from block devices.', ['server'])
+BLK_WRITE_BYTES = REGISTRY.counter('mc_container_block_write_bytes', 'Bytes written to block devices.', ['server'])
+GAME_TPS = REGISTRY.gauge('mc_game_ticks_per_second', 'Game ticks per second reported by the server.', ['server'])
+GAME_MSPT = REGISTRY.gauge('mc_game_tick_milliseconds', 'Mean milliseconds per game tick.', ['server'])
+GAME_ENTITIES = REGISTRY.gauge('mc_game_entities', 'Entities loaded in all dimensions.', ['server'])
+GAME_CHUNKS = REGISTRY.gauge('mc_game_loaded_chunks', 'Chunks loaded in all worlds.', ['server'])
+PLAYERS_ONLINE = REGISTRY.gauge('mc_players_online', 'Players currently online.', ['server'])
+RCON_SECONDS = REGISTRY.histogram('mc_rcon_command_seconds', 'RCON command round-trip time.', ['server', 'command'])
+TICK_SECONDS = REGISTRY.histogram('mc_monitor_tick_seconds', 'Time spent in one monitor tick.', ['server'])
+STAGE_SECONDS = REGISTRY.histogram('mc_monitor_stage_seconds', 'Time spent in each stage of the monitor tick.',
+                                   ['server', 'stage'])
+TICK_OVERRUNS = REGISTRY.counter('mc_monitor_tick_overruns', 'Monitor ticks skipped because a tick overran.',
+                                 ['server'])
+READY_SECONDS = REGISTRY.gauge('mc_server_ready_seconds', 'Seconds from the last container start to accepting commands.',
+                               ['server'])
+RECOVERY_SECONDS = REGISTRY.gauge('mc_backup_recovery_seconds',
+                                  'Seconds the last restore took from stopping the server to it accepting commands.',
+                                  ['server'])
+CORRUPT_BACKUPS = REGISTRY.gauge('mc_backup_corrupt_archives', 'Backup archives that failed their last verification.',
+                                 ['server'])
+
+# Fallback for process_uptime() where /proc is not available
+IMPORTED_AT = time.monotonic()
 
 class McServerController:
     """
@@ -22,6 +65,7 @@ class McServerController:
     - max_ram (str): The maximum amount of RAM allocated to the server.
     - port (int): The port number for the server.
     - rcon (str): The RCON password for the server.
+    - rcon_port (int): The host port the server's RCON port is published on.
     - volumes (str): The path to the server data volume.
     - hardcore (bool): Whether hardcore mode is enabled.
     - difficulty (str): The difficultypy level of the server.
@@ -30,25 +74,75 @@ class McServerController:
     - server_running (bool): Indicates whether the server is currently running.
     - client (DockerClient): The Docker client object for interacting with Docker.
     - last_restart_time (float): The timestamp of the last server restart.
+    - restart_planner (RestartPlanner): Picks quiet restart times and restarts early under memory pressure.
+    - rcon_session (RconSession): The persistent RCON connection used for all commands.
+    - stats_sampler (StatsSampler): Background thread streaming container stats.
+    - container_events (ContainerEventWatcher): Follows Docker events for the container.
+    - log_follower (LogFollower): Tails the container log for joins, leaves and startup.
+    - game_sampler (GameSampler): Samples tick time, entities and loaded chunks over RCON.
+    - session_store (SessionStore): The indexed history of player sessions.
+    - tick_profiler (TickProfiler): Times each stage of the monitor tick.
+    - metrics_store (MetricsStore): The binary metrics file samples are appended to.
+    - metrics_compactor (MetricsCompactor): Rolls old samples up into coarser tiers and expires them.
+    - backup_interval (float): Hours between online backups, 0 disables them.
+    - backup_engine (BackupEngine): Writes compressed, timestamped backup archives.
+    - backup_verifier (BackupVerifier): Checks the archives against their checksums in the background.
+    - last_backup_time (float): The timestamp of the last online backup.
+    - last_freeze_seconds (float): How long world saving was off during the last online backup.
 
     Methods:
     - __init__(self, name, max_ram, port, rcon, volumes, hardcore, difficulty, version): 
         Initializes the Minecraft Server Controller.
     - run(self): Starts the server monitor loop.
+    - monitor_tick(self): Records metrics once.
+    - tick_scheduler(self, interval): Creates the fixed-rate scheduler for the monitor loop.
+    - on_log_event(self, kind, player, timestamp): Handles a join, leave or startup log line.
+    - restart_due(self), backup_due(self): Whether scheduled maintenance should run.
+    - players_online(self): The number of players online, None if unknown.
+    - shutdown_countdown(self): Warns players in game, cut short once nobody is online.
     - start_docker_container(self): Starts the Docker container for the Minecraft server.
     - create_docker_container(self): Creates a new Docker container for the Minecraft server.
     - restart_server(self): Restarts the Minecraft server.
     - shutdown_server(self): Shuts down the Minecraft server.
+    - stop_container(self): Stops the container without a countdown.
     - backup_server_folder(self): Performs a backup of the server folder.
+    - hot_backup(self): Backs up the world while the server keeps running.
+    - restore_backup(self, archive): Replaces the world with a verified backup and restarts the server.
     - send_command(self, command): Sends a command to the Minecraft server via RCON.
-    - __check_server_online(self): Checks if the server is online and ready to accept commands.
-    - __await_status(self, status): Waits for the container status to reach the specified status.
+    - __check_server_online(self): Waits until the server is online and ready to accept commands.
+    - record_ready(self): Logs and exports how long the last start took.
+    - __await_status(self, status, timeout): Waits for the container status to reach the specified status.
     """
 
-    container: Container = None
+    container: 'Container' = None
 
-    old_players: list[str] = []
-    def __init__(self, name, max_ram, port, rcon, volumes, hardcore, difficulty, version, take_new):
+    # (messages, seconds to wait afterwards) announced before a scheduled shutdown
+    SHUTDOWN_COUNTDOWN = [
+        (['say !! The server will reset in 30 minute !!'], 20 * 60),
+        (['say !! The server will reset in 10 minutes !!'], 9 * 60),
+        (['say !! The world will reset in 45 seconds !!'], 40),
+        (['say !! The server will reset 5 seconds !!'], 5),
+        (['say !! The server is being shut down !!', 'say !! It will restart in a few moments !!'], 3),
+    ]
+
+    RESTART_INTERVAL = 24 * 60 * 60
+
+    # Seconds between status reloads when no Docker event arrives
+    STATUS_POLL_INTERVAL = 30
+
+    # Seconds between monitor ticks
+    TICK_INTERVAL = 5
+
+    # Seconds between RCON probes when neither the log nor the health check
+    # says the server is ready, and between probes once one of them has
+    READINESS_FALLBACK = 6
+    READINESS_RETRY = 0.25
+
+    def __init__(self, name, max_ram, port, rcon, volumes, hardcore, difficulty, version, take_new,
+                 metrics_file='metrics.bin', backup_interval=0, backup_engine=None, autostart=True,
+                 container_events=None, rcon_port=25575, client=None, sessions_file='sessions.db',
+                 metrics_retention=None, game_interval=60, restart_policy=None, jvm_profile='default',
+                 heap_advisor='off', resources=None, job_nice=10, verify_interval=24):
 
         """
         Initializes the Minecraft Server Controller.
@@ -62,29 +156,113 @@ class McServerController:
         - hardcore (bool): Whether hardcore mode is enabled.
         - difficulty (str): The difficulty level of the server.
         - version (str): The version of Minecraft server to run.
+        - take_new (bool): Whether to recreate the container with the new settings.
+        - metrics_file (str): The binary metrics file to append samples to.
+        - backup_interval (float): Hours between online backups, 0 disables them.
+        - backup_engine (BackupEngine, optional): The engine used for backups.
+        - autostart (bool): Start the container right away. Pass False when an
+            AsyncControllerRuntime will start it.
+        - container_events (ContainerEventWatcher, optional): A watcher shared with
+            other controllers. One following only this container is started otherwise.
+        - rcon_port (int): The host port to publish RCON on and connect to.
+        - client (DockerClient, optional): A Docker client shared with other controllers.
+        - sessions_file (str): The SQLite database player sessions are recorded in.
+        - metrics_retention (dict, optional): Seconds to keep the 'raw', '1m' and '1h'
+            metrics tiers, overriding the defaults.
+        - game_interval (float): Seconds between game telemetry samples, 0 disables them.
+        - restart_policy (dict, optional): RestartPlanner settings overriding its defaults.
+        - jvm_profile (str): The JVM tuning profile, a key of `jvm_profiles.PROFILES`.
+        - heap_advisor (str): 'off', 'suggest' to log a heap size from the RAM% history,
+            or 'apply' to also use it when the container is recreated.
+        - resources (dict, optional): Container CPU, memory, I/O and nofile limits,
+            see `resource_limits.container_resources`.
+        - job_nice (int): Nice value for backups and metrics compaction, which also
+            get the idle I/O class and the CPUs outside the server's cpuset. 0 leaves them alone.
+        - verify_interval (float): Hours between checks of the backup archives, 0 disables them.
         """
+        import docker
+        from metrics_store import MetricsStore
+        from metrics_rollup import MetricsCompactor
+        from backup_engine import BackupEngine, BackupVerifier
+        from restart_planner import RestartPlanner
+        from resource_limits import lower_priority
+
         self.name = name
         self.max_ram = max_ram
         self.port = port
         self.rcon = rcon
+        self.rcon_port = rcon_port
         self.volumes = volumes
         self.hardcore = hardcore
         self.difficulty = difficulty
         self.version = version
+        self.take_new = take_new
+        if jvm_profile not in PROFILES:
+            raise Exception(f'Unknown JVM profile {jvm_profile}, expected one of {", ".join(PROFILES)}')
+        self.jvm_profile = jvm_profile
+        self.jvm_heap = max_ram
+        self.heap_source = 'config'
+        self.heap_advisor = heap_advisor
+
+        self.resources = resources or {}
+        # Backups and compaction yield to the game server
+        self.job_setup = functools.partial(lower_priority, job_nice, self.resources.get('cpuset_cpus')) \
+            if job_nice else None
+
+        self.backup_interval = backup_interval
+        self.backup_engine = backup_engine or BackupEngine(thread_setup=self.job_setup)
+        # A thread only starts once, these rebuild the helper threads that die
+        self.__thread_factories = {}
+        self.backup_verifier = self.__helper_thread('backup_verifier', lambda: BackupVerifier(
+            self.backup_engine, self.name, verify_interval * 60 * 60, thread_setup=self.job_setup))
 
         self.server_running = False
-        self.client = docker.from_env()
+        self.client = client or docker.from_env()
+        instrument_docker(self.client)
         self.last_restart_time = time.time()
-
-        self.start_docker_container(take_new=take_new)
+        self.last_backup_time = time.time()
+        self.last_start_time = time.time()
+        self.launch_reported = False
+        self.last_freeze_seconds = 0.0
+
+        self.rcon_session = RconSession('0.0.0.0', self.rcon, self.rcon_port, timeout=10)
+        self.stats_sampler = self.__helper_thread('stats_sampler', lambda: StatsSampler(
+            self.client.api, self.name, sample_interval=5))
+        self.log_follower = self.__helper_thread('log_follower', lambda: LogFollower(
+            self.client.api, self.name, self.on_log_event, state_path=f'{self.name}.logstate.json'))
+        self.game_sampler = self.__helper_thread('game_sampler', lambda: GameSampler(
+            self.send_command, self.name, interval=game_interval))
+
+        self.container_events = container_events or ContainerEventWatcher(self.client, [self.name])
+        if not self.container_events.is_alive():
+            self.container_events.start()
+        self.metrics_store = MetricsStore(metrics_file)
+        self.metrics_compactor = self.__helper_thread('metrics_compactor', lambda: MetricsCompactor(
+            self.metrics_store, metrics_retention, thread_setup=self.job_setup))
+        self.session_store = SessionStore(sessions_file)
+        self.restart_planner = RestartPlanner(self.session_store, metrics_file, interval=self.RESTART_INTERVAL,
+                                              **(restart_policy or {}))
+        self.heap_advisor_engine = HeapAdvisor(metrics_file)
+
+        # Scrapes read these in-memory values and never call Docker or RCON
+        self.rcon_session.latency_listeners.append(
+            lambda command, seconds: RCON_SECONDS.labels(self.name, command).observe(seconds))
+        PLAYERS_ONLINE.labels(self.name).set_function(lambda: len(self.log_follower.players()))
+        CORRUPT_BACKUPS.labels(self.name).set_function(lambda: len(self.backup_verifier.corrupt))
+        self.tick_profiler = TickProfiler()
+        self.tick_profiler.listeners.append(self.__observe_stage)
+
+        if autostart:
+            self.start_docker_container(take_new=take_new)
 
     def run(self):
         """
         Runs the server monitor.
 
         This method continuously monitors the server and restarts it if necessary.
-        It reloads the server container every 10 seconds and checks if the time since
-        the last restart is greater than or equal to 24 hours. If so, it restarts the server.
+        Ticks run on a fixed grid of `TICK_INTERVAL` seconds, so the time spent in
+        a tick does not stretch the sample period, and after each tick the restart
+        planner decides whether the server should restart.
 
         Note: This method assumes that the `self.container` and `self.server_running`
         attributes have been properly initialized.
@@ -95,116 +273,162 @@ class McServerController:
         logging.info('Starting server monitor')
         logging.info(f'Pid 2: {os.getpid()}')
 
-        # container_stream = self.container.logs(stream=True)
-        last_logged_line = ""
-
-
+        scheduler = self.tick_scheduler()
         while self.server_running:
-            logging.debug('Reloading container')
-            self.container.reload()
-
-            raw_results = self.container.stats(stream=False)
-
-            # logs_results = self.container.logs(stream=False)
-            
-            csv_results = self.__generate_data_row(raw_results)
-
-            with open('data.csv', 'a', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(csv_results)
-
-            logging.debug(self.get_player_count())
-            logging.debug(self.get_players_online())
-
-            self.check_player_change()
-
-            # new_logs = logs_results.splitlines()[len(last_logged_line.splitlines()):]
-            
-            # for line in new_logs:
-            #     logging.info(line)
-            # # logging.info(logs_results)
-
-            # last_logged_line = logs_results
-
+            self.monitor_tick()
 
             current_time = time.time()
 
             logging.debug(f'current time: {current_time} \
                           last restart time: {self.last_restart_time}')
-            if current_time - self.last_restart_time >= 24 * 60 * 60:
+            if self.restart_due():
                 self.restart_server()
                 self.last_restart_time = current_time
-            
-            time.sleep(5)
+                # The restart already took a backup
+                self.last_backup_time = current_time
+                scheduler.reset()
+
+            elif self.backup_due():
+                self.hot_backup()
+                self.last_backup_time = current_time
+                scheduler.reset()
 
-    def check_player_change(self):
+            scheduler.sleep()
+
+    def tick_scheduler(self, interval=None) -> FixedRateScheduler:
         """
-        Check for changes in the list of players online and print the players who joined or left the game.
+        Creates the fixed-rate scheduler the monitor loop waits on.
+
+        Overruns are counted in the `mc_monitor_tick_overruns` metric.
 
-        This method compares the current list of players online with the previous list of players and
-        prints the players who joined or left the game. It also updates the previous list of players.
+        Args:
+            interval (float, optional): Seconds between ticks, `TICK_INTERVAL` by default.
 
         Returns:
-            None
+            FixedRateScheduler: The scheduler.
         """
-        current_players = sorted(self.get_players_online())
-        sold = sorted(self.old_players)
+        scheduler = FixedRateScheduler(interval or self.TICK_INTERVAL)
+        scheduler.listeners.append(lambda missed, lateness: TICK_OVERRUNS.labels(self.name).inc(missed))
+        return scheduler
 
-        if current_players == sold:
-            return
-        if len(current_players) == 0 and len(self.old_players) == 0:
-            return
-        
-        if len(current_players) > len(self.old_players):
-            new_players = set(current_players) - set(self.old_players)
-            logging.info(f'{new_players} joined the Game.')
-            self.old_players = current_players
-        
-        elif len(current_players) < len(self.old_players):
-            left_players = set(self.old_players) - set(current_players)
-            logging.info(f'{left_players} left the Game.')
-            self.old_players = current_players
-        # Same length different players
-        elif len(current_players) == len(self.old_players):
-            intersection = set(current_players).intersection(set(self.old_players))
-            if intersection == []:
-                logging.info(f'{self.old_players} left the Game.')
-                logging.info(f'{current_players} joined the Game.')
-                self.old_players = current_players
-            else:
-                left = list(set(self.old_players) - set(current_players))
-                joined = list(set(current_players) - set(self.old_players))
-                logging.info(f'{left} left the Game.')
-                logging.info(f'{joined} joined the Game.')
+    def monitor_tick(self):
+        """
+        Records one round of metrics.
 
+        Container stats come from the background sampler, so this never waits
+        on the Docker API. Player joins and leaves are reported by the log
+        follower as they happen, so no RCON command is sent here.
 
-    def get_player_count(self) -> str:
+        Returns:
+            None
         """
-        Retrieves the current player count from the server.
+        profiler = self.tick_profiler
+        with profiler.span('tick'):
+            with profiler.span('threads'):
+                for attribute in ('stats_sampler', 'log_follower', 'metrics_compactor'):
+                    self.__ensure_running(attribute)
+                if self.game_sampler.interval:
+                    self.__ensure_running('game_sampler')
+                if self.backup_verifier.interval:
+                    self.__ensure_running('backup_verifier')
+
+            # Frames streamed since the last tick, already decoded by the sampler
+            with profiler.span('drain'):
+                frames = self.stats_sampler.drain()
+            with profiler.span('rows'):
+                # Game readings are sampled less often, rows carry the latest ones
+                game_readings = self.game_sampler.latest()
+                data_rows = [self.__generate_data_row(frame) + game_readings for frame in frames]
+            with profiler.span('store'):
+                for data_row in data_rows:
+                    self.metrics_store.append(data_row)
+                self.metrics_store.flush()
+
+            if data_rows:
+                with profiler.span('publish'):
+                    self.__publish_metrics(data_rows[-1])
+        profiler.log_summary()
+
+    def __helper_thread(self, attribute, factory):
+        self.__thread_factories[attribute] = factory
+        return factory()
+
+    def __ensure_running(self, attribute):
+        # Starts a helper thread, or replaces it if it already ran and exited
+        thread = getattr(self, attribute)
+        if thread.is_alive():
+            return thread
+        if thread.ident is not None:
+            logging.warning(f'Thread {thread.name} has stopped, starting a new one')
+            thread = self.__thread_factories[attribute]()
+            setattr(self, attribute, thread)
+        thread.start()
+        return thread
+
+    def __observe_stage(self, stage, seconds):
+        if stage == 'tick':
+            TICK_SECONDS.labels(self.name).observe(seconds)
+        else:
+            STAGE_SECONDS.labels(self.name, stage).observe(seconds)
+
+    def __publish_metrics(self, data_row):
+        _, cpu_percent, ram_percent, net_rx_bytes, net_tx_bytes, blk_read_bytes, blk_write_bytes, \
+            tps, mspt, entities, loaded_chunks = data_row
+        CPU_PERCENT.labels(self.name).set(cpu_percent)
+        RAM_PERCENT.labels(self.name).set(ram_percent)
+        NET_RX_BYTES.labels(self.name).set(net_rx_bytes)
+        NET_TX_BYTES.labels(self.name).set(net_tx_bytes)
+        BLK_READ_BYTES.labels(self.name).set(blk_read_bytes)
+        BLK_WRITE_BYTES.labels(self.name).set(blk_write_bytes)
+        GAME_TPS.labels(self.name).set(tps)
+        GAME_MSPT.labels(self.name).set(mspt)
+        GAME_ENTITIES.labels(self.name).set(entities)
+        GAME_CHUNKS.labels(self.name).set(loaded_chunks)
+
+    def on_log_event(self, kind, player, timestamp):
+        """
+        Handles an event parsed from the server log by the log follower.
 
-        Returns:
-            str: The player count in the format 'current_players/maximum_players'.
+        Args:
+            kind (str): 'join', 'leave' or 'ready'.
+            player (str): The player name, or the startup time for 'ready'.
+            timestamp (float): When the line was logged, in epoch seconds.
 
-        Raises:
-            Exception: If the server is offline.
+        Returns:
+            None
         """
-        response = self.send_command('list')
-        if response == 'failed':
-            raise Exception('Server is offline')
-        return f'{response.split(":")[0].strip().split(" ")[2]}/{response.split(":")[0].strip().split(" ")[7]}'
-        
-    
-    def get_players_online(self) -> list[str]:
-        raw_response = self.send_command('list')
-        if raw_response == 'failed':
-            raise Exception('Server is offline')
-        if 'There are 0' in raw_response:
-            return []
-        return raw_response.split(':')[1].strip().split(',')
-    
+        if kind == 'join':
+            logging.info(f'{player} joined the Game.')
+            self.session_store.open_session(player, timestamp)
+        elif kind == 'leave':
+            logging.info(f'{player} left the Game.')
+            self.session_store.close_session(player, timestamp)
+        elif kind == 'ready':
+            logging.info(f'Server finished starting in {player}s')
+            self.container_events.set_ready(self.name, timestamp)
+            # Sessions still open were cut off by a crash
+            self.session_store.close_all(timestamp)
+
+    def restart_due(self) -> bool:
+        reason = self.restart_planner.due(self.last_restart_time, self.players_online())
+        if reason:
+            logging.info(f'Restart due: {reason}')
+        return reason is not None
+
+    def players_online(self):
+        # Only the log follower knows who is online without asking the server, and
+        # an empty set means nothing until it has understood the log format
+        if not self.log_follower.is_alive() or not self.log_follower.recognized:
+            return None
+        return len(self.log_follower.players())
+
+    def backup_due(self) -> bool:
+        return bool(self.backup_interval) and \
+            time.time() - self.last_backup_time >= self.backup_interval * 60 * 60
+
     def __generate_data_row(self, container_stats) -> tuple:
 
-        time_stamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        time_stamp = self.__frame_time(container_stats)
 
         total_cpu_usage = container_stats['cpu_stats']['cpu_usage']['total_usage'] - container_stats['precpu_stats']['cpu_usage']['total_usage']
         # Get the total system CPU time used
@@ -231,14 +455,23 @@ class McServerController:
 
         return data_row
 
-    def start_docker_container(self, take_new=False):
+    @staticmethod
+    def __frame_time(container_stats) -> float:
+        # Frames can be queued for a few seconds, so prefer the time docker read them
+        try:
+            read_time = datetime.datetime.strptime(container_stats['read'][:19], '%Y-%m-%dT%H:%M:%S')
+        except (KeyError, ValueError):
+            return time.time()
+        return read_time.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+    def start_docker_container(self, take_new=False, wait_online=True):
         """
         Starts the Docker container for the Minecraft server.
 
         This method checks if the container already exists. If it does, 
         it checks the status of the container.
         If the container is already running, it sets the `server_running` 
-        flag to True and calls the `run` method.
+        flag to True.
         If the container is stopped, it starts the container, waits for the 
         server to come online, and sets the `server_running` flag to True.
         If the container has an unknown status, it raises an exception.
@@ -246,28 +479,46 @@ class McServerController:
         If the container does not exist, it creates a new Docker 
         container using the `create_docker_container` method.
 
+        Args:
+            take_new (bool): Recreate the container with the current settings.
+            wait_online (bool): Block until the server answers RCON. The async
+                runtime passes False and waits on the event loop instead.
+
         Returns:
             None
         """
         logging.info('Starting server')
 
-        if self.client.containers.list(all=True, filters={'name': self.name}):
+        import docker
 
-            logging.info(f'Container {self.name} exists')
+        try:
             self.container = self.client.containers.get(self.name)
+        except docker.errors.NotFound:
+            self.container = None
 
+        if self.heap_advisor != 'off':
+            self.__advise_heap()
 
-            self.__check_environment(take_new)
+        if self.container is not None:
+
+            logging.info(f'Container {self.name} exists')
+            self.container_events.set_status(self.name, self.container.status)
+
+            self.__check_environment(take_new, wait_online)
 
 
             if self.container.status == 'exited':
                 logging.debug(f'Container {self.name} is stopped. starting...')
+                self.last_start_time = time.time()
                 self.container.start()
-                self.__check_server_online()
+                self.__follow_logs()
+                if wait_online:
+                    self.__check_server_online()
                 self.server_running = True
 
             elif self.container.status == 'running':
                 logging.debug(f'Container {self.name} is already running')
+                self.last_restart_time = self.__started_at()
                 self.server_running = True 
 
             else:
@@ -275,11 +526,9 @@ class McServerController:
                 raise Exception(f'!! Unknown Status !! Container status: {self.container.status}')
         else:
             logging.info(f'Container does not exist creating {self.name}')
-            self.create_docker_container()
-        
-        self.run()
+            self.create_docker_container(wait_online)
 
-    def __check_environment(self, take_new):
+    def __check_environment(self, take_new, wait_online=True):
         logging.debug('Checking environment variables')
         environment = self.container.attrs['Config']['Env']
         volumes = self.container.attrs['HostConfig']['Binds']
@@ -290,9 +539,37 @@ class McServerController:
                 logging.warning('Restart Program server with --take-new \
                                 (-t) to apply new changes to the container')
 
+            port_bindings = self.container.attrs['HostConfig'].get('PortBindings') or {}
+            for container_port, host_port in {'25565/tcp': self.port, '25575/tcp': self.rcon_port}.items():
+                published = [binding.get('HostPort') for binding in port_bindings.get(container_port) or []]
+                if str(host_port) not in published:
+                    logging.info(f'Port {container_port} is published on {published}, expected {host_port}.')
+                    logging.warning('Restart Program server with --take-new \
+                                    (-t) to apply new changes to the container')
+
+            from resource_limits import resource_drift
+
+            for difference in resource_drift(self.container.attrs['HostConfig'], self.resources):
+                logging.info(f'Resource limit {difference}.')
+                logging.warning('Restart Program server with --take-new \
+                                (-t) to apply new changes to the container')
+
+            # JVM_OPTS is checked against the profile the container was created
+            # with, a different configured profile or heap is a pending change
+            profile, heap, consistent = container_jvm(environment, self.container.attrs['Config'].get('Labels'))
+            if not consistent:
+                logging.info(f'Environment variable JVM_OPTS does not match the {profile} JVM profile '
+                             'the container was created with.')
+                logging.warning('Restart Program server with --take-new \
+                                (-t) to apply new changes to the container')
+            elif profile != self.jvm_profile or parse_size(heap) != parse_size(self.jvm_heap):
+                logging.info(f'Container runs the {profile} JVM profile with a {heap} heap, '
+                             f'the {self.jvm_profile} profile with a {self.jvm_heap} heap is configured.')
+                logging.warning('Restart Program server with --take-new \
+                                (-t) to apply new changes to the container')
+
             for env in environment:
                 if env.startswith('EULA=') and env != 'EULA=TRUE' or \
-                env.startswith('JVM_OPTS=') and env != f'JVM_OPTS=-Xms1G -Xmx{self.max_ram}' or\
                 env.startswith('HARDCORE=') and env != f'HARDCORE={self.hardcore}' or \
                 env.startswith('DIFFICULTY=') and env != f'DIFFICULTY={self.difficulty}' or \
                 env.startswith('RCON_ENABLED=') and env != 'RCON_ENABLED=true' or \
@@ -317,9 +594,43 @@ class McServerController:
 
             self.container.remove()
 
-            self.create_docker_container()
+            self.create_docker_container(wait_online)
 
-    def create_docker_container(self):
+    def __advise_heap(self):
+        # Compare against what the existing container runs, or what a new one would
+        if self.container is not None:
+            attrs = self.container.attrs
+            profile, heap, _ = container_jvm(attrs['Config']['Env'], attrs['Config'].get('Labels'))
+            heap = heap or self.max_ram
+            from_advisor = (attrs['Config'].get('Labels') or {}).get(HEAP_SOURCE_LABEL) == 'advisor'
+            limit = attrs['HostConfig'].get('Memory')
+        else:
+            profile, heap, from_advisor, limit = self.jvm_profile, self.max_ram, False, 0
+
+        try:
+            # Without a memory limit RAM% is relative to the host's memory
+            limit = limit or self.client.info()['MemTotal']
+            suggested, reason = self.heap_advisor_engine.advise(
+                limit, parse_size(heap), PROFILES.get(profile, (None, True))[1], ceiling=parse_size(self.max_ram))
+        except Exception as e:
+            logging.error(f'Heap advisor failed: {e}')
+            return
+
+        if suggested is None:
+            logging.info(f'Heap advisor keeps the {heap} heap: {reason}')
+            # Keep an earlier advised heap rather than going back to --max-ram
+            if self.heap_advisor == 'apply' and from_advisor and parse_size(heap) <= parse_size(self.max_ram):
+                self.jvm_heap = heap
+                self.heap_source = 'advisor'
+        elif self.heap_advisor == 'apply':
+            self.jvm_heap = format_size(suggested)
+            self.heap_source = 'advisor'
+            logging.info(f'Heap advisor sets the heap to {self.jvm_heap}: {reason}')
+        else:
+            logging.info(f'Heap advisor suggests a {format_size(suggested)} heap instead of {heap}: {reason}. '
+                         'Start with --heap-advisor apply and --take-new to use it')
+
+    def create_docker_container(self, wait_online=True):
         """
         Creates a Docker container for running a Minecraft server with the specified parameters.
 
@@ -327,33 +638,46 @@ class McServerController:
         It sets up the necessary environment variables, port mappings, and volumes for the server.
         After starting the container, it checks if the server is online and logs the container ID.
 
+        Args:
+            wait_online (bool): Block until the server answers RCON.
+
         Returns:
             None
         """
         logging.info('Starting Minecraft server with the following parameters:')
         logging.info(f'Max RAM: {self.max_ram}')
+        logging.info(f'JVM: {self.jvm_profile} profile, {self.jvm_heap} heap from the {self.heap_source}')
         logging.info(f'Port: {self.port}')
         logging.info(f'RCON: {self.rcon}')
         logging.info(f'Volumes: {self.volumes}')
         logging.info(f'Hardcore: {self.hardcore}')
         logging.info(f'Difficulty: {self.difficulty}')
         logging.info(f'Version: {self.version}')
+        logging.info(f'Resources: {self.resources or "unlimited"}')
 
         f_port: dict = {'25565/tcp': self.port}
 
         f_environment: list = [
             'EULA=TRUE',
-            f'JVM_OPTS=-Xms1G -Xmx{self.max_ram}',
+            f'JVM_OPTS={jvm_options(self.jvm_profile, self.jvm_heap)}',
             f'HARDCORE={self.hardcore}',
             f'DIFFICULTY={self.difficulty}',
             f'VERSION={self.version}',
             f'TZ=America/New_York',
         ]
 
-        f_port.update({'25575/tcp': 25575})
+        from resource_limits import container_resources
+
+        f_resources = container_resources(self.resources)
+        if 'mem_limit' in f_resources and parse_size(self.jvm_heap) > 0.85 * f_resources['mem_limit']:
+            logging.warning(f'A {self.jvm_heap} heap leaves little room for the JVM itself under the '
+                            f'{format_size(f_resources["mem_limit"])} memory limit, the container may be OOM killed')
+
+        f_port.update({'25575/tcp': self.rcon_port})
         f_environment.append('RCON_ENABLED=true')
         f_environment.append(f'RCON_PASSWORD={self.rcon}')
 
+        self.last_start_time = time.time()
         self.container = self.client.containers.run(
             'itzg/minecraft-server',
             detach=True,
@@ -361,10 +685,13 @@ class McServerController:
             ports=f_port,
             environment=f_environment,
             volumes={self.volumes:  {'bind': '/data', 'mode': 'rw'}},
+            labels={PROFILE_LABEL: self.jvm_profile, HEAP_SOURCE_LABEL: self.heap_source},
+            **f_resources,
         )
+        self.__follow_logs()
 
-
-        self.__check_server_online()
+        if wait_online:
+            self.__check_server_online()
         self.__await_status('running')
 
         logging.info(f'Minecraft server started with container ID: {self.container.id}')
@@ -409,64 +736,196 @@ class McServerController:
         logging.debug("Stopping server")
         if self.server_running:
 
-            self.send_command("say !! The server will reset in 30 minute !!")
-
-            time.sleep(20 * 60)
+            self.shutdown_countdown()
 
-            self.send_command("say !! The server will reset in 10 minutes !!")
+            self.stop_container()
+            time.sleep(4)
+            logging.info("Server shutdown complete")
+        else:
+            logging.debug("Server is already shutdown")
 
-            time.sleep(9 * 60)
+    def shutdown_countdown(self):
+        """
+        Announces the shutdown in game following `SHUTDOWN_COUNTDOWN`.
 
-            self.send_command("say !! The world will reset in 45 seconds !!")
+        The countdown is skipped when nobody is online, and cut short as soon
+        as the last player leaves.
 
-            time.sleep(40)
+        Returns:
+            None
+        """
+        for messages, wait in self.SHUTDOWN_COUNTDOWN:
+            if self.players_online() == 0:
+                logging.info('Nobody is online, skipping the rest of the shutdown countdown')
+                return
+            for message in messages:
+                self.send_command(message)
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline and self.players_online() != 0:
+                time.sleep(min(5, deadline - time.monotonic()))
+
+    def stop_container(self):
+        """
+        Stops the container right away and waits until it has exited.
 
-            self.send_command("say !! The server will reset 5 seconds !!")
+        Returns:
+            None
+        """
+        logging.info("Server shutdown beginning")
 
-            time.sleep(5)
+        self.container.stop()
 
-            self.send_command("say !! The server is being shut down !!")
-            self.send_command("say !! It will restart in a few moments !!")
+        self.__await_status('exited')
+        self.rcon_session.close()
+        self.session_store.close_all(time.time())
 
-            time.sleep(3)
+        self.server_running = False
 
-            logging.info("Server shutdown beginning")
 
-            self.container.stop()
+    def backup_server_folder(self, source=None):
+        """
+        Backs up the server folder by creating a compressed archive of the specified volumes.
 
-            self.__await_status('exited')
+        This method hands the folder to the controller's `BackupEngine`, which reads
+        and compresses it in parallel into a timestamped archive in the backup
+        directory and removes archives beyond the retention count.
 
-            self.server_running = False
-            time.sleep(4)
-            logging.info("Server shutdown complete")
-        else:
-            logging.debug("Server is already shutdown")
+        Args:
+            source (str, optional): The folder to archive instead of the volumes.
 
+        Returns:
+            None
+        """
+        try:
+            logging.info("Backing up server folder")
+            self.backup_engine.create(source or self.volumes, self.name)
+            logging.info("Backup complete")
+        except Exception as e:
+            logging.error(f"Backup failed: {e}")
 
-    def backup_server_folder(self):
+    def hot_backup(self):
         """
-        Backs up the server folder by creating a zip archive of the specified volumes.
+        Backs up the server folder while the server keeps running.
 
-        This method uses the `shutil.make_archive` function to create a zip 
-        archive of the server folder.
-        The archive is named 'server_backup.zip' and is created in the 
-        same directory as the specified volumes.
+        World saving is turned off with 'save-off', pending chunks are flushed to
+        disk with 'save-all flush', and the volume is copied to a snapshot folder
+        in the backup directory. Saving is turned back on as soon as the copy
+        finishes, then the snapshot is archived and always removed. Players stay
+        connected throughout, the only cost is that the world is not written
+        while the copy runs.
 
         Returns:
             None
         """
+        if not self.server_running:
+            logging.error("Server is not running")
+            return
+
+        backup_dir = self.backup_engine.backup_dir
+        os.makedirs(backup_dir, exist_ok=True)
+        # Snapshots left behind by a crash, mkdtemp adds 8 random characters
+        stale = re.compile(re.escape(f'.{self.name}-snapshot-') + r'[a-z0-9_]{8}')
+        for name in os.listdir(backup_dir):
+            if stale.fullmatch(name):
+                shutil.rmtree(os.path.join(backup_dir, name), ignore_errors=True)
+        snapshot = tempfile.mkdtemp(prefix=f'.{self.name}-snapshot-', dir=backup_dir)
+
         try:
-            logging.info("Backing up server folder")
-            shutil.make_archive('server_backup', 'zip', self.volumes)
-            logging.info("Backup complete")
+            logging.info("Starting online backup")
+            if self.send_command('save-off') == 'failed':
+                logging.error("Online backup aborted, could not turn off saving")
+                return
+
+            freeze_start = time.perf_counter()
+            try:
+                if not self.__flush_world():
+                    logging.error("Online backup aborted, world flush did not complete")
+                    return
+                shutil.copytree(self.volumes, snapshot, dirs_exist_ok=True)
+            except Exception as e:
+                logging.error(f"Online backup snapshot failed: {e}")
+                return
+            finally:
+                if self.send_command('save-on') == 'failed':
+                    logging.error("Could not turn saving back on, send 'save-on' manually")
+                self.last_freeze_seconds = time.perf_counter() - freeze_start
+                logging.info(f"World saving was off for {self.last_freeze_seconds:.2f}s")
+
+            self.backup_server_folder(snapshot)
+        finally:
+            shutil.rmtree(snapshot, ignore_errors=True)
+
+    def restore_backup(self, archive=None):
+        """
+        Replaces the server folder with a backup and restarts the server.
+
+        The container is stopped, the archive is extracted and checked against
+        the checksums recorded when it was made, and the container is started
+        again. If there is no backup, or it fails the check or cannot be
+        extracted, the folder is left untouched and the server is started on
+        the current world. The recovery time, from stopping the container to
+        the server answering RCON, is logged and exported.
+
+        Args:
+            archive (str, optional): The archive to restore, the newest one if omitted.
+
+        Returns:
+            bool: Whether the backup was restored.
+
+        Raises:
+            Exception: If a failed restore could not put the old world back. The
+                server is left stopped rather than started on a half restored world.
+        """
+        if archive is None:
+            archives = self.backup_engine.archives(self.name)
+            if not archives:
+                logging.error(f'There is no backup of {self.name} in {self.backup_engine.backup_dir}, '
+                              f'starting the server on the current world')
+                self.start_docker_container(take_new=self.take_new)
+                return False
+            archive = archives[-1]
+        logging.info(f'Restoring {self.name} from {archive}')
+
+        import docker
+
+        recovery_start = time.perf_counter()
+        try:
+            self.container = self.client.containers.get(self.name)
+        except docker.errors.NotFound:
+            self.container = None
+        if self.container is not None and self.container.status == 'running':
+            self.container_events.set_status(self.name, self.container.status)
+            self.stop_container()
+        stopped = time.perf_counter()
+
+        try:
+            self.backup_engine.restore(archive, self.volumes)
         except Exception as e:
-            logging.error(f"Backup failed: {e}")
+            interrupted = self.backup_engine.interrupted_restores(self.volumes)
+            if interrupted:
+                logging.critical(f'Restoring {archive} left {self.volumes} half restored, not starting the server, '
+                                 f'the previous content is in {", ".join(interrupted)}: {e}')
+                raise
+            logging.error(f'Restoring {archive} failed, starting the server on the current world: {e}')
+            self.start_docker_container(take_new=self.take_new)
+            return False
+        restored = time.perf_counter()
+        self.start_docker_container(take_new=self.take_new)
+
+        seconds = time.perf_counter() - recovery_start
+        RECOVERY_SECONDS.labels(self.name).set(seconds)
+        logging.info(f'Recovered {self.name} from {archive} in {seconds:.2f}s: stopping {stopped - recovery_start:.2f}s, '
+                     f'restoring {restored - stopped:.2f}s, starting until online {seconds - (restored - recovery_start):.2f}s')
+        return True
 
 
     def send_command(self, command):
         """
         Sends a command to the Minecraft server using RCON.
 
+        The command goes over the controller's persistent RCON session, which
+        reconnects on its own after the server restarts.
+
         Args:
             command (str): The command to send to the server.
 
@@ -481,11 +940,8 @@ class McServerController:
 
         logging.debug(f'Sending command: {command}')
         try:
-            # Replace 'your_rcon_password' and 'your_minecraft_server_ip'
-            # with your actual RCON password and server IP
-            with MCRcon('0.0.0.0', 'super', 25575, timeout=10) as client:
-                response = client.command(command)
-                logging.debug(f'Message Response: {response}')
+            response = self.rcon_session.command(command)
+            logging.debug(f'Message Response: {response}')
         except Exception as e:
             # logging.error(f'Command Failed {command}, {e}')
             return 'failed'
@@ -493,19 +949,88 @@ class McServerController:
         return response
 
     def __check_server_online(self):
-        response = self.send_command("say hi")
+        # The 'Done' log line or a healthy status says when to probe, without
+        # either the probe goes out every READINESS_FALLBACK seconds
+        ready = False
+        while not self.is_online():
+            if ready:
+                time.sleep(self.READINESS_RETRY)
+            ready = self.container_events.wait_for_ready(self.name, self.last_start_time, self.READINESS_FALLBACK)
+            # Probe right away instead of after the reconnect backoff
+            self.rcon_session.close()
+        self.record_ready()
+
+    def __follow_logs(self):
+        # Readiness is read from the log, follow it from the moment the container starts
+        if self.log_follower.is_alive():
+            self.log_follower.reconnect()
+        else:
+            self.__ensure_running('log_follower')
 
-        while response == 'failed':
-            time.sleep(6)
-            response = self.send_command("say hi")
-        logging.info('Server is online')
+    def record_ready(self):
+        """
+        Logs and exports the time from the last container start to the server
+        answering RCON, and the first time also the time since the controller launched.
+        """
+        seconds = time.time() - self.last_start_time
+        READY_SECONDS.labels(self.name).set(seconds)
+        logging.info(f'Server is online, {seconds:.2f}s after the container started')
+        if not self.launch_reported:
+            self.launch_reported = True
+            logging.info(f'Controller launch to server online took {process_uptime():.2f}s')
+
+    def is_online(self) -> bool:
+        """
+        Returns whether the server answers RCON commands.
 
-    def __await_status(self, status):
+        'list' is used as the probe since it does not show up in the chat.
+        """
+        return self.send_command('list') != 'failed'
+
+    def __flush_world(self, timeout=120) -> bool:
+        # 'save-all flush' normally answers once the flush is done, but
+        # fall back to watching the log if the response comes back early
+        since = int(time.time())
+        response = self.send_command('save-all flush')
+        if response == 'failed':
+            return False
+        if 'Saved the game' in response:
+            return True
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if b'Saved the game' in self.container.logs(since=since):
+                return True
+            time.sleep(1)
+        return False
+
+    def __started_at(self) -> float:
+        # Count the restart interval from when the container started, not from this process
+        try:
+            started, _ = parse_docker_timestamp(self.container.attrs['State']['StartedAt'])
+        except (KeyError, ValueError):
+            return time.time()
+        return started if 0 < started <= time.time() else time.time()
+
+    def __await_status(self, status, timeout=None):
         logging.info(f'Awaiting status: {status}')
-        while self.container.status != status:
-            logging.debug(f'Container status: {self.container.status}, Expected: {status}')
-            time.sleep(6)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Docker events wake this up right away, reloading is only a fallback
+        # for when the events stream is down
+        while True:
+            wait = self.STATUS_POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+
+            self.container_events.wait_for_status(self.name, status, wait)
             self.container.reload()
+            if self.container.status == status:
+                return
+
+            logging.debug(f'Container status: {self.container.status}, Expected: {status}')
+            if deadline is not None and time.monotonic() >= deadline:
+                raise Exception(f'Timed out waiting for container {self.name} to be {status}')
 
 def set_up_logging(level_str, log_file_size=1):
     """
@@ -545,26 +1070,165 @@ def set_up_logging(level_str, log_file_size=1):
     return file_handler
 
 
-def main(parser: argparse.ArgumentParser):
+def process_uptime() -> float:
+    """
+    Returns the seconds since this process was launched.
+
+    A one-file PyInstaller build unpacks itself in a parent bootloader
+    process first, that time is included by measuring from the parent.
+    """
+    try:
+        pid = os.getpid()
+        bundle = getattr(sys, '_MEIPASS', None)
+        if bundle and os.path.basename(bundle).startswith('_MEI') and os.getppid() != 1:
+            pid = os.getppid()
+        with open(f'/proc/{pid}/stat') as f:
+            # Field 22 is the start time in clock ticks since boot, the
+            # command name before it may contain spaces
+            started = int(f.read().rsplit(')', 1)[1].split()[19]) / os.sysconf('SC_CLK_TCK')
+        with open('/proc/uptime') as f:
+            return float(f.read().split()[0]) - started
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - IMPORTED_AT
+
+
+def main(args: argparse.Namespace):
+    import asyncio
+    from metrics_rollup import DAY
+    from backup_engine import BackupEngine
+    from async_runtime import AsyncControllerRuntime
+    from resource_limits import lower_priority
+
     # logging.info(f'Pif: {os.getpid()}')
+    if args.metrics_port:
+        MetricsExporter(args.metrics_port, args.metrics_host).start()
+
+    if args.fleet:
+        from fleet import Fleet
+
+        fleet = Fleet(
+            args.fleet,
+            McServerController,
+            workers=args.workers,
+            take_new=args.take_new
+        )
+        asyncio.run(fleet.run())
+        return
+
     controller = McServerController(
-        parser.parse_args().name,
-        parser.parse_args().max_ram,
-        parser.parse_args().port,
-        parser.parse_args().rcon,
-        parser.parse_args().volumes,
-        parser.parse_args().hardcore,
-        parser.parse_args().difficulty,
-        parser.parse_args().version,
-        parser.parse_args().take_new
+        args.name,
+        args.max_ram,
+        args.port,
+        args.rcon,
+        args.volumes,
+        args.hardcore,
+        args.difficulty,
+        args.version,
+        args.take_new,
+        args.metrics_file,
+        args.backup_interval,
+        BackupEngine(
+            args.backup_dir,
+            args.backup_keep,
+            args.backup_workers,
+            args.backup_codec,
+            thread_setup=functools.partial(lower_priority, args.job_nice, args.cpuset)
+            if args.job_nice else None,
+        ),
+        autostart=args.runtime == 'sync' and not args.restore,
+        rcon_port=args.rcon_port,
+        sessions_file=args.sessions_file,
+        metrics_retention={
+            'raw': args.retention_raw * DAY,
+            '1m': args.retention_1m * DAY,
+            '1h': args.retention_1h * DAY,
+        },
+        game_interval=args.game_interval,
+        restart_policy={
+            'min_interval': args.restart_window[0] * 60 * 60,
+            'max_interval': args.restart_window[1] * 60 * 60,
+            'ram_percent': args.restart_ram_percent,
+            'ram_slope': args.restart_ram_slope,
+            'mspt': args.restart_mspt,
+        },
+        jvm_profile=args.jvm_profile,
+        heap_advisor=args.heap_advisor,
+        resources={
+            'cpuset_cpus': args.cpuset,
+            'mem_limit': args.mem_limit,
+            'memswap_limit': args.memswap_limit,
+            'cpu_shares': args.cpu_shares,
+            'blkio_weight': args.blkio_weight,
+            'nofile': args.nofile,
+        },
+        job_nice=args.job_nice,
+        verify_interval=args.verify_interval,
     )
 
-    controller.run()
+    if args.restore:
+        controller.restore_backup(None if args.restore == 'latest' else args.restore)
+
+    if args.runtime == 'sync':
+        controller.run()
+    else:
+        runtime = AsyncControllerRuntime(controller, workers=args.workers)
+        asyncio.run(runtime.run())
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Start Minecraft server with Docker')
     parser.add_argument('-d', '--daemon',action='store_true', help='Run the server in daemon mode')
     parser.add_argument('--max-ram', default='2G', help='Maximum RAM for the server')
+    parser.add_argument(
+        '--jvm-profile',
+        default='default',
+        choices=list(PROFILES),
+        help='JVM tuning: default (-Xms1G), g1 (tuned G1, fixed pre-touched heap) or zgc (Java 21+)'
+    )
+    parser.add_argument(
+        '--heap-advisor',
+        default='suggest',
+        choices=['off', 'suggest', 'apply'],
+        help='Size the heap from the RAM%% history: log a suggestion, or apply it when recreating with --take-new'
+    )
+    parser.add_argument(
+        '--cpuset',
+        default=None,
+        help='CPUs the server container is pinned to, e.g. 2-7. Backups run on the others.'
+    )
+    parser.add_argument(
+        '--mem-limit',
+        default=None,
+        help='Memory limit of the server container, e.g. 6g. Leave room above --max-ram for the JVM.'
+    )
+    parser.add_argument(
+        '--memswap-limit',
+        default=None,
+        help='Memory plus swap limit, -1 for unlimited swap. Default is no swap when --mem-limit is set.'
+    )
+    parser.add_argument(
+        '--cpu-shares',
+        default=None,
+        type=int,
+        help='Relative CPU weight of the server container against its neighbours, Docker default 1024'
+    )
+    parser.add_argument(
+        '--blkio-weight',
+        default=None,
+        type=int,
+        help='Relative I/O weight of the server container, 10 to 1000'
+    )
+    parser.add_argument(
+        '--nofile',
+        default=None,
+        type=int,
+        help='Open file limit inside the server container'
+    )
+    parser.add_argument(
+        '--job-nice',
+        default=10,
+        type=int,
+        help='Nice value for backups and metrics compaction, which also get idle I/O priority. 0 disables it.'
+    )
     parser.add_argument('--port', '-p', default=25565, type=int, help='Port to run the server on')
     parser.add_argument(
         '--rcon',
@@ -572,6 +1236,12 @@ if __name__ == "__main__":
         type=str,
         help='Password for the RCON for the server. Default leave RCON off.'
     )
+    parser.add_argument(
+        '--rcon-port',
+        default=25575,
+        type=int,
+        help='Host port to publish RCON on. Default is 25575.'
+    )
     parser.add_argument('--volumes', '-v', help='List of volumes to mount to the server')
     parser.add_argument(
         '--hardcore',
@@ -600,6 +1270,137 @@ if __name__ == "__main__":
         type=int,
         help='Set the max size of the log file in MB'
     )
+    parser.add_argument(
+        '--metrics-file',
+        default='metrics.bin',
+        help='Binary file the container metrics are appended to'
+    )
+    parser.add_argument(
+        '--retention-raw',
+        default=7,
+        type=float,
+        help='Days to keep raw metrics samples before only the rollups remain'
+    )
+    parser.add_argument(
+        '--retention-1m',
+        default=90,
+        type=float,
+        help='Days to keep the 1 minute metrics rollup'
+    )
+    parser.add_argument(
+        '--retention-1h',
+        default=730,
+        type=float,
+        help='Days to keep the 1 hour metrics rollup, 0 keeps it forever'
+    )
+    parser.add_argument(
+        '--game-interval',
+        default=60,
+        type=float,
+        help='Seconds between TPS, entity and chunk samples over RCON, 0 disables them'
+    )
+    parser.add_argument(
+        '--restart-window',
+        default=[20, 28],
+        nargs=2,
+        type=float,
+        metavar=('MIN', 'MAX'),
+        help='Hours after the last restart the next one may be scheduled in, at the quietest hour'
+    )
+    parser.add_argument(
+        '--restart-ram-percent',
+        default=90,
+        type=float,
+        help='Restart early once RAM usage averages this percent, 0 disables it'
+    )
+    parser.add_argument(
+        '--restart-ram-slope',
+        default=2.0,
+        type=float,
+        help='Restart early once the RAM floor rises this many percent per hour, 0 disables it'
+    )
+    parser.add_argument(
+        '--restart-mspt',
+        default=45,
+        type=float,
+        help='Restart early once ticks average this many ms while RAM is above 80%%, 0 disables it'
+    )
+    parser.add_argument(
+        '--sessions-file',
+        default='sessions.db',
+        help='SQLite database player sessions are recorded in'
+    )
+    parser.add_argument(
+        '--metrics-port',
+        default=0,
+        type=int,
+        help='Serve OpenMetrics for scrapers on this port. Default is off.'
+    )
+    parser.add_argument(
+        '--metrics-host',
+        default='0.0.0.0',
+        help='Address the OpenMetrics endpoint listens on'
+    )
+    parser.add_argument(
+        '--backup-interval',
+        default=0,
+        type=float,
+        help='Hours between online backups taken without stopping the server. Default is off (0).'
+    )
+    parser.add_argument(
+        '--backup-dir',
+        default='backups',
+        help='Folder backup archives are written to'
+    )
+    parser.add_argument(
+        '--backup-keep',
+        default=7,
+        type=int,
+        help='Number of backup archives to keep. 0 keeps all of them.'
+    )
+    parser.add_argument(
+        '--backup-workers',
+        default=None,
+        type=int,
+        help='Threads used to read and compress backups. Default is one per CPU.'
+    )
+    parser.add_argument(
+        '--backup-codec',
+        default=None,
+        choices=['zstd', 'gzip'],
+        help='Backup compression. Default is zstd when installed, otherwise gzip.'
+    )
+    parser.add_argument(
+        '--verify-interval',
+        default=24,
+        type=float,
+        help='Hours between checks of the backup archives against their checksums, 0 disables them'
+    )
+    parser.add_argument(
+        '--restore',
+        nargs='?',
+        const='latest',
+        default=None,
+        metavar='ARCHIVE',
+        help='Stop the server, restore a backup (the newest without ARCHIVE) and start it again'
+    )
+    parser.add_argument(
+        '--fleet',
+        default=None,
+        help='JSON config listing several servers to run from this one process'
+    )
+    parser.add_argument(
+        '--runtime',
+        default='sync',
+        choices=['sync', 'async'],
+        help='sync is the blocking monitor loop. async runs monitoring, restarts and backups concurrently.'
+    )
+    parser.add_argument(
+        '--workers',
+        default=4,
+        type=int,
+        help='Threads for blocking Docker and RCON calls in the async runtime'
+    )
     parser.add_argument(
         '--take-new',
         '-t',
@@ -608,9 +1409,10 @@ if __name__ == "__main__":
         help='Apply new changes to the container'
     )
 
-    fh = set_up_logging(parser.parse_args().log_level, parser.parse_args().log_file_size)
+    args = parser.parse_args()
+    fh = set_up_logging(args.log_level, args.log_file_size)
 
-    if parser.parse_args().take_new:
+    if args.take_new:
         logging.warning('!! Applying new changes to the container !!')
         logging.warning('THIS WILL COMPLETELY REMOVE THE OLD CONTAINER AND CREATE A NEW ONE.')
 
@@ -618,13 +1420,26 @@ if __name__ == "__main__":
         if input().lower() != 'y':
             exit()
 
-    if parser.parse_args().volumes is None:
+    if args.volumes is None and args.fleet is None:
         parser.error('Please provide a volume to mount to the server')
 
-    if parser.parse_args().daemon:
+    if args.restore and args.fleet:
+        parser.error('--restore works on a single server, not a fleet')
+
+    if args.restore:
+        logging.warning(f'!! Restoring {args.restore} backup into {args.volumes} !!')
+        logging.warning('THIS WILL REPLACE THE CURRENT WORLD WITH THE BACKUP.')
+
+        print ('Do you wish to proceed? (y/n)')
+        if input().lower() != 'y':
+            exit()
+
+    if args.daemon:
+        import daemon
+
         with daemon.DaemonContext(
             files_preserve=[fh.stream.fileno()]
         ):
-            main(parser)
+            main(args)
     else:
-        main(parser)
+        main(args)
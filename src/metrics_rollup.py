@@ -0,0 +1,287 @@
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+from metrics_store import RAW_FIELDS, MetricsStore, MetricsReader, record_dtype
+
+DAY = 24 * 60 * 60
+
+# Rollup tiers from finest to coarsest as (name, bucket width in seconds)
+TIERS = [('1m', 60), ('1h', 60 * 60)]
+
+# Seconds each tier is kept, 'raw' is the unaggregated metrics file
+DEFAULT_RETENTION = {'raw': 7 * DAY, '1m': 90 * DAY, '1h': 730 * DAY}
+
+# A file is only rewritten once this share of it has expired
+REWRITE_FRACTION = 1 / 8
+
+
+def tier_path(path, tier) -> str:
+    """
+    Returns the file a rollup tier of a metrics file is stored in.
+
+    Example: `metrics.bin` and '1m' give `metrics.1m.bin`.
+    """
+    root, ext = os.path.splitext(path)
+    return f'{root}.{tier}{ext}'
+
+
+def rollup_fields(fields=RAW_FIELDS) -> list:
+    """
+    Returns the columns of a rollup tier built from the given raw columns.
+
+    Every bucket has its sample count and the min, mean and max of each column.
+    """
+    columns = [('samples', 'I')]
+    for name, code in fields:
+        columns += [(f'{name}_min', code), (f'{name}_mean', 'd'), (f'{name}_max', code)]
+    return columns
+
+
+def tier_column(name, tier, how='mean') -> str:
+    """
+    Returns the column holding `name` in a tier, 'raw' or a rollup.
+
+    Args:
+        name (str): The raw column name, e.g. 'cpu_percent'.
+        tier (str): 'raw' or a rollup tier name.
+        how (str): 'min', 'max' or anything else for the mean.
+    """
+    if tier == 'raw':
+        return name
+    return f"{name}_{how if how in ('min', 'max') else 'mean'}"
+
+
+def rollup(records, width, fields=RAW_FIELDS) -> np.ndarray:
+    """
+    Aggregates records into buckets of `width` seconds.
+
+    The records may be raw samples or a finer rollup tier, in which case mins
+    and maxes are combined and means are weighted by the sample counts. NaN
+    values, game readings the server did not report, are left out.
+
+    Args:
+        records (np.ndarray): Structured records sorted by timestamp.
+        width (int): The bucket width in seconds.
+        fields (list): The raw columns the records hold or were rolled up from.
+
+    Returns:
+        np.ndarray: One record per non-empty bucket, timestamped at the bucket start.
+    """
+    dtype = record_dtype(rollup_fields(fields))
+    if len(records) == 0:
+        return np.empty(0, dtype=dtype)
+
+    bucket_ids = np.floor(records['timestamp'] / width).astype('int64')
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_ids)) + 1))
+
+    is_rollup = 'samples' in records.dtype.names
+    samples = records['samples'].astype('float64') if is_rollup else np.ones(len(records))
+
+    result = np.empty(len(starts), dtype=dtype)
+    result['timestamp'] = bucket_ids[starts] * width
+    counts = np.add.reduceat(samples, starts)
+    result['samples'] = counts
+    for name, _ in fields:
+        low = records[f'{name}_min'] if is_rollup else records[name]
+        high = records[f'{name}_max'] if is_rollup else records[name]
+        mean = records[f'{name}_mean'] if is_rollup else records[name]
+        result[f'{name}_min'] = np.fmin.reduceat(low, starts)
+        result[f'{name}_max'] = np.fmax.reduceat(high, starts)
+        weighted = mean.astype('float64') * samples
+        known = ~np.isnan(weighted)
+        if known.all():
+            result[f'{name}_mean'] = np.add.reduceat(weighted, starts) / counts
+        else:
+            with np.errstate(invalid='ignore'):
+                result[f'{name}_mean'] = np.add.reduceat(np.where(known, weighted, 0), starts) \
+                    / np.add.reduceat(np.where(known, samples, 0), starts)
+    return result
+
+
+def plan_reads(tiers, start=None, end=None, resolution=0) -> list[tuple[int, slice]]:
+    """
+    Decides which tiers to read to cover a time range at a given resolution.
+
+    The coarsest tier whose buckets are no wider than `resolution` and which
+    still holds data at `start` is picked. Its newest bucket lags behind the
+    finer tiers, so the rest of the range is filled in from the finer tiers.
+    If no tier is fine enough the finest one holding data at `start` is used.
+    Timestamps and widths only need to share a unit.
+
+    Args:
+        tiers (list): (bucket width, sorted timestamps) pairs, finest first.
+            The raw samples have width 0.
+        start: Start of the range, from the oldest data if omitted.
+        end: End of the range (exclusive), to the newest data if omitted.
+        resolution: The widest acceptable bucket.
+
+    Returns:
+        list: (tier position, record slice) pairs in time order.
+    """
+    firsts = [timestamps[0] if len(timestamps) else None for _, timestamps in tiers]
+    available = [i for i, first in enumerate(firsts) if first is not None]
+    if not available:
+        return []
+
+    oldest = min(firsts[i] for i in available)
+    covered_from = oldest if start is None else max(start, oldest)
+    covering = [i for i in available if firsts[i] <= covered_from]
+    fitting = [i for i in covering if tiers[i][0] <= resolution]
+    chosen = max(fitting) if fitting else min(covering)
+
+    reads = []
+    cursor = start
+    for i in range(chosen, -1, -1):
+        width, timestamps = tiers[i]
+        lo = 0 if cursor is None else int(np.searchsorted(timestamps, cursor, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        if hi > lo:
+            reads.append((i, slice(lo, hi)))
+            # Finer tiers continue where the last bucket read ends
+            cursor = timestamps[hi - 1] + width
+    return reads
+
+
+def read_tiered(path, start=None, end=None, resolution=0, max_points=None, how='mean', fields=RAW_FIELDS) -> tuple:
+    """
+    Reads a time range from a metrics file and its rollup tiers.
+
+    Args:
+        path (str): The raw metrics file.
+        start (float, optional): Epoch seconds, from the oldest data if omitted.
+        end (float, optional): Epoch seconds, to the newest data if omitted.
+        resolution (float): The widest acceptable bucket in seconds.
+        max_points (int, optional): Allow buckets as wide as the range divided by this.
+        how (str): Which rollup column to read, 'min', 'max' or 'mean'.
+        fields (list): The raw columns.
+
+    Returns:
+        tuple: An array of epoch timestamps and a dict of raw column name to values.
+            Columns a file predates are NaN.
+    """
+    sources = [('raw', 0, path)] + [(tier, width, tier_path(path, tier)) for tier, width in TIERS]
+    readers = [(tier, width, MetricsReader(file)) for tier, width, file in sources if os.path.exists(file)]
+
+    pieces = []
+    tiers = [(width, reader.records()['timestamp']) for _, width, reader in readers]
+    if max_points and any(len(timestamps) for _, timestamps in tiers):
+        first = start if start is not None else min(t[0] for _, t in tiers if len(t))
+        last = end if end is not None else max(t[-1] for _, t in tiers if len(t))
+        resolution = max(resolution, (last - first) / max_points)
+
+    for position, rows in plan_reads(tiers, start, end, resolution):
+        tier, _, reader = readers[position]
+        records = reader.records()[rows]
+        values = {}
+        for name, _ in fields:
+            column = tier_column(name, tier, how)
+            values[name] = records[column] if column in records.dtype.names else np.full(len(records), np.nan)
+        pieces.append((records['timestamp'], values))
+
+    timestamps = np.concatenate([piece[0] for piece in pieces]) if pieces else np.empty(0)
+    columns = {
+        name: np.concatenate([piece[1][name].astype('float64') for piece in pieces]) if pieces else np.empty(0)
+        for name, _ in fields
+    }
+    return timestamps, columns
+
+
+class MetricsCompactor(threading.Thread):
+    """
+    A background thread rolling up and expiring the metrics history.
+
+    Every `interval` seconds complete buckets are aggregated into the 1 minute
+    tier from the raw samples, and into the 1 hour tier from the 1 minute
+    tier, as min/mean/max rows. Each file is then trimmed to its retention.
+    Rewriting a file costs a copy of it, so that only happens once an eighth
+    of the file has expired, which keeps every file within 8/7 of its
+    retention. Raw samples are never dropped before they are rolled up.
+
+    Attributes:
+    - store (MetricsStore): The raw store the controller appends to.
+    - retention (dict): Seconds to keep per tier, 'raw', '1m' and '1h'.
+    - interval (float): Seconds between compaction passes.
+    - thread_setup (callable, optional): Run first on the thread, e.g. to lower its priority.
+
+    Methods:
+    - run(self): Thread body, compacts until stopped.
+    - compact(self, now): Runs one compaction pass.
+    - stop(self): Asks the thread to stop.
+    """
+
+    def __init__(self, store, retention=None, interval=60, thread_setup=None):
+        super().__init__(name=f'compact-{os.path.basename(store.path)}', daemon=True)
+        self.store = store
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.interval = interval
+        self.thread_setup = thread_setup
+
+        self._stopped = threading.Event()
+        self._stores = {'raw': store}
+        for tier, _ in TIERS:
+            self._stores[tier] = MetricsStore(tier_path(store.path, tier), rollup_fields(store.fields))
+
+    def run(self):
+        if self.thread_setup is not None:
+            self.thread_setup()
+        while not self._stopped.wait(self.interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f'Compacting {self.store.path} failed: {e}')
+
+    def stop(self):
+        self._stopped.set()
+
+    def compact(self, now=None):
+        """
+        Rolls up complete buckets and drops expired records.
+
+        Args:
+            now (float, optional): Epoch seconds, the current time if omitted.
+
+        Returns:
+            None
+        """
+        now = time.time() if now is None else now
+
+        # Rolled up through, per tier, so the finer tier is not dropped early
+        rolled_up = {}
+        source = 'raw'
+        for tier, width in TIERS:
+            rolled_up[source] = self._roll_up(source, tier, width, now)
+            source = tier
+        rolled_up[source] = now
+
+        for tier, store in self._stores.items():
+            if self.retention.get(tier):
+                self._expire(store, min(now - self.retention[tier], rolled_up[tier]))
+
+    def _roll_up(self, source, tier, width, now) -> float:
+        store = self._stores[tier]
+        store.flush()
+        target = MetricsReader(store.path).records()
+        next_bucket = target['timestamp'][-1] + width if len(target) else None
+
+        self._stores[source].flush()
+        # Only buckets that can no longer receive samples
+        complete = now // width * width
+        records = MetricsReader(self._stores[source].path).read(next_bucket, complete)
+        rows = rollup(records, width, self.store.fields)
+        for row in rows.tolist():
+            store.append(row)
+        store.flush()
+
+        if len(rows):
+            logging.debug(f'Rolled {len(records)} {source} records up into {len(rows)} {tier} buckets')
+        return complete
+
+    def _expire(self, store, cutoff):
+        reader = MetricsReader(store.path)
+        expired = reader.time_slice(None, cutoff).stop
+        if expired and expired >= len(reader.records()) * REWRITE_FRACTION:
+            store.drop_before(cutoff)
@@ -0,0 +1,449 @@
+import os
+import csv
+import mmap
+import time
+import struct
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+MAGIC = b'MCMS'
+VERSION = 1
+
+# Container stats columns, every record starts with a float64 epoch timestamp
+CONTAINER_FIELDS = [
+    ('cpu_percent', 'f'),
+    ('ram_percent', 'f'),
+    ('net_rx_bytes', 'Q'),
+    ('net_tx_bytes', 'Q'),
+    ('blk_read_bytes', 'Q'),
+    ('blk_write_bytes', 'Q'),
+]
+
+# Game telemetry columns, NaN when the server does not report them
+GAME_FIELDS = [
+    ('tps', 'f'),
+    ('mspt', 'f'),
+    ('entities', 'f'),
+    ('loaded_chunks', 'f'),
+]
+
+RAW_FIELDS = CONTAINER_FIELDS + GAME_FIELDS
+
+# Column order of the legacy data.csv written by older controllers
+CSV_COLUMNS = ['Timestamp', 'CPU Usage', 'RAM Usage', 'Net RX Bytes',
+               'Net TX Bytes', 'Block Read Bytes', 'Block Write Bytes']
+CSV_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# One sparse index entry is written for every INDEX_STRIDE records
+INDEX_STRIDE = 1024
+
+_HEADER = struct.Struct('<4sHH')
+_FIELD = struct.Struct('<c31s')
+_INDEX_ENTRY = struct.Struct('<dQ')
+
+
+def _header_bytes(fields) -> bytes:
+    header = _HEADER.pack(MAGIC, VERSION, len(fields))
+    header += b''.join(_FIELD.pack(code.encode(), name.encode()) for name, code in fields)
+    # Keep records 8 byte aligned so the mmap view is cheap to read
+    return header + b'\0' * (-len(header) % 8)
+
+
+def read_header(f) -> tuple[list, int]:
+    """
+    Reads the header of a metrics file.
+
+    Args:
+        f (file): A binary file object positioned at the start of the file.
+
+    Returns:
+        tuple: The list of (name, struct code) fields and the header size in bytes.
+
+    Raises:
+        Exception: If the file is not a metrics file.
+    """
+    magic, version, count = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise Exception(f'{getattr(f, "name", "file")} is not a version {VERSION} metrics file')
+
+    fields = []
+    for _ in range(count):
+        code, name = _FIELD.unpack(f.read(_FIELD.size))
+        fields.append((name.rstrip(b'\0').decode(), code.decode()))
+
+    size = _HEADER.size + count * _FIELD.size
+    return fields, size + (-size % 8)
+
+
+def record_dtype(fields) -> np.dtype:
+    """
+    Returns the numpy dtype matching one record of the given fields.
+    """
+    return np.dtype([('timestamp', '<f8')] + [(name, '<' + code) for name, code in fields])
+
+
+class MetricsStore:
+    """
+    An append-only store of fixed width metric records.
+
+    The file starts with a header describing the columns, followed by packed
+    little endian records. Records go through one long-lived buffered handle,
+    and every `index_stride` records a (timestamp, record number) pair is
+    appended to a sparse `.idx` sidecar so readers can jump to a time range.
+    A file written with fewer columns is migrated once when opened, the new
+    columns are NaN (or 0 for integers) in the existing records.
+
+    Attributes:
+    - path (str): The path of the metrics file.
+    - fields (list): The (name, struct code) columns after the timestamp.
+    - count (int): The number of records in the file.
+
+    Methods:
+    - append(self, row): Appends one record.
+    - merge(self, records): Adds records in any time order, keeping the file sorted.
+    - flush(self): Pushes buffered records to the OS so readers can see them.
+    - drop_before(self, timestamp): Deletes the records older than a timestamp.
+    - close(self): Flushes and closes the file.
+    """
+
+    def __init__(self, path, fields=RAW_FIELDS, index_stride=INDEX_STRIDE):
+        self.path = path
+        self.fields = list(fields)
+        self.index_stride = index_stride
+        self.record = struct.Struct('<d' + ''.join(code for _, code in self.fields))
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                existing, header_size = read_header(f)
+            if existing != self.fields:
+                self._migrate(existing, header_size)
+                header_size = len(_header_bytes(self.fields))
+
+            # Drop a record torn by a crash mid-write
+            size = os.path.getsize(path)
+            whole = header_size + (size - header_size) // self.record.size * self.record.size
+            if whole != size:
+                logging.warning(f'Truncating partial record at the end of {path}')
+                os.truncate(path, whole)
+        else:
+            with open(path, 'wb') as f:
+                f.write(_header_bytes(self.fields))
+            header_size = os.path.getsize(path)
+
+        self.header_size = header_size
+        self.count = (os.path.getsize(path) - header_size) // self.record.size
+
+        self._lock = threading.Lock()
+        self._open()
+
+    def append(self, row):
+        """
+        Appends one record.
+
+        Args:
+            row (sequence): The epoch timestamp followed by one value per field.
+        """
+        with self._lock:
+            if self.count % self.index_stride == 0:
+                self._index.write(_INDEX_ENTRY.pack(row[0], self.count))
+            self._file.write(self.record.pack(*row))
+            self.count += 1
+
+    def merge(self, records) -> int:
+        """
+        Adds records in any time order.
+
+        Records that all come after the last one are appended. Otherwise the
+        file is rewritten with every record sorted by timestamp and the index
+        is rebuilt, since readers binary search both.
+
+        Args:
+            records (np.ndarray): Structured records of `record_dtype(self.fields)`.
+
+        Returns:
+            int: The number of records added.
+        """
+        records = records[np.argsort(records['timestamp'], kind='stable')]
+        with self._lock:
+            self._file.flush()
+            existing = np.fromfile(self.path, dtype=record_dtype(self.fields), offset=self.header_size)
+            in_order = len(existing) == 0 or len(records) == 0 \
+                or records['timestamp'][0] >= existing['timestamp'][-1]
+            if not in_order:
+                merged = np.concatenate([existing, records])
+                self._rewrite(merged[np.argsort(merged['timestamp'], kind='stable')])
+
+        if in_order:
+            for row in records.tolist():
+                self.append(row)
+        else:
+            logging.info(f'Merged {len(records)} records into {self.path} in time order')
+        return len(records)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+            self._index.flush()
+
+    def drop_before(self, timestamp) -> int:
+        """
+        Deletes every record older than `timestamp`.
+
+        The kept records are written to a new file which then replaces the old
+        one, so readers holding the old file keep a consistent view and the
+        backend cache notices the new inode and reloads.
+
+        Args:
+            timestamp (float): Epoch seconds, records before it are removed.
+
+        Returns:
+            int: The number of records removed.
+        """
+        with self._lock:
+            self._file.flush()
+            records = np.fromfile(self.path, dtype=record_dtype(self.fields), offset=self.header_size)
+            dropped = int(np.searchsorted(records['timestamp'], timestamp, side='left'))
+            if dropped == 0:
+                return 0
+            self._rewrite(records[dropped:])
+        logging.info(f'Dropped {dropped} records older than {time.ctime(timestamp)} from {self.path}')
+        return dropped
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            self._index.flush()
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _rewrite(self, records):
+        # Called with the lock held, replaces the file with `records`
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(_header_bytes(self.fields))
+            f.write(records.tobytes())
+
+        self._file.close()
+        self._index.close()
+        os.replace(temporary, self.path)
+        # The index no longer matches, _open rebuilds it
+        os.remove(self.path + '.idx')
+        self.count = len(records)
+        self._open()
+
+    def _migrate(self, existing, header_size):
+        missing = [field for field in existing if field not in self.fields]
+        if missing:
+            raise Exception(f'{self.path} has columns {existing}, expected {self.fields}')
+
+        logging.info(f'Migrating {self.path} from {len(existing)} to {len(self.fields)} columns')
+        old_dtype = record_dtype(existing)
+        size = os.path.getsize(self.path) - header_size
+        old = np.fromfile(self.path, dtype=old_dtype, count=size // old_dtype.itemsize, offset=header_size)
+
+        records = np.zeros(len(old), dtype=record_dtype(self.fields))
+        for name in records.dtype.names:
+            if name in old_dtype.names:
+                records[name] = old[name]
+            elif records.dtype[name].kind == 'f':
+                records[name] = np.nan
+
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(_header_bytes(self.fields))
+            f.write(records.tobytes())
+        os.replace(temporary, self.path)
+
+    def _open(self):
+        self._file = open(self.path, 'ab', buffering=64 * 1024)
+        self._check_index()
+        self._index = open(self.path + '.idx', 'ab')
+
+    def _check_index(self):
+        index_path = self.path + '.idx'
+        expected = -(-self.count // self.index_stride)
+        size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        if size == expected * _INDEX_ENTRY.size:
+            return
+
+        logging.info(f'Rebuilding sparse index {index_path}')
+        timestamps = np.fromfile(self.path, dtype=record_dtype(self.fields),
+                                 offset=self.header_size)['timestamp']
+        with open(index_path, 'wb') as f:
+            for record_number in range(0, self.count, self.index_stride):
+                f.write(_INDEX_ENTRY.pack(timestamps[record_number], record_number))
+
+
+class MetricsReader:
+    """
+    A memory mapped, read-only view of a metrics file.
+
+    Attributes:
+    - path (str): The path of the metrics file.
+    - fields (list): The (name, struct code) columns after the timestamp.
+    - dtype (np.dtype): The numpy dtype of one record.
+
+    Methods:
+    - refresh(self): Remaps the file if it has grown and returns the record count.
+    - records(self): Returns every record as a structured array view.
+    - time_slice(self, start, end): Returns the record range covering a time range.
+    - read(self, start, end): Returns the records between two epoch timestamps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.fields, self.header_size = read_header(f)
+        self.dtype = record_dtype(self.fields)
+
+        self._size = 0
+        self._records = np.empty(0, dtype=self.dtype)
+        self.refresh()
+
+    def refresh(self) -> int:
+        size = os.path.getsize(self.path)
+        if size != self._size:
+            count = (size - self.header_size) // self.dtype.itemsize
+            if count > 0:
+                with open(self.path, 'rb') as f:
+                    view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._records = np.frombuffer(view, dtype=self.dtype, count=count, offset=self.header_size)
+            else:
+                self._records = np.empty(0, dtype=self.dtype)
+            self._size = size
+        return len(self._records)
+
+    def records(self) -> np.ndarray:
+        return self._records
+
+    def time_slice(self, start=None, end=None) -> slice:
+        """
+        Finds the records with start <= timestamp < end.
+
+        The sparse index narrows the search to one block of records so only a
+        few pages of the file are touched.
+
+        Args:
+            start (float, optional): Epoch seconds, unbounded if omitted.
+            end (float, optional): Epoch seconds, unbounded if omitted.
+
+        Returns:
+            slice: The matching record positions.
+        """
+        count = len(self._records)
+        lo = 0 if start is None else self._search(start, count)
+        hi = count if end is None else self._search(end, count)
+        return slice(lo, max(lo, hi))
+
+    def read(self, start=None, end=None) -> np.ndarray:
+        return self._records[self.time_slice(start, end)]
+
+    def _search(self, timestamp, count) -> int:
+        index = self._load_index()
+        block = int(np.searchsorted(index['timestamp'], timestamp, side='right')) - 1
+        lo = int(index['record'][block]) if block >= 0 else 0
+        hi = int(index['record'][block + 1]) if block + 1 < len(index) else count
+        lo, hi = min(lo, count), min(hi, count)
+        return lo + int(np.searchsorted(self._records['timestamp'][lo:hi], timestamp, side='left'))
+
+    def _load_index(self) -> np.ndarray:
+        index_path = self.path + '.idx'
+        if not os.path.exists(index_path):
+            return np.empty(0, dtype=[('timestamp', '<f8'), ('record', '<u8')])
+        return np.fromfile(index_path, dtype=[('timestamp', '<f8'), ('record', '<u8')])
+
+
+def import_csv(csv_path, store_path):
+    """
+    Adds the rows of a legacy data.csv to a metrics file.
+
+    The rows are merged in time order, so a CSV older than the samples
+    already recorded can be imported into a live metrics file. Rollup tiers
+    only ever take buckets newer than their last one, so buckets older than a
+    tier's first one are added to it here, otherwise the imported history
+    would expire from the raw file without being rolled up.
+
+    Args:
+        csv_path (str): The CSV file written by older controllers.
+        store_path (str): The metrics file to add to.
+
+    Returns:
+        int: The number of imported rows.
+    """
+    from metrics_rollup import TIERS, rollup, rollup_fields, tier_path
+
+    rows = []
+    with open(csv_path, newline='') as csvfile:
+        for row in csv.reader(csvfile):
+            if not row:
+                continue
+            timestamp = time.mktime(time.strptime(row[0], CSV_TIME_FORMAT))
+            rows.append(tuple([timestamp, float(row[1]), float(row[2])] + [int(value) for value in row[3:7]]
+                              + [float('nan')] * len(GAME_FIELDS)))
+
+    with MetricsStore(store_path) as store:
+        records = np.array(rows, dtype=record_dtype(store.fields))
+        store.merge(records)
+        fields = store.fields
+
+    for tier, width in TIERS:
+        path = tier_path(store_path, tier)
+        if not os.path.exists(path):
+            continue
+        with MetricsStore(path, rollup_fields(fields)) as tier_store:
+            first = MetricsReader(path).records()['timestamp'][:1]
+            buckets = rollup(records[np.argsort(records['timestamp'], kind='stable')], width, fields)
+            if len(first):
+                buckets = buckets[buckets['timestamp'] + width <= first[0]]
+            tier_store.merge(buckets)
+    return len(rows)
+
+
+def export_csv(store_path, csv_path):
+    """
+    Writes a metrics file out in the legacy data.csv layout.
+
+    Args:
+        store_path (str): The metrics file to read.
+        csv_path (str): The CSV file to write.
+
+    Returns:
+        int: The number of exported rows.
+    """
+    records = MetricsReader(store_path).records()
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        for record in records:
+            values = record.tolist()
+            writer.writerow([time.strftime(CSV_TIME_FORMAT, time.localtime(values[0])),
+                             round(values[1], 2), round(values[2], 2)] + list(values[3:7]))
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert between data.csv and the binary metrics file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Append a legacy data.csv to a metrics file')
+    import_parser.add_argument('csv_path', help='CSV file to read')
+    import_parser.add_argument('store_path', help='Metrics file to append to')
+
+    export_parser = subparsers.add_parser('export', help='Write a metrics file out as CSV')
+    export_parser.add_argument('store_path', help='Metrics file to read')
+    export_parser.add_argument('csv_path', help='CSV file to write')
+
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        print(f'Imported {import_csv(args.csv_path, args.store_path)} rows into {args.store_path}')
+    else:
+        print(f'Exported {export_csv(args.store_path, args.csv_path)} rows to {args.csv_path}')
@@ -0,0 +1,304 @@
+import re
+import math
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Latency buckets in seconds, from a fast RCON reply up to a slow Docker call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Family:
+    """
+    A named metric with one child per combination of label values.
+    """
+
+    kind = 'unknown'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise Exception(f'{self.name} takes labels {self.labelnames}, got {values}')
+        key = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def remove(self, *values):
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def render(self, lines):
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        lines.append(f'# HELP {self.name} {_escape(self.documentation)}')
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            self._render_child(lines, key, child)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _render_child(self, lines, key, child):
+        raise NotImplementedError
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = float(value)
+
+    def inc(self, amount=1.0):
+        self._value += amount
+
+    def set_function(self, function):
+        """
+        Reads the value from `function` at scrape time instead of storing it.
+        """
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self._value
+
+
+class Gauge(_Family):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def _render_child(self, lines, key, child):
+        try:
+            value = child.get()
+        except Exception as e:
+            logging.debug(f'Skipping {self.name}{key}: {e}')
+            return
+        lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+
+
+class Counter(_Family):
+    """
+    A monotonic counter. `set` mirrors a counter kept elsewhere, like the
+    byte counters Docker reports, which restart from zero with the container.
+    """
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def _render_child(self, lines, key, child):
+        lines.append(f'{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(child.get())}')
+
+
+class _HistogramValue:
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Family):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, lines, key, child):
+        counts, total = child.snapshot()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            # OpenMetrics wants bucket bounds in canonical float form, like '1.0'
+            le = '+Inf' if bound == math.inf else repr(float(bound))
+            labels = _format_labels(self.labelnames, key, [('le', le)])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+
+
+class Registry:
+    """
+    The set of metric families served by an exporter.
+
+    Families are created once, usually at import time, and their values are
+    updated in place by the code that owns them. Rendering only reads those
+    values, so a scrape never calls Docker or RCON.
+
+    Methods:
+    - gauge(self, name, documentation, labelnames): Creates a gauge.
+    - counter(self, name, documentation, labelnames): Creates a counter.
+    - histogram(self, name, documentation, labelnames, buckets): Creates a histogram.
+    - render(self): Returns the OpenMetrics text exposition.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            family.render(lines)
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, family):
+        with self._lock:
+            if family.name in self._families:
+                raise Exception(f'Metric {family.name} is already registered')
+            self._families[family.name] = family
+        return family
+
+
+# The registry the controller's metrics live in
+REGISTRY = Registry()
+
+DOCKER_API_SECONDS = REGISTRY.histogram(
+    'mc_docker_api_seconds',
+    'Time until the Docker API answered a request.',
+    ['call'],
+)
+
+# Turns '/v1.43/containers/survival/stop' into '/containers/{id}/stop'
+_API_VERSION = re.compile(r'^/v[0-9.]+')
+_CONTAINER_ID = re.compile(r'^/containers/(?!create$|json$)[^/]+')
+
+
+def instrument_docker(client):
+    """
+    Records the latency of every non-streaming Docker API request.
+
+    Streaming requests (stats, logs, events) stay open for as long as they
+    are followed, so they are left out. Calling this twice on the same client
+    has no effect.
+
+    Args:
+        client (DockerClient): The docker-py client to instrument.
+    """
+    hooks = client.api.hooks['response']
+    if _observe_docker_response not in hooks:
+        hooks.append(_observe_docker_response)
+
+
+def _observe_docker_response(response, *args, **kwargs):
+    if kwargs.get('stream'):
+        return
+    path = _API_VERSION.sub('', response.request.path_url.split('?', 1)[0])
+    path = _CONTAINER_ID.sub('/containers/{id}', path)
+    DOCKER_API_SECONDS.labels(f'{response.request.method} {path}').observe(response.elapsed.total_seconds())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f'Metrics scrape from {self.address_string()}: {format % args}')
+
+
+class MetricsExporter(threading.Thread):
+    """
+    Serves a registry on `http://<host>:<port>/metrics` from a background thread.
+
+    Attributes:
+    - host (str): The address to listen on.
+    - port (int): The port to listen on, 0 picks a free one.
+    - registry (Registry): The metrics to serve.
+
+    Methods:
+    - run(self): Thread body, serves scrapes until stopped.
+    - stop(self): Shuts the server down.
+    """
+
+    def __init__(self, port, host='0.0.0.0', registry=REGISTRY):
+        super().__init__(name='metrics-exporter', daemon=True)
+        handler = type('Handler', (_Handler,), {'registry': registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.host = host
+        self.port = self.server.server_address[1]
+        self.registry = registry
+
+    def run(self):
+        logging.info(f'Serving OpenMetrics on http://{self.host}:{self.port}/metrics')
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,176 @@
+import time
+import socket
+import logging
+import threading
+from collections import deque
+
+from mcrcon import MCRcon, MCRconException
+
+
+class _SocketTimeoutMCRcon(MCRcon):
+    """
+    MCRcon client that enforces its timeout with socket timeouts.
+
+    The stock client installs a SIGALRM handler in __init__ and arms it on every
+    read, which only works from the main thread. The session is shared by
+    several threads, so this variant relies on the socket timeout instead and
+    treats a closed socket as an error rather than looping on empty reads.
+    """
+
+    def __init__(self, host, password, port=25575, timeout=5):
+        self.host = host
+        self.password = password
+        self.port = port
+        self.tlsmode = 0
+        self.timeout = timeout
+
+    def connect(self):
+        self.socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._send(3, self.password)
+
+    def _read(self, length):
+        data = b""
+        while len(data) < length:
+            chunk = self.socket.recv(length - len(data))
+            if not chunk:
+                raise MCRconException('Connection closed by server')
+            data += chunk
+        return data
+
+
+class RconSession:
+    """
+    A persistent RCON session to a Minecraft server.
+
+    One TCP connection is opened and authenticated lazily, then reused for every
+    command. Commands are serialized with a lock so the session can be shared
+    between threads. When a command fails the connection is dropped and the
+    next reconnect is delayed with exponential backoff.
+
+    Attributes:
+    - host (str): The RCON host.
+    - port (int): The RCON port.
+    - timeout (float): Socket timeout in seconds for connect and reads.
+    - backoff_initial (float): Delay before the first reconnect attempt after a failure.
+    - backoff_max (float): Upper bound for the reconnect delay.
+    - latency_listeners (list): Callables invoked with (command, seconds) after each command.
+
+    Methods:
+    - command(self, command): Sends a command and returns the response.
+    - close(self): Closes the connection.
+    - latency_stats(self): Returns per-command latency statistics.
+    """
+
+    def __init__(self, host, password, port=25575, timeout=10, backoff_initial=1, backoff_max=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.latency_listeners = []
+
+        self._password = password
+        self._client = None
+        self._lock = threading.Lock()
+        self._backoff = 0
+        self._next_attempt = 0.0
+        self._latencies: dict[str, deque] = {}
+
+    def command(self, command) -> str:
+        """
+        Sends a command over the shared connection, connecting first if needed.
+
+        Args:
+            command (str): The command to send to the server.
+
+        Returns:
+            str: The response from the server.
+
+        Raises:
+            Exception: If the session is backing off or the command fails.
+        """
+        with self._lock:
+            if self._client is None:
+                self._connect()
+
+            start = time.perf_counter()
+            try:
+                response = self._client.command(command)
+            except (OSError, MCRconException, ValueError) as e:
+                self._disconnect()
+                self._schedule_retry()
+                raise Exception(f'RCON command {command} failed: {e}') from e
+
+            elapsed = time.perf_counter() - start
+
+        self._record_latency(command, elapsed)
+        return response
+
+    def close(self):
+        """
+        Closes the connection. The next command reconnects immediately.
+        """
+        with self._lock:
+            self._disconnect()
+            self._backoff = 0
+            self._next_attempt = 0.0
+
+    def latency_stats(self) -> dict:
+        """
+        Returns latency statistics for recently sent commands.
+
+        Returns:
+            dict: Command name mapped to count, mean, max and last latency in seconds.
+        """
+        with self._lock:
+            samples = {name: list(values) for name, values in self._latencies.items()}
+
+        return {
+            name: {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'max': max(values),
+                'last': values[-1],
+            }
+            for name, values in samples.items() if values
+        }
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_attempt:
+            raise Exception(f'RCON reconnect backing off for {self._next_attempt - now:.1f}s')
+
+        logging.debug(f'Opening RCON session to {self.host}:{self.port}')
+        client = _SocketTimeoutMCRcon(self.host, self._password, self.port, timeout=self.timeout)
+        try:
+            client.connect()
+        except (OSError, MCRconException) as e:
+            client.disconnect()
+            self._schedule_retry()
+            raise Exception(f'RCON connect failed: {e}') from e
+
+        self._client = client
+        self._backoff = 0
+        self._next_attempt = 0.0
+        logging.debug('RCON session established')
+
+    def _disconnect(self):
+        if self._client is not None:
+            self._client.disconnect()
+            self._client = None
+
+    def _schedule_retry(self):
+        if self._backoff:
+            self._backoff = min(self._backoff * 2, self.backoff_max)
+        else:
+            self._backoff = self.backoff_initial
+        self._next_attempt = time.monotonic() + self._backoff
+
+    def _record_latency(self, command, elapsed):
+        name = command.split(' ', 1)[0]
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=256)).append(elapsed)
+
+        logging.debug(f'RCON {name} took {elapsed * 1000:.1f}ms')
+        for listener in self.latency_listeners:
+            listener(name, elapsed)
@@ -0,0 +1,145 @@
+import os
+import ctypes
+import logging
+import platform
+import threading
+
+from docker.types import Ulimit
+from docker.utils import parse_bytes
+
+# ioprio_set is not wrapped by Python, its syscall number per architecture
+_IOPRIO_SET = {'x86_64': 251, 'aarch64': 30, 'i686': 289, 'armv7l': 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def parse_cpuset(spec) -> set[int]:
+    """
+    Parses a Docker cpuset like '0-3,6' into CPU numbers.
+    """
+    cpus = set()
+    for part in str(spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def container_resources(resources) -> dict:
+    """
+    Turns the controller's resource settings into containers.run() arguments.
+
+    Args:
+        resources (dict): Any of 'cpuset_cpus' (e.g. '2-7'), 'mem_limit' and
+            'memswap_limit' (bytes or sizes like '6g'), 'cpu_shares',
+            'blkio_weight' (10 to 1000) and 'nofile' (a limit, or [soft, hard]).
+            Without 'memswap_limit' the container gets no swap, since a
+            swapping JVM stalls the game loop, -1 allows unlimited swap.
+
+    Returns:
+        dict: The keyword arguments, settings left out are not passed.
+    """
+    resources = resources or {}
+    options = {}
+    if resources.get('cpuset_cpus'):
+        options['cpuset_cpus'] = str(resources['cpuset_cpus'])
+    if resources.get('mem_limit'):
+        options['mem_limit'] = parse_bytes(resources['mem_limit'])
+        options['memswap_limit'] = parse_bytes(resources.get('memswap_limit') or options['mem_limit'])
+    if resources.get('cpu_shares'):
+        options['cpu_shares'] = int(resources['cpu_shares'])
+    if resources.get('blkio_weight'):
+        options['blkio_weight'] = int(resources['blkio_weight'])
+    if resources.get('nofile'):
+        nofile = resources['nofile']
+        soft, hard = nofile if isinstance(nofile, (list, tuple)) else (nofile, nofile)
+        options['ulimits'] = [Ulimit(name='nofile', soft=int(soft), hard=int(hard))]
+    return options
+
+
+def resource_drift(host_config, resources) -> list[str]:
+    """
+    Compares a container's HostConfig with the resource settings.
+
+    Settings left out are expected to be unlimited in the container too.
+
+    Args:
+        host_config (dict): The container's 'HostConfig' from inspect.
+        resources (dict): The settings, as for `container_resources`.
+
+    Returns:
+        list: A description of each difference.
+    """
+    options = container_resources(resources)
+    expected = {
+        'CpusetCpus': options.get('cpuset_cpus', ''),
+        'Memory': options.get('mem_limit', 0),
+        'MemorySwap': options.get('memswap_limit', 0),
+        'CpuShares': options.get('cpu_shares', 0),
+        'BlkioWeight': options.get('blkio_weight', 0),
+        'Ulimits': options.get('ulimits', []),
+    }
+    actual = {
+        'CpusetCpus': host_config.get('CpusetCpus') or '',
+        'Memory': host_config.get('Memory') or 0,
+        # Docker reports unlimited swap as -1 or 0 depending on the version
+        'MemorySwap': (host_config.get('MemorySwap') or 0) if host_config.get('Memory') else 0,
+        'CpuShares': host_config.get('CpuShares') or 0,
+        'BlkioWeight': host_config.get('BlkioWeight') or 0,
+        'Ulimits': host_config.get('Ulimits') or [],
+    }
+    # '0-3' and '0,1,2,3' are the same cpuset, ulimits come in any order
+    normalize = {
+        'CpusetCpus': parse_cpuset,
+        'Ulimits': lambda limits: {(limit['Name'], limit['Soft'], limit['Hard']) for limit in limits},
+    }
+    show = {
+        'Ulimits': lambda limits: ', '.join(f"{limit['Name']}={limit['Soft']}:{limit['Hard']}" for limit in limits),
+    }
+
+    differences = []
+    for key in expected:
+        same = normalize.get(key, lambda value: value)
+        if same(actual[key]) != same(expected[key]):
+            text = show.get(key, str)
+            differences.append(f'{key} is {text(actual[key]) if actual[key] else "unset"}, '
+                               f'expected {text(expected[key]) if expected[key] else "unset"}')
+    return differences
+
+
+def lower_priority(nice=10, avoid_cpus=None):
+    """
+    Moves the calling thread out of the game server's way.
+
+    On Linux the nice value, I/O priority and CPU affinity are per thread, so
+    this is meant as a thread pool initializer or the first call of a
+    background thread. The thread gets nice value `nice`, the idle I/O class
+    and the CPUs not in `avoid_cpus`, usually the server's cpuset. Anything
+    the platform does not support is skipped.
+
+    Args:
+        nice (int): The nice value, 0 to 19.
+        avoid_cpus (str, optional): A cpuset the thread should not run on.
+    """
+    thread = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread, max(nice, os.getpriority(os.PRIO_PROCESS, thread)))
+    except (AttributeError, OSError) as e:
+        logging.debug(f'Could not lower the CPU priority of {threading.current_thread().name}: {e}')
+
+    number = _IOPRIO_SET.get(platform.machine())
+    if number is not None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syscall(number, _IOPRIO_WHO_PROCESS, thread, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) != 0:
+            logging.debug(f'Could not lower the I/O priority of {threading.current_thread().name}: '
+                          f'{os.strerror(ctypes.get_errno())}')
+
+    avoid = parse_cpuset(avoid_cpus)
+    if avoid and hasattr(os, 'sched_setaffinity'):
+        allowed = os.sched_getaffinity(0) - avoid
+        # When the server has every CPU there is nowhere else to go
+        if allowed:
+            os.sched_setaffinity(0, allowed)
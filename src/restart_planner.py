@@ -0,0 +1,186 @@
+import time
+import logging
+from typing import Optional
+
+import numpy as np
+
+from metrics_rollup import read_tiered
+
+HOUR = 60 * 60
+# Occupancy is profiled per hour of the week, in local time
+WEEK_SLOTS = 7 * 24
+
+
+def week_slot(timestamp) -> int:
+    moment = time.localtime(timestamp)
+    return moment.tm_wday * 24 + moment.tm_hour
+
+
+class RestartPlanner:
+    """
+    Decides when the server should restart.
+
+    Scheduled restarts land between `min_interval` and `max_interval` after
+    the last one, at the hour of the week that had the fewest players over
+    the last `history` seconds of recorded sessions. Without history the
+    restart stays `interval` after the last one. Once `min_interval` has
+    passed the restart is pulled forward if nobody is online and the current
+    hour is no busier than the planned one.
+
+    Early restarts are triggered by memory pressure read from the metrics
+    history: the recent RAM% reaching `ram_percent`, the RAM% floor (the
+    per-minute minimum, what is left after garbage collection) rising by
+    `ram_slope` percent per hour or more over `trend_window`, or slow ticks
+    (mean `mspt` or more) while RAM% is above `gc_ram_percent`, the usual
+    sign of a collector struggling. A threshold of 0 disables its check. No
+    restart is ever due within `min_uptime` of the last one.
+
+    Attributes:
+    - session_store (SessionStore): The player session history.
+    - metrics_path (str): The raw metrics file of the server.
+    - interval, min_interval, max_interval (float): Seconds between scheduled restarts.
+    - history (float): Seconds of sessions the occupancy profile is built from.
+    - ram_percent, ram_slope, mspt, gc_ram_percent (float): Early restart thresholds.
+    - trend_window (float): Seconds of RAM% history the leak trend is fitted over.
+    - min_uptime (float): Seconds after a restart before another can be due.
+    - check_interval (float): Seconds between reads of the metrics history.
+
+    Methods:
+    - due(self, last_restart, players_online, now): Returns why a restart is due, or None.
+    - plan(self, last_restart, now): Returns the time of the next scheduled restart.
+    - occupancy_profile(self, now): Returns the mean peak players per hour of the week.
+    - pressure(self, now): Returns the memory pressure calling for a restart, or None.
+    """
+
+    def __init__(self, session_store, metrics_path, interval=24 * HOUR, min_interval=20 * HOUR,
+                 max_interval=28 * HOUR, history=28 * 24 * HOUR, ram_percent=90, ram_slope=2.0,
+                 trend_window=6 * HOUR, mspt=45, gc_ram_percent=80, min_uptime=HOUR, check_interval=60,
+                 step=15 * 60):
+        self.session_store = session_store
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.history = history
+        self.ram_percent = ram_percent
+        self.ram_slope = ram_slope
+        self.trend_window = trend_window
+        self.mspt = mspt
+        self.gc_ram_percent = gc_ram_percent
+        self.min_uptime = min_uptime
+        self.check_interval = check_interval
+        self.step = step
+
+        self._plan = None
+        self._profile = None
+        self._next_check = 0.0
+        self._pressure = None
+
+    def due(self, last_restart, players_online=None, now=None) -> Optional[str]:
+        """
+        Returns why a restart is due, or None if it is not.
+
+        Args:
+            last_restart (float): Epoch seconds of the last restart.
+            players_online (int, optional): Players online now, None if unknown.
+            now (float, optional): Epoch seconds, the current time if omitted.
+
+        Returns:
+            str: The reason, for the log.
+        """
+        now = time.time() if now is None else now
+        if now - last_restart < self.min_uptime:
+            return None
+
+        pressure = self.pressure(now)
+        if pressure:
+            return pressure
+
+        planned = self.plan(last_restart, now)
+        if now >= planned:
+            return f'scheduled at the quietest hour, {self._profile[week_slot(planned)]:.1f} players on average'
+        if players_online == 0 and now - last_restart >= self.min_interval \
+                and self._profile[week_slot(now)] <= self._profile[week_slot(planned)]:
+            return 'nobody is online and the planned hour is no quieter'
+        return None
+
+    def plan(self, last_restart, now=None) -> float:
+        """
+        Returns the time of the next scheduled restart, planned once per restart.
+        """
+        now = time.time() if now is None else now
+        if self._plan is not None and self._plan[0] == last_restart:
+            return self._plan[1]
+
+        self._profile = self.occupancy_profile(now)
+        nominal = last_restart + self.interval
+        candidates = np.arange(last_restart + self.min_interval, last_restart + self.max_interval + 1, self.step)
+        candidates = candidates[candidates >= now] if (candidates >= now).any() else np.array([now])
+        # Fewest players first, then closest to the usual interval
+        planned = float(min(candidates, key=lambda t: (round(self._profile[week_slot(t)], 2), abs(t - nominal))))
+
+        logging.info(f'Next restart planned for {time.ctime(planned)}, '
+                     f'{self._profile[week_slot(planned)]:.1f} players online at that hour on average')
+        self._plan = (last_restart, planned)
+        return planned
+
+    def occupancy_profile(self, now=None) -> np.ndarray:
+        """
+        Returns the mean peak player count for each hour of the week.
+
+        Returns:
+            np.ndarray: `WEEK_SLOTS` values, Monday 00:00 local time first.
+        """
+        now = time.time() if now is None else now
+        start = (now - self.history) // HOUR * HOUR
+        totals = np.zeros(WEEK_SLOTS)
+        counts = np.zeros(WEEK_SLOTS)
+        for bucket_start, peak in self.session_store.concurrent(start, now, HOUR):
+            slot = week_slot(bucket_start)
+            totals[slot] += peak
+            counts[slot] += 1
+        return totals / np.maximum(counts, 1)
+
+    def pressure(self, now=None) -> Optional[str]:
+        """
+        Returns the memory pressure calling for a restart, or None.
+
+        The metrics history is read at most every `check_interval` seconds.
+        """
+        now = time.time() if now is None else now
+        if now < self._next_check:
+            return self._pressure
+        self._next_check = now + self.check_interval
+
+        try:
+            self._pressure = self._read_pressure(now)
+        except Exception as e:
+            logging.error(f'Reading the metrics history for the restart planner failed: {e}')
+            self._pressure = None
+        return self._pressure
+
+    def _read_pressure(self, now):
+        fields = [('ram_percent', 'f'), ('mspt', 'f')]
+        timestamps, recent = read_tiered(self.metrics_path, now - 15 * 60, None, resolution=60, fields=fields)
+        if len(timestamps) == 0:
+            return None
+        ram = float(np.nanmean(recent['ram_percent'])) if not np.isnan(recent['ram_percent']).all() else None
+        mspt = float(np.nanmean(recent['mspt'])) if not np.isnan(recent['mspt']).all() else None
+
+        if self.ram_percent and ram is not None and ram >= self.ram_percent:
+            return f'RAM at {ram:.1f}%, the limit is {self.ram_percent}%'
+
+        if self.mspt and mspt is not None and ram is not None and mspt >= self.mspt and ram >= self.gc_ram_percent:
+            return f'ticks take {mspt:.1f}ms with RAM at {ram:.1f}%, likely garbage collection pressure'
+
+        if self.ram_slope:
+            timestamps, floor = read_tiered(self.metrics_path, now - self.trend_window, None, resolution=60,
+                                            how='min', fields=fields[:1])
+            floor = floor['ram_percent']
+            known = ~np.isnan(floor)
+            # Only fit once most of the window is covered
+            if known.sum() > 10 and timestamps[known][-1] - timestamps[known][0] >= self.trend_window / 2:
+                slope = np.polyfit((timestamps[known] - now) / HOUR, floor[known], 1)[0]
+                if slope >= self.ram_slope:
+                    return f'the RAM floor is rising {slope:.1f}% per hour, likely a memory leak'
+        return None
@@ -0,0 +1,155 @@
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    joined REAL NOT NULL,
+    left REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_player ON sessions (player, joined);
+CREATE INDEX IF NOT EXISTS sessions_joined ON sessions (joined);
+CREATE INDEX IF NOT EXISTS sessions_left ON sessions (left);
+"""
+
+
+class SessionStore:
+    """
+    An indexed SQLite store of player sessions.
+
+    Every join opens a session row and the matching leave closes it, so the
+    history survives log rotation and range queries read only the rows they
+    need through the player, join time and leave time indexes. The database
+    runs in WAL mode, so the backend can query it while the controller writes.
+    Times are epoch seconds. A session whose leave was never seen (the server
+    crashed) is closed at the next server start.
+
+    Attributes:
+    - path (str): The database file.
+
+    Methods:
+    - open_session(self, player, when): Records a join.
+    - close_session(self, player, when): Records a leave.
+    - close_all(self, when): Closes every open session.
+    - concurrent(self, start, end, bucket): Peak players online per time bucket.
+    - sessions(self, start, end, player, limit): Sessions that started in a range.
+    - top_players(self, start, end, limit): Players with the most time online.
+    - close(self): Closes the database.
+    """
+
+    # Sessions overlapping [:start, :end), searched by leave time so that
+    # recent ranges do not walk the whole history
+    _OVERLAPPING = (
+        'SELECT player, joined, left FROM sessions WHERE left > :start AND +joined < :end '
+        'UNION ALL SELECT player, joined, left FROM sessions WHERE left IS NULL AND +joined < :end'
+    )
+
+    def __init__(self, path='sessions.db', readonly=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if readonly:
+            self._db = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def open_session(self, player, when):
+        with self._lock, self._db:
+            # A repeated join means the leave was lost, end the old session here
+            self._db.execute('UPDATE sessions SET left = ? WHERE player = ? AND left IS NULL', (when, player))
+            self._db.execute('INSERT INTO sessions (player, joined) VALUES (?, ?)', (player, when))
+
+    def close_session(self, player, when):
+        with self._lock, self._db:
+            self._db.execute('UPDATE sessions SET left = ? WHERE player = ? AND left IS NULL', (when, player))
+
+    def close_all(self, when):
+        with self._lock, self._db:
+            self._db.execute('UPDATE sessions SET left = MAX(joined, ?) WHERE left IS NULL', (when,))
+
+    def concurrent(self, start, end, bucket) -> list[tuple[float, int]]:
+        """
+        Counts the most players online at once in each time bucket.
+
+        Args:
+            start (float): Start of the first bucket.
+            end (float): End of the range.
+            bucket (float): Bucket width in seconds.
+
+        Returns:
+            list: (bucket start, peak player count) pairs.
+        """
+        rows = self._query(f'SELECT joined, left FROM ({self._OVERLAPPING})', {'start': start, 'end': end})
+        changes = []
+        for joined, left in rows:
+            changes.append((max(joined, start), 1))
+            if left is not None and left < end:
+                changes.append((left, -1))
+        # Leaves sort before joins at the same instant
+        changes.sort()
+
+        result = []
+        online = 0
+        index = 0
+        bucket_start = start
+        while bucket_start < end:
+            bucket_end = min(bucket_start + bucket, end)
+            peak = online
+            while index < len(changes) and changes[index][0] < bucket_end:
+                online += changes[index][1]
+                peak = max(peak, online)
+                index += 1
+            result.append((bucket_start, peak))
+            bucket_start = bucket_end
+        return result
+
+    def sessions(self, start, end, player=None, limit=1000) -> list[dict]:
+        """
+        Lists sessions that started in a time range, newest first.
+
+        Open sessions are reported with `left` None and their duration so far.
+
+        Returns:
+            list[dict]: Records with 'player', 'joined', 'left' and 'duration'.
+        """
+        sql = 'SELECT player, joined, left FROM sessions WHERE joined >= ? AND joined < ?'
+        params = [start, end]
+        if player is not None:
+            sql += ' AND player = ?'
+            params.append(player)
+        sql += ' ORDER BY joined DESC LIMIT ?'
+        params.append(limit)
+
+        now = time.time()
+        return [
+            {'player': name, 'joined': joined, 'left': left,
+             'duration': (now if left is None else left) - joined}
+            for name, joined, left in self._query(sql, params)
+        ]
+
+    def top_players(self, start, end, limit=10) -> list[dict]:
+        """
+        Ranks players by time online within a range.
+
+        Sessions crossing the range edges only count the part inside it.
+
+        Returns:
+            list[dict]: Records with 'player', 'sessions' and 'seconds', most online first.
+        """
+        rows = self._query(
+            'SELECT player, COUNT(*), SUM(MIN(COALESCE(left, :now), :end) - MAX(joined, :start)) AS seconds '
+            f'FROM ({self._OVERLAPPING}) GROUP BY player ORDER BY seconds DESC LIMIT :limit',
+            {'start': start, 'end': end, 'now': time.time(), 'limit': limit},
+        )
+        return [{'player': name, 'sessions': count, 'seconds': seconds} for name, count, seconds in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
@@ -0,0 +1,99 @@
+import time
+import logging
+import threading
+from collections import deque
+
+
+class StatsSampler(threading.Thread):
+    """
+    A background thread that keeps one Docker stats stream open for a container.
+
+    Frames are decoded by docker-py and queued until the monitor loop drains
+    them, so the loop never waits on the Docker API. If the stream drops (the
+    container stops, the daemon restarts) the sampler reconnects by container
+    name with backoff. The first frame of a new stream has no `precpu_stats`,
+    so it is completed from the last frame seen before the drop and still
+    yields a valid CPU sample.
+
+    Attributes:
+    - api (APIClient): The low level docker-py API client.
+    - container_name (str): The name of the container to sample.
+    - sample_interval (float): Minimum spacing in seconds between queued frames.
+    - retry_delay (float): Initial delay before reconnecting a dropped stream.
+    - max_retry_delay (float): Upper bound for the reconnect delay.
+
+    Methods:
+    - run(self): Thread body, streams frames until stopped.
+    - drain(self): Returns and clears all queued frames.
+    - stop(self): Asks the thread to stop after the next frame.
+    """
+
+    def __init__(self, api, container_name, sample_interval=5, retry_delay=1,
+                 max_retry_delay=30, max_pending=1024):
+        super().__init__(name=f'stats-{container_name}', daemon=True)
+        self.api = api
+        self.container_name = container_name
+        self.sample_interval = sample_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._last_frame = None
+        self._last_queued = 0.0
+
+    def run(self):
+        delay = self.retry_delay
+        while not self._stopped.is_set():
+            try:
+                logging.debug(f'Opening stats stream for {self.container_name}')
+                stream = self.api.stats(self.container_name, stream=True, decode=True)
+                for frame in stream:
+                    if self._stopped.is_set():
+                        break
+                    self._handle_frame(frame)
+                    delay = self.retry_delay
+            except Exception as e:
+                logging.debug(f'Stats stream for {self.container_name} dropped: {e}')
+
+            if not self._stopped.is_set():
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def drain(self) -> list[dict]:
+        """
+        Returns every frame queued since the last call, oldest first.
+
+        Returns:
+            list[dict]: Decoded stats frames.
+        """
+        with self._lock:
+            frames = list(self._pending)
+            self._pending.clear()
+        return frames
+
+    def stop(self):
+        self._stopped.set()
+
+    def _handle_frame(self, frame):
+        # Docker reports a zeroed precpu_stats on the first frame of a stream
+        if not frame.get('precpu_stats', {}).get('system_cpu_usage'):
+            if self._last_frame is None:
+                self._last_frame = frame
+                return
+            frame['precpu_stats'] = self._last_frame['cpu_stats']
+
+        if not frame.get('cpu_stats', {}).get('system_cpu_usage'):
+            # The container is not running, docker sends empty frames
+            return
+
+        self._last_frame = frame
+
+        now = time.monotonic()
+        if now - self._last_queued < self.sample_interval:
+            return
+        self._last_queued = now
+
+        with self._lock:
+            self._pending.append(frame)
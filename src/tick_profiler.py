@@ -0,0 +1,146 @@
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p) -> float:
+    """
+    Returns the nearest-rank percentile of already sorted values.
+    """
+    index = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+class TickProfiler:
+    """
+    Times the stages of the monitor tick and summarises where the time goes.
+
+    Each stage is wrapped in `span(name)`. The durations of the last `window`
+    spans per stage are kept, and every `summary_interval` seconds a summary
+    line with p50/p95/p99 per stage is logged.
+
+    Attributes:
+    - window (int): Spans kept per stage for the percentiles.
+    - summary_interval (float): Seconds between logged summaries, 0 disables them.
+    - listeners (list): Callables invoked with (stage, seconds) after each span.
+
+    Methods:
+    - span(self, stage): Context manager timing one stage.
+    - summary(self): Returns percentiles per stage.
+    - log_summary(self, force): Logs the summary if it is due.
+    """
+
+    def __init__(self, window=720, summary_interval=300):
+        self.window = window
+        self.summary_interval = summary_interval
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._spans: dict[str, deque] = {}
+        self._next_summary = time.monotonic() + summary_interval
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._spans.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+        for listener in self.listeners:
+            listener(stage, seconds)
+
+    def summary(self) -> dict:
+        """
+        Returns statistics for the spans in the window.
+
+        Returns:
+            dict: Stage mapped to count, p50, p95, p99 and max in seconds.
+        """
+        with self._lock:
+            spans = {stage: sorted(values) for stage, values in self._spans.items() if values}
+
+        return {
+            stage: {
+                'count': len(values),
+                **{f'p{p}': percentile(values, p) for p in PERCENTILES},
+                'max': values[-1],
+            }
+            for stage, values in spans.items()
+        }
+
+    def log_summary(self, force=False):
+        if not force and (not self.summary_interval or time.monotonic() < self._next_summary):
+            return
+        self._next_summary = time.monotonic() + self.summary_interval
+
+        parts = [
+            f"{stage} p50={stats['p50'] * 1000:.1f}ms p95={stats['p95'] * 1000:.1f}ms "
+            f"p99={stats['p99'] * 1000:.1f}ms"
+            for stage, stats in self.summary().items()
+        ]
+        if parts:
+            logging.info(f"Tick profile: {'; '.join(parts)}")
+
+
+class FixedRateScheduler:
+    """
+    Keeps a periodic task on a fixed grid of deadlines.
+
+    Deadlines advance by exactly `interval` from the first one instead of
+    sleeping `interval` after the work, so slow ticks do not stretch the
+    period. When a tick runs past one or more deadlines those are counted as
+    overruns and skipped, so the loop does not fire a burst of catch-up ticks.
+
+    Attributes:
+    - interval (float): Seconds between ticks.
+    - overruns (int): Deadlines missed so far.
+    - listeners (list): Callables invoked with (missed, lateness) on an overrun.
+
+    Methods:
+    - delay(self): Seconds to wait before the next tick.
+    - sleep(self): Blocks until the next tick.
+    - reset(self): Restarts the grid from now, after a deliberate pause.
+    """
+
+    def __init__(self, interval, clock=time.monotonic):
+        self.interval = interval
+        self.overruns = 0
+        self.listeners = []
+
+        self._clock = clock
+        self._next = clock()
+
+    def delay(self) -> float:
+        """
+        Advances to the next deadline and returns how long to wait for it.
+
+        Returns:
+            float: Seconds until the next tick, 0 if it is already due.
+        """
+        now = self._clock()
+        self._next += self.interval
+        lateness = now - self._next
+        if lateness > 0:
+            missed = math.floor(lateness / self.interval) + 1
+            self.overruns += missed
+            logging.warning(f'Tick ran {lateness:.2f}s past its next {self.interval}s deadline, '
+                            f'skipping {missed} tick(s)')
+            for listener in self.listeners:
+                listener(missed, lateness)
+            self._next += missed * self.interval
+        return max(0.0, self._next - now)
+
+    def sleep(self):
+        time.sleep(self.delay())
+
+    def reset(self):
+        self._next = self._clock()
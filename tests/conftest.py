@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules import each other script-relative, as when run from src/, backend/ and benchmarks/
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('src', 'backend', 'benchmarks'):
+    sys.path.insert(0, os.path.join(ROOT_DIR, folder))
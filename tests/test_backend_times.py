@@ -0,0 +1,50 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from metrics_cache import MetricsCache
+from metrics_store import GAME_FIELDS, MetricsStore
+from responses import encode, encode_records, local_times
+
+# 2023-10-29 01:00 UTC, clocks in Berlin go back from 03:00 to 02:00 local
+FALL_BACK = 1698541200
+
+
+@pytest.fixture
+def berlin(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Berlin')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_cached_timestamps_stay_sorted_across_the_clock_change(tmp_path, berlin):
+    path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(path) as store:
+        for i in range(-720, 720):
+            store.append([FALL_BACK + i * 5, 1.0, 2.0, 1, 2, 3, 4] + [float('nan')] * len(GAME_FIELDS))
+
+    frame = MetricsCache(path).frame()
+    timestamps = frame['timestamp'].to_numpy()
+    assert (np.diff(timestamps.view('int64')) > 0).all()
+    assert timestamps[0] == np.datetime64(FALL_BACK - 3600, 's')
+
+    local = local_times(timestamps)
+    assert local[0] == np.datetime64('2023-10-29T02:00:00')
+    assert local[720] == np.datetime64('2023-10-29T02:00:00')
+
+    records = json.loads(encode_records(frame.head(1)))
+    assert records[0]['timestamp'].startswith('2023-10-29T02:00:00')
+    columns = json.loads(encode(frame.head(2), 'columns'))
+    assert columns['timestamp'] == [FALL_BACK - 3600, FALL_BACK - 3595]
+
+
+def test_query_times_are_taken_as_local_and_kept_in_utc(berlin):
+    from backend import parse_time, to_epoch
+
+    assert to_epoch(parse_time(str(FALL_BACK))) == FALL_BACK
+    assert to_epoch(parse_time('2023-10-29T02:30:00')) == FALL_BACK - 1800
+    assert to_epoch(parse_time('2023-10-29T02:30:00+00:00')) == FALL_BACK + 5400
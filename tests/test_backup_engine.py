@@ -0,0 +1,183 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from backup_engine import BackupEngine, BackupVerifier
+
+STAMPS = ['20240101-000000', '20240102-000000', '20240103-000000']
+
+
+def touch(folder, name):
+    with open(os.path.join(folder, name), 'wb'):
+        pass
+
+
+def test_archives_only_match_the_exact_prefix(tmp_path):
+    engine = BackupEngine(str(tmp_path), keep=2)
+    for stamp in STAMPS:
+        touch(tmp_path, f'survival-{stamp}.tar.zst')
+        touch(tmp_path, f'survival-hard-{stamp}.tar.gz')
+    touch(tmp_path, 'survival-notes.tar.zst')
+    touch(tmp_path, f'survival-{STAMPS[0]}.tar.zst.partial')
+
+    assert [os.path.basename(path) for path in engine.archives('survival')] == \
+        [f'survival-{stamp}.tar.zst' for stamp in STAMPS]
+    assert [os.path.basename(path) for path in engine.archives('survival-hard')] == \
+        [f'survival-hard-{stamp}.tar.gz' for stamp in STAMPS]
+
+    engine.apply_retention('survival')
+    assert len(engine.archives('survival')) == 2
+    assert len(engine.archives('survival-hard')) == 3
+
+
+def test_archives_of_a_missing_folder():
+    assert BackupEngine('does-not-exist').archives('survival') == []
+
+
+def make_world(folder):
+    os.makedirs(os.path.join(folder, 'world', 'region'))
+    for i in range(5):
+        with open(os.path.join(folder, 'world', 'region', f'r.{i}.0.mca'), 'wb') as f:
+            f.write(os.urandom(4096) + bytes(8192))
+    with open(os.path.join(folder, 'server.properties'), 'w') as f:
+        f.write('difficulty=normal\n')
+
+
+def snapshot(folder):
+    files = {}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, folder)] = f.read()
+    return files
+
+
+def test_a_failed_swap_puts_the_old_world_back(tmp_path, monkeypatch):
+    make_world(tmp_path / 'data')
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    archive = engine.create(str(tmp_path / 'data'), 'survival')
+    with open(tmp_path / 'data' / 'server.properties', 'w') as f:
+        f.write('difficulty=hard\n')
+    before = snapshot(tmp_path / 'data')
+
+    rename = os.rename
+    moves = []
+
+    def failing_rename(source, target):
+        moves.append(source)
+        # Fail once the old content is aside and half the backup moved in
+        if len(moves) == 3:
+            raise OSError('disk went away')
+        rename(source, target)
+
+    monkeypatch.setattr(os, 'rename', failing_rename)
+    with pytest.raises(OSError):
+        engine.restore(archive, str(tmp_path / 'data'))
+    monkeypatch.undo()
+
+    assert snapshot(tmp_path / 'data') == before
+    assert sorted(os.listdir(tmp_path / 'data')) == ['server.properties', 'world']
+    assert engine.interrupted_restores(str(tmp_path / 'data')) == []
+
+
+def test_no_restore_over_an_interrupted_one(tmp_path):
+    make_world(tmp_path / 'data')
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    archive = engine.create(str(tmp_path / 'data'), 'survival')
+    # What a restore that could not be undone leaves behind
+    leftover = tmp_path / 'data' / '.pre-restore-20240101-000000'
+    os.makedirs(leftover / 'world')
+    with open(leftover / 'world' / 'level.dat', 'wb') as f:
+        f.write(b'the only copy')
+    before = snapshot(tmp_path / 'data')
+
+    with pytest.raises(Exception, match='interrupted'):
+        engine.restore(archive, str(tmp_path / 'data'))
+    assert snapshot(tmp_path / 'data') == before
+    assert engine.interrupted_restores(str(tmp_path / 'data')) == [str(leftover)]
+
+
+def test_create_verify_restore_round_trip(tmp_path):
+    make_world(tmp_path / 'data')
+    original = snapshot(tmp_path / 'data')
+    # Small blocks so the region files span several compressed frames
+    engine = BackupEngine(str(tmp_path / 'backups'), block_size=4096)
+    archive = engine.create(str(tmp_path / 'data'), 'survival')
+
+    assert engine.archives('survival') == [archive]
+    assert engine.verify(archive) == []
+
+    os.remove(tmp_path / 'data' / 'world' / 'region' / 'r.0.0.mca')
+    with open(tmp_path / 'data' / 'stray.txt', 'w') as f:
+        f.write('left over')
+    engine.restore(archive, str(tmp_path / 'data'))
+    assert snapshot(tmp_path / 'data') == original
+
+
+def test_verify_finds_corruption(tmp_path):
+    make_world(tmp_path / 'data')
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    archive = engine.create(str(tmp_path / 'data'), 'survival')
+    intact = engine.create(str(tmp_path / 'data'), 'creative')
+
+    with open(archive, 'r+b') as f:
+        f.seek(os.path.getsize(archive) // 2)
+        f.write(b'\xff' * 64)
+    assert engine.verify(archive) != []
+
+    verifier = BackupVerifier(engine, 'survival')
+    assert list(verifier.verify_all()) == [archive]
+    assert verifier.corrupt == [archive]
+    assert verifier.last_verified > 0
+    assert BackupVerifier(engine, 'creative').verify_all() == {intact: []}
+
+
+def write_tar(path, members):
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, kind, target in members:
+            member = tarfile.TarInfo(name)
+            member.type = kind
+            member.linkname = target
+            tar.addfile(member, io.BytesIO() if kind == tarfile.REGTYPE else None)
+
+
+@pytest.mark.parametrize('with_filters', [True, False])
+@pytest.mark.parametrize('member', [
+    ('/etc/evil', tarfile.REGTYPE, ''),
+    ('world/../../evil', tarfile.REGTYPE, ''),
+    ('world/escape', tarfile.SYMTYPE, '../../outside'),
+    ('world/escape', tarfile.SYMTYPE, '/etc/passwd'),
+    ('world/escape', tarfile.LNKTYPE, '../outside'),
+    ('world/device', tarfile.CHRTYPE, ''),
+])
+def test_members_leaving_the_folder_are_refused(tmp_path, monkeypatch, with_filters, member):
+    if not with_filters:
+        # Python before 3.10.12 has no extraction filters
+        monkeypatch.delattr(tarfile, 'data_filter', raising=False)
+    make_world(tmp_path / 'data')
+    before = snapshot(tmp_path / 'data')
+    archive = str(tmp_path / 'survival-20240101-000000.tar.gz')
+    write_tar(archive, [('world/ok', tarfile.REGTYPE, ''), member])
+
+    with pytest.raises(Exception):
+        BackupEngine(str(tmp_path)).restore(archive, str(tmp_path / 'data'))
+    assert snapshot(tmp_path / 'data') == before
+    assert sorted(os.listdir(tmp_path / 'data')) == ['server.properties', 'world']
+
+
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+def test_restore_without_extraction_filters(tmp_path, monkeypatch):
+    monkeypatch.delattr(tarfile, 'data_filter', raising=False)
+    make_world(tmp_path / 'data')
+    os.symlink('region/r.0.0.mca', tmp_path / 'data' / 'world' / 'latest.mca')
+    original = snapshot(tmp_path / 'data')
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    archive = engine.create(str(tmp_path / 'data'), 'survival')
+
+    os.remove(tmp_path / 'data' / 'server.properties')
+    engine.restore(archive, str(tmp_path / 'data'))
+    assert snapshot(tmp_path / 'data') == original
+    assert os.readlink(tmp_path / 'data' / 'world' / 'latest.mca') == 'region/r.0.0.mca'
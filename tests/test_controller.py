@@ -0,0 +1,32 @@
+import pytest
+
+from run import Harness
+
+
+@pytest.fixture
+def harness():
+    harness = Harness(players=2)
+    yield harness
+    harness.close()
+
+
+def test_a_tick_replaces_helper_threads_that_stopped(harness):
+    controller = harness.controller
+    controller.monitor_tick()
+    follower, sampler = controller.log_follower, controller.stats_sampler
+    assert follower.is_alive() and sampler.is_alive()
+
+    follower.stop()
+    sampler.stop()
+    follower.join(5)
+    sampler.join(5)
+
+    controller.monitor_tick()
+    assert controller.log_follower is not follower
+    assert controller.stats_sampler is not sampler
+    assert controller.log_follower.is_alive() and controller.stats_sampler.is_alive()
+
+    # Live threads are kept
+    follower = controller.log_follower
+    controller.monitor_tick()
+    assert controller.log_follower is follower
@@ -0,0 +1,59 @@
+import numpy as np
+
+from downsample import bucket_aggregate, downsample, lttb_indices
+
+SECOND = 1_000_000_000
+
+
+def times(seconds):
+    return (np.asarray(seconds, dtype='int64') * SECOND).astype('datetime64[ns]')
+
+
+def test_buckets_are_aligned_and_skip_missing_readings():
+    timestamps = times([61, 62, 119, 120, 125])
+    values = {'cpu': [1.0, 3.0, 5.0, 7.0, 9.0], 'tps': [20.0, np.nan, np.nan, np.nan, np.nan]}
+
+    starts, means = bucket_aggregate(timestamps, values, 60 * SECOND)
+    assert starts.tolist() == times([60, 120]).tolist()
+    assert means['cpu'].tolist() == [3.0, 8.0]
+    assert means['tps'][0] == 20.0
+    assert np.isnan(means['tps'][1])
+
+    assert bucket_aggregate(timestamps, values, 60 * SECOND, 'min')[1]['cpu'].tolist() == [1.0, 7.0]
+    assert bucket_aggregate(timestamps, values, 60 * SECOND, 'max')[1]['cpu'].tolist() == [5.0, 9.0]
+    assert len(bucket_aggregate(timestamps[:0], values, SECOND)[0]) == 0
+
+
+def test_lttb_keeps_the_ends_and_the_spikes():
+    x = np.arange(1000, dtype='float64')
+    y = np.zeros(1000)
+    y[333] = 50.0
+    y[777] = -50.0
+
+    kept = lttb_indices(x, y, 20)
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert (np.diff(kept) > 0).all()
+    assert 333 in kept and 777 in kept
+
+    assert lttb_indices(x[:10], y[:10], 20).tolist() == list(range(10))
+    assert lttb_indices(x, y, 2).tolist() == list(range(1000))
+
+
+def test_downsample_limits_the_number_of_points():
+    timestamps = times(range(3600))
+    values = {'cpu': np.sin(np.arange(3600) / 100.0), 'mem': np.arange(3600, dtype='float64')}
+
+    out_times, out = downsample(timestamps, values, max_points=60)
+    assert len(out_times) <= 60
+    assert out['mem'][0] == 29.5
+
+    # The bucket width only ever grows to respect max_points
+    assert len(downsample(timestamps, values, bucket_ns=SECOND, max_points=100)[0]) <= 100
+    assert len(downsample(timestamps, values, bucket_ns=600 * SECOND)[0]) == 6
+
+    out_times, out = downsample(timestamps, values, max_points=50, how='lttb')
+    assert len(out_times) == 50
+    assert (out['mem'] == out_times.view('int64') // SECOND).all()
+
+    assert downsample(timestamps, values)[0] is timestamps
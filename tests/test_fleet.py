@@ -0,0 +1,25 @@
+from fleet import assign_ports, BASE_PORT, BASE_RCON_PORT
+
+
+def test_config_then_state_then_next_free_port():
+    servers = [{'name': 'survival'}, {'name': 'creative', 'port': BASE_PORT}, {'name': 'lobby', 'rcon': 'secret'}]
+    state = {'survival': {'port': BASE_PORT + 1, 'rcon_port': BASE_RCON_PORT, 'rcon': 'kept'}}
+
+    assignments = assign_ports(servers, state)
+    assert assignments['survival'] == {'port': BASE_PORT + 1, 'rcon_port': BASE_RCON_PORT, 'rcon': 'kept'}
+    assert assignments['creative']['port'] == BASE_PORT
+    assert assignments['creative']['rcon_port'] == BASE_RCON_PORT + 1
+    assert assignments['lobby']['port'] == BASE_PORT + 2
+    assert assignments['lobby']['rcon_port'] == BASE_RCON_PORT + 2
+    assert assignments['lobby']['rcon'] == 'secret'
+    assert assignments['creative']['rcon'] not in ('', assignments['survival']['rcon'])
+
+
+def test_assignments_are_stable_when_servers_are_reordered():
+    servers = [{'name': name} for name in ('a', 'b', 'c')]
+    first = assign_ports(servers, {})
+
+    again = assign_ports(list(reversed(servers)) + [{'name': 'd'}], first)
+    assert {name: again[name] for name in first} == first
+    used = [value for assigned in again.values() for value in (assigned['port'], assigned['rcon_port'])]
+    assert len(used) == len(set(used))
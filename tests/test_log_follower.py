@@ -0,0 +1,69 @@
+import pytest
+
+from log_follower import LogFollower, parse_docker_timestamp
+
+VANILLA = '[12:00:00] [Server thread/INFO]: {}'
+PAPER = '[12:00:00 INFO]: {}'
+FORGE = '[12:00:00] [Server thread/INFO] [minecraft/DedicatedServer]: {}'
+
+
+def follower(events):
+    return LogFollower(None, 'mc', lambda *event: events.append(event))
+
+
+def feed(log, when, text):
+    log._handle_line(f'2024-01-01T00:00:{when:02d}.000000000Z {text}')
+
+
+@pytest.mark.parametrize('layout', [VANILLA, PAPER, FORGE], ids=['vanilla', 'paper', 'forge'])
+def test_join_leave_and_ready(layout):
+    events = []
+    log = follower(events)
+    log._live_after = 0
+
+    feed(log, 1, layout.format('Done (4.2s)! For help, type "help"'))
+    feed(log, 2, layout.format('Alex joined the game'))
+    feed(log, 3, layout.format('Steve joined the game'))
+    assert log.players() == {'Alex', 'Steve'}
+    feed(log, 4, layout.format('Alex left the game'))
+
+    assert [(kind, player) for kind, player, _ in events] == [
+        ('ready', '4.2'), ('join', 'Alex'), ('join', 'Steve'), ('leave', 'Alex')]
+    assert log.players() == {'Steve'}
+
+
+def test_chat_is_not_an_event():
+    events = []
+    log = follower(events)
+    log._live_after = 0
+    feed(log, 1, VANILLA.format('<Alex> Steve joined the game'))
+    feed(log, 2, 'Steve joined the game')
+    assert events == []
+    assert log.players() == set()
+
+
+def test_lines_before_the_follower_started_only_rebuild_the_online_set():
+    events = []
+    log = follower(events)
+    log._live_after = parse_docker_timestamp('2024-01-01T00:00:05Z')[0]
+    feed(log, 1, PAPER.format('Alex joined the game'))
+    feed(log, 6, PAPER.format('Steve joined the game'))
+    assert [player for _, player, _ in events] == ['Steve']
+    assert log.players() == {'Alex', 'Steve'}
+
+
+def test_docker_timestamps_compare_with_trimmed_fractions():
+    assert parse_docker_timestamp('2024-01-01T00:00:00.5Z') == (1704067200, 500_000_000)
+    assert parse_docker_timestamp('2024-01-01T00:00:00.5Z') > parse_docker_timestamp('2024-01-01T00:00:00.05Z')
+
+
+def test_online_players_are_unknown_until_a_line_is_recognized(tmp_path):
+    log = LogFollower(None, 'mc', lambda *event: None, state_path=str(tmp_path / 'state.json'))
+    feed(log, 1, 'Starting minecraft server version 1.20.4')
+    assert not log.recognized
+
+    feed(log, 2, FORGE.format('Preparing level "world"'))
+    assert log.recognized
+    log.stop()
+
+    assert LogFollower(None, 'mc', lambda *event: None, state_path=str(tmp_path / 'state.json')).recognized
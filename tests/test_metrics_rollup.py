@@ -0,0 +1,73 @@
+import numpy as np
+
+from metrics_rollup import MetricsCompactor, plan_reads, read_tiered, rollup, tier_path
+from metrics_store import GAME_FIELDS, MetricsReader, MetricsStore, record_dtype, RAW_FIELDS
+
+HOUR = 3600
+START = 1_699_999_200  # On an hour boundary
+
+
+def records(timestamps, cpu):
+    rows = np.zeros(len(timestamps), dtype=record_dtype(RAW_FIELDS))
+    rows['timestamp'] = timestamps
+    rows['cpu_percent'] = cpu
+    for name, _ in GAME_FIELDS:
+        rows[name] = np.nan
+    return rows
+
+
+def test_rollup_aggregates_and_combines_tiers():
+    raw = records([START, START + 20, START + 40, START + 60], [1.0, 5.0, 3.0, 7.0])
+    raw['tps'][1] = 20.0
+
+    minutes = rollup(raw, 60)
+    assert minutes['timestamp'].tolist() == [START, START + 60]
+    assert minutes['samples'].tolist() == [3, 1]
+    assert minutes['cpu_percent_min'].tolist() == [1.0, 7.0]
+    assert minutes['cpu_percent_max'].tolist() == [5.0, 7.0]
+    assert minutes['cpu_percent_mean'].tolist() == [3.0, 7.0]
+    # Game readings the server did not report are left out of the mean
+    assert minutes['tps_mean'][0] == 20.0
+    assert np.isnan(minutes['tps_mean'][1])
+
+    hours = rollup(minutes, HOUR)
+    assert hours['samples'].tolist() == [4]
+    assert hours['cpu_percent_mean'].tolist() == [4.0]
+    assert hours['cpu_percent_min'].tolist() == [1.0]
+
+
+def test_plan_reads_picks_the_coarsest_fitting_tier_and_fills_in_from_finer_ones():
+    raw = np.arange(START + 2 * HOUR, START + 3 * HOUR, 5.0)
+    minutes = np.arange(START + HOUR, START + 2 * HOUR + 30 * 60, 60.0)
+    hours = np.arange(START, START + 2 * HOUR, float(HOUR))
+    tiers = [(0, raw), (60, minutes), (HOUR, hours)]
+
+    reads = plan_reads(tiers, START, START + 3 * HOUR, resolution=HOUR)
+    assert [position for position, _ in reads] == [2, 1, 0]
+    # Each finer tier continues where the coarser one ends
+    assert minutes[reads[1][1]][0] == START + 2 * HOUR
+    assert raw[reads[2][1]][0] == START + 2 * HOUR + 30 * 60
+
+    # Fine resolutions use the finest tier that still covers the start
+    assert [position for position, _ in plan_reads(tiers, START + 2 * HOUR, None, resolution=0)] == [0]
+    assert [position for position, _ in plan_reads(tiers, START + HOUR, None, resolution=0)] == [1, 0]
+    assert plan_reads([(0, np.empty(0))], START, None) == []
+
+
+def test_compactor_rolls_up_and_read_tiered_reads_across_tiers(tmp_path):
+    path = str(tmp_path / 'metrics.bin')
+    store = MetricsStore(path)
+    for i in range(3 * HOUR // 10):
+        store.append(list(records([START + i * 10], [float(i % 7)])[0]))
+    store.flush()
+
+    MetricsCompactor(store, retention={'raw': HOUR}).compact(START + 3 * HOUR)
+    store.close()
+
+    assert len(MetricsReader(tier_path(path, '1m')).records()) == 180
+    assert len(MetricsReader(tier_path(path, '1h')).records()) == 3
+
+    timestamps, columns = read_tiered(path, START, START + 3 * HOUR, resolution=60)
+    assert timestamps[0] == START
+    assert (np.diff(timestamps) > 0).all()
+    assert not np.isnan(columns['cpu_percent']).any()
@@ -0,0 +1,141 @@
+import csv
+import time
+
+import numpy as np
+
+from metrics_store import CSV_TIME_FORMAT, GAME_FIELDS, MetricsReader, MetricsStore, export_csv, import_csv
+
+NOW = 1_700_000_000.0
+LEGACY_START = time.mktime((2020, 6, 1, 12, 0, 0, 0, 0, -1))
+
+
+def sample(timestamp, cpu=10.0):
+    return [timestamp, cpu, 50.0, 1, 2, 3, 4] + [float('nan')] * len(GAME_FIELDS)
+
+
+def write_csv(path, start, count):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for i in range(count):
+            writer.writerow([time.strftime(CSV_TIME_FORMAT, time.localtime(start + i * 5)), 1.5, 20.25, 1, 2, 3, 4])
+
+
+def test_importing_an_older_csv_keeps_the_store_sorted(tmp_path):
+    store_path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(store_path, index_stride=4) as store:
+        for i in range(20):
+            store.append(sample(NOW + i * 5))
+    write_csv(tmp_path / 'data.csv', LEGACY_START, 10)
+
+    assert import_csv(str(tmp_path / 'data.csv'), store_path) == 10
+
+    reader = MetricsReader(store_path)
+    timestamps = reader.records()['timestamp']
+    assert len(timestamps) == 30
+    assert (np.diff(timestamps) >= 0).all()
+    assert len(reader.read(LEGACY_START, LEGACY_START + 3600)) == 10
+    assert len(reader.read(NOW, NOW + 3600)) == 20
+
+    # The rebuilt index still finds ranges and appends carry on after the merge
+    with MetricsStore(store_path, index_stride=4) as store:
+        store.append(sample(NOW + 100))
+    reader.refresh()
+    assert len(reader.read(NOW + 50, NOW + 200)) == 11
+
+
+def test_csv_round_trip(tmp_path):
+    write_csv(tmp_path / 'data.csv', LEGACY_START, 7)
+    import_csv(str(tmp_path / 'data.csv'), str(tmp_path / 'metrics.bin'))
+    assert export_csv(str(tmp_path / 'metrics.bin'), str(tmp_path / 'out.csv')) == 7
+    with open(tmp_path / 'data.csv') as original, open(tmp_path / 'out.csv') as exported:
+        assert original.read() == exported.read()
+
+
+def test_imported_history_reaches_existing_rollup_tiers(tmp_path):
+    from metrics_rollup import MetricsCompactor, tier_path
+
+    store_path = str(tmp_path / 'metrics.bin')
+    store = MetricsStore(store_path)
+    for i in range(30):
+        store.append(sample(NOW + i * 5))
+    MetricsCompactor(store).compact(NOW + 3 * 3600)
+    store.close()
+    write_csv(tmp_path / 'data.csv', LEGACY_START, 24)
+
+    import_csv(str(tmp_path / 'data.csv'), store_path)
+
+    minutes = MetricsReader(tier_path(store_path, '1m')).records()
+    assert (np.diff(minutes['timestamp']) > 0).all()
+    legacy = minutes['timestamp'] < LEGACY_START + 3600
+    assert minutes['samples'][legacy].sum() == 24
+    assert minutes['samples'][~legacy].sum() == 30
+
+
+def test_round_trip_and_sparse_index(tmp_path):
+    path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(path, index_stride=8) as store:
+        for i in range(100):
+            store.append(sample(NOW + i, cpu=float(i)))
+
+    assert (tmp_path / 'metrics.bin.idx').stat().st_size == 13 * 16
+    reader = MetricsReader(path)
+    records = reader.records()
+    assert len(records) == 100
+    assert records['cpu_percent'].tolist() == [float(i) for i in range(100)]
+    assert np.isnan(records['tps']).all()
+
+    assert reader.time_slice(NOW + 17, NOW + 42) == slice(17, 42)
+    assert reader.time_slice(None, NOW + 8) == slice(0, 8)
+    assert reader.time_slice(NOW + 99.5, None) == slice(100, 100)
+    assert len(reader.read(NOW - 10, NOW + 1000)) == 100
+
+
+def test_a_lost_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(path, index_stride=8) as store:
+        for i in range(20):
+            store.append(sample(NOW + i))
+    (tmp_path / 'metrics.bin.idx').unlink()
+
+    MetricsStore(path, index_stride=8).close()
+    assert (tmp_path / 'metrics.bin.idx').stat().st_size == 3 * 16
+    assert MetricsReader(path).time_slice(NOW + 10, NOW + 12) == slice(10, 12)
+
+
+def test_a_torn_record_is_dropped(tmp_path):
+    path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(path) as store:
+        for i in range(5):
+            store.append(sample(NOW + i))
+    with open(path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    with MetricsStore(path) as store:
+        assert store.count == 5
+        store.append(sample(NOW + 5))
+    assert MetricsReader(path).records()['timestamp'][-1] == NOW + 5
+
+
+def test_files_with_fewer_columns_are_migrated(tmp_path):
+    from metrics_store import CONTAINER_FIELDS
+
+    path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(path, CONTAINER_FIELDS) as store:
+        store.append([NOW, 12.5, 40.0, 1, 2, 3, 4])
+
+    with MetricsStore(path) as store:
+        store.append(sample(NOW + 5))
+    records = MetricsReader(path).records()
+    assert records['cpu_percent'].tolist() == [12.5, 10.0]
+    assert np.isnan(records['mspt']).all()
+
+
+def test_drop_before(tmp_path):
+    path = str(tmp_path / 'metrics.bin')
+    with MetricsStore(path, index_stride=4) as store:
+        for i in range(10):
+            store.append(sample(NOW + i))
+        assert store.drop_before(NOW + 6) == 6
+        assert store.drop_before(NOW) == 0
+        store.append(sample(NOW + 10))
+    assert MetricsReader(path).records()['timestamp'].tolist() == [NOW + i for i in range(6, 11)]
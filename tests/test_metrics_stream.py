@@ -0,0 +1,46 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from metrics_stream import MetricsBroadcaster
+
+
+class FakeCache:
+    path = 'metrics.bin'
+
+    def __init__(self, seconds):
+        self.version = 0
+        self.set(seconds)
+
+    def set(self, seconds):
+        self.version += 1
+        self._frame = pd.DataFrame({
+            'timestamp': pd.to_datetime(seconds, unit='s').to_numpy(),
+            'cpu_percent': np.ones(len(seconds)),
+        })
+
+    def frame(self):
+        return self._frame
+
+
+def test_clients_connecting_together_share_one_tail():
+    async def scenario():
+        cache = FakeCache([0, 5])
+        broadcaster = MetricsBroadcaster(cache, poll_interval=0.01)
+        (first, cursor), (second, _) = await asyncio.gather(broadcaster.subscribe(), broadcaster.subscribe())
+        assert cursor == np.datetime64('1970-01-01T00:00:05')
+        tails = [task for task in asyncio.all_tasks() if task.get_coro().__qualname__ == 'MetricsBroadcaster._tail']
+        assert tails == [broadcaster._task]
+
+        cache.set([0, 5, 10])
+        batches = await asyncio.gather(asyncio.wait_for(first.get(), 1), asyncio.wait_for(second.get(), 1))
+        await asyncio.sleep(0.05)
+
+        assert [len(batch.frame) for batch in batches] == [1, 1]
+        assert first.empty() and second.empty()
+        broadcaster.unsubscribe(first)
+        broadcaster.unsubscribe(second)
+        await asyncio.wait_for(broadcaster._task, 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+from resource_limits import container_resources, parse_cpuset, resource_drift
+
+
+def test_parse_cpuset():
+    assert parse_cpuset('0-3,6') == {0, 1, 2, 3, 6}
+    assert parse_cpuset(' 2 , 4-5 ') == {2, 4, 5}
+    assert parse_cpuset('') == set()
+    assert parse_cpuset(None) == set()
+
+
+def test_container_resources():
+    options = container_resources({'cpuset_cpus': '2-7', 'mem_limit': '6g', 'nofile': [1024, 4096]})
+    assert options['cpuset_cpus'] == '2-7'
+    # No swap unless asked for
+    assert options['mem_limit'] == options['memswap_limit'] == 6 * 1024 ** 3
+    assert options['ulimits'][0]['Soft'] == 1024
+    assert options['ulimits'][0]['Hard'] == 4096
+    assert container_resources(None) == {}
+
+
+def test_no_drift_for_equivalent_settings():
+    host_config = {
+        'CpusetCpus': '2,3,4,5,6,7',
+        'Memory': 6 * 1024 ** 3,
+        'MemorySwap': 6 * 1024 ** 3,
+        'Ulimits': [{'Name': 'nofile', 'Soft': 1024, 'Hard': 4096}],
+    }
+    assert resource_drift(host_config, {'cpuset_cpus': '2-7', 'mem_limit': '6g', 'nofile': [1024, 4096]}) == []
+    # Unlimited swap without a memory limit is reported as -1 by some Docker versions
+    assert resource_drift({'MemorySwap': -1}, {}) == []
+
+
+def test_drift_is_described():
+    drift = resource_drift({'CpusetCpus': '0-3', 'Memory': 0, 'CpuShares': 512},
+                           {'cpuset_cpus': '2-7', 'mem_limit': '6g'})
+    assert 'CpusetCpus is 0-3, expected 2-7' in drift
+    assert f'Memory is unset, expected {6 * 1024 ** 3}' in drift
+    assert 'CpuShares is 512, expected unset' in drift
+    assert len(drift) == 4
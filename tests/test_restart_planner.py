@@ -0,0 +1,20 @@
+from restart_planner import HOUR, RestartPlanner
+from session_store import SessionStore
+
+
+def planner(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    return RestartPlanner(store, str(tmp_path / 'metrics.bin'), ram_percent=0, ram_slope=0, mspt=0)
+
+
+def test_an_empty_server_restarts_early_but_an_unknown_one_does_not(tmp_path):
+    now = 1_700_000_000
+    last_restart = now - 21 * HOUR
+    assert planner(tmp_path).due(last_restart, 0, now) == 'nobody is online and the planned hour is no quieter'
+    assert planner(tmp_path).due(last_restart, None, now) is None
+    assert planner(tmp_path).due(last_restart, 3, now) is None
+
+
+def test_no_restart_within_the_minimum_uptime(tmp_path):
+    now = 1_700_000_000
+    assert planner(tmp_path).due(now - 60, 0, now) is None